@@ -24,7 +24,7 @@ The item set I use (you can import it into the game client):
 import math
 import random
 import time
-from typing import List
+from typing import Iterator, List, Optional, Tuple
 
 import cv2 as cv
 import editdistance
@@ -32,18 +32,20 @@ import editdistance
 import numpy as np
 
 import controllers.game_controller as controller
+from controllers import action_script
 import listeners.vision.game_vision as vision
 from listeners.keyboard import key_listener
-from listeners.vision import image_handler
-from misc import color_logging
-from misc.rng import rnum, rsleep
+from listeners.vision import geometry, image_handler
+from listeners.vision.screenshot import CapturePlan, FULL_CAPTURE
+from misc import clock, color_logging
+from misc.rng import rnum
 from listeners.vision.game_vision import Minion, Player, Objective
 
 logger = color_logging.getLogger('ai', level=color_logging.DEBUG)
 is_debug = False
-curr_time = time.time()
-prev_time = time.time()
-last_log_time = time.time()
+curr_time = clock.now()
+prev_time = clock.now()
+last_log_time = clock.now()
 
 # Game constants
 # q = Point-and-click, w = Cone, e = Shield, r = Bear!, d = Flash, f = Heal
@@ -57,6 +59,8 @@ LEVEL_ORDER = [0, 1, 2, 0, 0, 3, 0, 1, 0, 1, 3, 1, 1, 2, 2, 3, 2, 2]
 BASIC_RANGE = 350
 # Range of Flash-R combo
 ALL_IN_RANGE = 450
+# % health to back at (cancels running scripts)
+BACK_HEALTH = 0.35
 # Turret aggro range
 TURRET_RANGE = 650
 # Enemy champion risk range
@@ -67,6 +71,8 @@ ASPECT = 1.4
 MINIMAP_MARGIN = 20
 # Debug display scale
 debug_display_scale = 0.5
+# Scale that health bars are searched at (see game_vision.find_all)
+VISION_SCALE = 0.5
 
 # Which side of the map we're on
 on_top_right = False
@@ -114,7 +120,12 @@ def reset() -> None:
     Resets the AI.
     """
     global main_status, sub_status, main_status_time, sub_status_time, level, ability_levels, cooldowns, \
-        on_top_right, has_turret_aggro, last_seen_health, last_seen_enemy, last_base, used_items, minimap_bounds, past_health
+        on_top_right, has_turret_aggro, last_seen_health, last_seen_enemy, last_base, used_items, minimap_bounds, past_health, \
+        curr_time, prev_time, last_log_time, optimal, prev_gold, closest_point, player_loc
+    action_script.cancel()
+    curr_time = clock.now()
+    prev_time = clock.now()
+    last_log_time = clock.now()
     main_status = "base"
     sub_status = "loading"
     main_status_time = float('-inf')
@@ -130,6 +141,10 @@ def reset() -> None:
     last_seen_enemy = float('-inf')
     last_base = float('-inf')
     used_items = set()
+    optimal = None
+    prev_gold = None
+    closest_point = (0, 0)
+    player_loc = (0, 0)
 
 
 def has_stun_up(img: np.ndarray, player: Player) -> bool:
@@ -139,8 +154,12 @@ def has_stun_up(img: np.ndarray, player: Player) -> bool:
     :param player: The player.
     :return: Whether stun is up.
     """
-    hsv_img = cv.cvtColor(img, cv.COLOR_BGR2HSV)
-    purple_pixel = hsv_img[player.y1 - 75 + 30, player.x1 - 20 + 104]
+    # Only convert the pixel that's needed, not the whole frame
+    ui_scale = geometry.get_ui_scale(img)
+    x, y = geometry.get_bar_origin(player.x1, player.y1, geometry.PLAYER_BAR, ui_scale)
+    x += geometry.scale_px(geometry.PLAYER_STUN[0], ui_scale)
+    y += geometry.scale_px(geometry.PLAYER_STUN[1], ui_scale)
+    purple_pixel = cv.cvtColor(img[y:y+1, x:x+1], cv.COLOR_BGR2HSV)[0, 0]
     if 139 <= purple_pixel[0] <= 145:
         return True
     else:
@@ -156,7 +175,8 @@ def get_current_loc(img: np.ndarray) -> None:
     global minimap_bounds, on_top_right, player_loc
     # Only look at the bottom-right part of the image
     if minimap_bounds[0] == -1:
-        curr_bounds = (img.shape[1] - 500, img.shape[0] - 500, img.shape[1], img.shape[0])
+        search = geometry.scale_px(geometry.MINIMAP_SEARCH, geometry.get_ui_scale(img))
+        curr_bounds = (img.shape[1] - search, img.shape[0] - search, img.shape[1], img.shape[0])
         curr_bounds = tuple(map(int, curr_bounds))
     else:
         curr_bounds = minimap_bounds
@@ -222,8 +242,7 @@ def minimap_right_click(x: float, y: float) -> None:
         return
     x = x * (minimap_bounds[2] - minimap_bounds[0]) + minimap_bounds[0]
     y = y * (minimap_bounds[3] - minimap_bounds[1]) + minimap_bounds[1]
-    controller.move_mouse_precise(x, y)
-    controller.right_click_only()
+    controller.right_click_precise(x, y)
 
 
 def update_closest_point(x: float, y: float) -> None:
@@ -275,11 +294,68 @@ def distance_from_lane(x: float, y: float) -> float:
 #         minimap_right_click(x + dx, y + dy)
 
 
+def observe_laning(img: np.ndarray, player: Player,
+                   ally_minions: List[Minion], ally_players: List[Player], ally_objectives: List[Objective],
+                   enemy_minions: List[Minion], enemy_players: List[Player], enemy_objectives: List[Objective]) -> None:
+    """
+    Updates what the AI knows about the lane (where the player is, their health, enemies, and turret aggro), without
+    choosing any actions. Runs on every frame, even while scripts are playing out.
+    """
+    global last_seen_enemy, has_turret_aggro, past_health
+
+    if player is None:
+        return
+    get_current_loc(img)
+    if enemy_players:
+        last_seen_enemy = curr_time
+
+    # Update turret aggro
+    player_in_range = False
+    enemy_in_range = False
+    allies_in_range = 0
+    for t in enemy_objectives:
+        if in_turret_range(t, player):
+            player_in_range = True
+        for p in enemy_players:
+            if in_turret_range(t, p):
+                enemy_in_range = True
+        # noinspection PyTypeChecker
+        for m in ally_minions + ally_players:
+            if in_turret_range(t, m, -100):
+                allies_in_range += 1
+    if not player_in_range:
+        has_turret_aggro = False
+    elif enemy_in_range or allies_in_range <= 1 or player.health < last_seen_health - 0.1:
+        has_turret_aggro = True
+
+    past_health.append(player.health)
+    past_health = past_health[-4:]
+
+
+def get_health_change(player: Player) -> float:
+    """
+    :return: How much the player's health differs from its recent average (negative if they're taking damage).
+    """
+    return player.health - np.average(past_health) if past_health else 0
+
+
+def should_interrupt(player: Optional[Player]) -> bool:
+    """
+    :return: Whether the running scripts (ex: a combo, or walking to the shop) should be cancelled, so that the AI can
+    react right away (ex: retreat at low health).
+    """
+    if main_status != "laning" or player is None:
+        return False
+    if sub_status == "backing" or sub_status == "backing_wait" or sub_status == "all_in":
+        # Already retreating, or committed to the fight
+        return False
+    return player.health < BACK_HEALTH
+
+
 def do_laning(img: np.ndarray, player: Player,
               ally_minions: List[Minion], ally_players: List[Player], ally_objectives: List[Objective],
               enemy_minions: List[Minion], enemy_players: List[Player], enemy_objectives: List[Objective]) -> None:
-    global sub_status, sub_status_time, last_seen_enemy, has_turret_aggro, \
-        level, last_seen_health, past_health, player_loc
+    global sub_status, sub_status_time, has_turret_aggro, level, last_seen_health
 
     # Check if the player is visible
     if player is None:
@@ -288,10 +364,9 @@ def do_laning(img: np.ndarray, player: Player,
         if sub_status_time >= 3:
             # Assume that the player died
             logger.info("Assuming that the player died")
-            rsleep(1)
             switch_status("base", "shopping")
+            action_script.run("respawn", action_script.wait(1))
         return
-    get_current_loc(img)
 
     # Level abilities if allowed
     if level < player.level and level < 18:
@@ -306,32 +381,9 @@ def do_laning(img: np.ndarray, player: Player,
 
     has_stun = has_stun_up(img, player)
     x, y = player.get_x(), player.get_y()
-    if enemy_players:
-        last_seen_enemy = curr_time
-
-    # Update turret aggro
-    player_in_range = False
-    enemy_in_range = False
-    allies_in_range = 0
-    for t in enemy_objectives:
-        if in_turret_range(t, player):
-            player_in_range = True
-        for p in enemy_players:
-            if in_turret_range(t, p):
-                enemy_in_range = True
-        # noinspection PyTypeChecker
-        for m in ally_minions + ally_players:
-            if in_turret_range(t, m, -100):
-                allies_in_range += 1
-    if not player_in_range:
-        has_turret_aggro = False
-    elif enemy_in_range or allies_in_range <= 1 or player.health < last_seen_health - 0.1:
-        has_turret_aggro = True
 
     # Check if we're being damaged by something (other than turret aggro)
-    past_health.append(player.health)
-    past_health = past_health[-4:]
-    health_change = player.health - np.average(past_health)
+    health_change = get_health_change(player)
     if health_change <= -0.0025:
         # Being damaged by something
         if sub_status != "all_in" and sub_status != "trading":
@@ -341,6 +393,7 @@ def do_laning(img: np.ndarray, player: Player,
             return
         elif sub_status == "trading":
             use_ability(2)
+    # Not updated while falling back, so turret aggro (see observe_laning) notices damage taken over several frames
     last_seen_health = player.health
 
     # Heal if at low health
@@ -357,7 +410,7 @@ def do_laning(img: np.ndarray, player: Player,
                 logger.info(f"Backing to buy items ({gold} gold)")
                 switch_status("laning", "backing")
         # Low health or mana
-        if player.health < 0.35:
+        if player.health < BACK_HEALTH:
             logger.info(f"Backing due to low health ({player.health:.2f})")
             switch_status("laning", "backing")
         elif player.mana < 0.05:
@@ -525,8 +578,10 @@ def do_laning(img: np.ndarray, player: Player,
             if can_use_skillshot(0) and (not has_stun or sub_status == "pushing" or random.random() < 0.08):
                 dist, angle = absolute_to_angle(x, y, m.get_x(), m.get_y())
                 if dist >= BASIC_RANGE:
+                    # Get in range first
                     move_towards(player, m.get_x(), m.get_y())
-                    rsleep(0.3)
+                    action_script.run("last_hit", last_hit_script(m.get_x(), m.get_y(), 0.3))
+                    return
                 use_skillshot(0, m.get_x(), m.get_y())
             attack_move(m.get_x(), m.get_y())
             return
@@ -606,20 +661,19 @@ def do_laning(img: np.ndarray, player: Player,
             use_ability(2)
             if target.health < 0.25 and can_use_skillshot(3):
                 use_skillshot(3, target.get_x(), target.get_y())
-                rsleep(0.1)
+                action_script.run("cast", action_script.wait(0.1))
                 return
             if can_use_skillshot(0):
                 use_skillshot(0, target.get_x(), target.get_y())
-                rsleep(0.1)
+                action_script.run("cast", action_script.wait(0.1))
                 return
             if can_use_skillshot(1):
                 use_skillshot(1, target.get_x(), target.get_y())
-                rsleep(0.1)
+                action_script.run("cast", action_script.wait(0.1))
                 return
             attack_move(target.get_x(), target.get_y())
-            rsleep(0.3)
-        right_click_direction(player, 150, rnum(retreat_dir, 5, True))
-        rsleep(0.3)
+            action_script.run("trade", action_script.wait(0.3))
+        action_script.run("retreat", retreat_script(player, 150, rnum(retreat_dir, 5, True)))
     elif sub_status == "all_in":
         # Attempt to kill as many enemies as possible
         # All-in if enemy health is below 70% at 3 or 4 stacks with E-W-Flash-R-Q-AA.
@@ -640,7 +694,7 @@ def do_laning(img: np.ndarray, player: Player,
         if BASIC_RANGE + 50 <= dist <= ALL_IN_RANGE + 50 and can_use_skillshot(4):
             # Flash
             use_skillshot(4, target.get_x(), target.get_y())
-            rsleep(0.3)
+            action_script.run("flash", action_script.wait(0.3))
         elif dist >= BASIC_RANGE - 25:
             # Move towards the target
             use_ability(2)
@@ -649,18 +703,18 @@ def do_laning(img: np.ndarray, player: Player,
             # Start (or continue) combo
             if can_use_skillshot(1):
                 use_skillshot(1, target.get_x(), target.get_y())
-                rsleep(0.1)
+                action_script.run("cast", action_script.wait(0.1))
                 return
             if can_use_skillshot(3):
                 dist, angle = absolute_to_angle(x, y, target.get_x(), target.get_y())
                 dist = min(BASIC_RANGE - 75.0, dist)
                 tx, ty = angle_to_absolute(x, y, dist, angle)
                 use_skillshot(3, tx, ty)
-                rsleep(0.1)
+                action_script.run("cast", action_script.wait(0.1))
                 return
             if can_use_skillshot(0):
                 use_skillshot(0, target.get_x(), target.get_y())
-                rsleep(0.1)
+                action_script.run("cast", action_script.wait(0.1))
                 return
             attack_move(target.get_x(), target.get_y())
     elif sub_status == "backing" or sub_status == "backing_wait":
@@ -668,14 +722,12 @@ def do_laning(img: np.ndarray, player: Player,
         if not enemy_minions and not enemy_players and not enemy_objectives:
             if sub_status == "backing":
                 right_click_direction(player, 500, retreat_dir)
-                rsleep(2)
                 logger.info("Recalling")
-                switch_status("laning", "backing_wait")
-                controller.press_key('b')
+                action_script.run("recall", recall_script())
             elif sub_status_time > 9:
-                rsleep(4)
                 logger.info("Switching to base")
                 switch_status("base", "shopping")
+                action_script.run("recall_wait", action_script.wait(4))
         else:
             # Run away
             if sub_status != "backing":
@@ -711,17 +763,51 @@ def open_shop() -> None:
     logger.info("Opening the shop")
     switch_status("base", "shopping")
     prev_gold = None
-    controller.move_mouse(900, 800)
+    action_script.run("open_shop", open_shop_script())
+
+
+def open_shop_script() -> Iterator[float]:
     controller.left_click(900, 800)
-    rsleep(0.35)
+    yield 0.35
     controller.press_key('p')
-    rsleep(0.3)
+    yield 0.3
 
 
 def exit_shop() -> None:
     switch_status("base", "going_to_lane")
+    action_script.run("exit_shop", exit_shop_script())
+
+
+def exit_shop_script() -> Iterator[float]:
     controller.press_key('p')
-    rsleep(0.5)
+    yield 0.5
+
+
+def buy_items_script(items: List[Tuple[float, float]], away: Tuple[float, float]) -> Iterator[float]:
+    """
+    Buys items, then moves the mouse away from them.
+    :param items: The positions of the items to buy, in order.
+    :param away: Where to move the mouse afterwards.
+    """
+    for x, y in items:
+        controller.right_click_precise(x, y)
+        yield 0.3
+    controller.move_mouse_precise(*away)
+    yield 0.35
+
+
+def dismiss_afk_script(click_x: float, click_y: float) -> Iterator[float]:
+    """
+    Dismisses the AFK warning, then moves around randomly.
+    :param click_x: The x coordinate of the warning's buttons.
+    :param click_y: The y coordinate of the warning's first button.
+    """
+    for i in range(7):
+        controller.left_click(click_x, click_y + i * 40)
+        yield 0.15
+    for i in range(7):
+        controller.right_click(click_x + rnum(0, 200, True), click_y + 40 + rnum(0, 150, True))
+        yield 0.4
 
 
 def find_gold(img: np.ndarray) -> int:
@@ -730,13 +816,7 @@ def find_gold(img: np.ndarray) -> int:
     :param img: Screenshot of the game state.
     :return: The amount of gold the player has, or -1 if it's not found.
     """
-    width = img.shape[1]
-    height = img.shape[0]
-    scale = height / 1080
-    x1 = int(width * 0.5 + 165 * scale)
-    y1 = int(height - 35 * scale)
-    x2 = int(width * 0.5 + 220 * scale)
-    y2 = int(height - 8 * scale)
+    x1, y1, x2, y2 = geometry.get_hud_region(img, geometry.GOLD)
     gold_img = img[y1:y2, x1:x2]
     # cv.imshow("Gold", cv.resize(gold_img, (0, 0), fx=5, fy=5))
     gold = vision.find_number(gold_img)
@@ -752,7 +832,7 @@ def do_base(img: np.ndarray, player: Player,
     :param img: Screenshot of the game state.
     """
     global optimal, prev_gold, last_base, used_items
-    last_base = time.time()
+    last_base = clock.now()
 
     if sub_status == "shopping" or sub_status == "loading":
         # If shopping takes too long, uncomment these lines to skip it
@@ -818,16 +898,9 @@ def do_base(img: np.ndarray, player: Player,
             logger.warning("AFK warning detected, dismissing...")
             # Dismiss the warning
             click_x = (afk_text.x1 + leaverbuster_text.x1) // 2 - 16
-            for i in range(7):
-                click_y = (afk_text.y2 + leaverbuster_text.y2) // 2 + 60 + i * 40
-                controller.left_click(click_x, click_y)
-                rsleep(0.15)
-            # Move randomly
-            for i in range(7):
-                click_y = (afk_text.y2 + leaverbuster_text.y2) // 2 + 100
-                controller.right_click(click_x + rnum(0, 200, True), click_y + rnum(0, 150, True))
-                rsleep(0.4)
-            logger.warning("Dismissed, attempting to reset...")
+            click_y = (afk_text.y2 + leaverbuster_text.y2) // 2 + 60
+            action_script.run("dismiss_afk", dismiss_afk_script(click_x, click_y))
+            logger.warning("Dismissing, attempting to reset...")
             # Back
             switch_status("laning", "backing")
             return
@@ -864,23 +937,19 @@ def do_base(img: np.ndarray, player: Player,
         # Buy items by location on the shop screen
         items = sorted(items, key=lambda t: (t.row, t.col))
         logger.debug(f"Items: {[t.text for t in items]}")
-        bought_items = False
+        bought_items = []
         for t in items:
             cost = int(t.text)
             if cost <= gold:
                 logger.info(f"Buying item at row {t.row} column {t.col} with cost {cost}")
-                controller.move_mouse_precise(t.get_x(), t.get_y() - 35)
-                controller.right_click_only()
                 gold -= cost
                 used_items.add((t.row, t.col))
-                bought_items = True
-                rsleep(0.3)
+                bought_items.append((t.get_x(), t.get_y() - 35))
             else:
                 break
 
-        # Move away from the shop
-        controller.move_mouse_precise(optimal.x1 + 250, optimal.y1 - 40)
-        rsleep(0.35)
+        # Buy, then move away from the shop
+        action_script.run("buy_items", buy_items_script(bought_items, (optimal.x1 + 250, optimal.y1 - 40)))
 
         if not bought_items:
             # Exit the shop
@@ -944,6 +1013,31 @@ def move_towards(player: Player, x: float, y: float) -> None:
     right_click_direction(player, dist, angle)
 
 
+def last_hit_script(x: float, y: float, delay: float) -> Iterator[float]:
+    """
+    Waits (ex: to get in range), then last hits the minion at the given coordinates.
+    """
+    yield delay
+    use_skillshot(0, x, y)
+    attack_move(x, y)
+
+
+def retreat_script(player: Player, dist: float, deg: float) -> Iterator[float]:
+    """
+    Walks away in the given direction.
+    """
+    right_click_direction(player, dist, deg)
+    yield 0.3
+
+
+def recall_script() -> Iterator[float]:
+    # Wait to get somewhere safe
+    yield 2
+    # The recall timeout in do_laning counts from when 'b' is pressed
+    switch_status("laning", "backing_wait")
+    controller.press_key('b')
+
+
 def angle_to_absolute(x: float, y: float, dist: float, deg: float) -> (float, float):
     """
     Gets the point a certain distance away from (x, y) in the given direction.
@@ -980,9 +1074,7 @@ def right_click_direction(player: Player, dist: float, deg: float, is_precise=Fa
     :param is_precise: Whether to use precise mouse movement.
     """
     x, y = angle_to_absolute(player.get_x(), player.get_y(), dist, deg)
-    if is_precise:
-        controller.move_mouse(x, y)
-    controller.right_click(x, y)
+    right_click(x, y, is_precise)
 
 
 def attack_move_direction(player: Player, dist: float, deg: float, is_precise=False) -> None:
@@ -994,9 +1086,7 @@ def attack_move_direction(player: Player, dist: float, deg: float, is_precise=Fa
     :param is_precise: Whether to use precise mouse movement.
     """
     x, y = angle_to_absolute(player.get_x(), player.get_y(), dist, deg)
-    if is_precise:
-        controller.move_mouse(x, y)
-    controller.attack_move(x, y)
+    attack_move(x, y, is_precise)
 
 
 def right_click(x: float, y: float, is_precise=False) -> None:
@@ -1007,10 +1097,9 @@ def right_click(x: float, y: float, is_precise=False) -> None:
     :param is_precise: Whether to use precise mouse movement.
     """
     if is_precise:
-        controller.move_mouse_precise(x, y)
+        controller.right_click_precise(x, y)
     else:
-        controller.move_mouse(x, y)
-    controller.right_click(x, y)
+        controller.right_click(x, y)
 
 
 def attack_move(x: float, y: float, is_precise=False) -> None:
@@ -1020,11 +1109,7 @@ def attack_move(x: float, y: float, is_precise=False) -> None:
     :param y: The y coordinate.
     :param is_precise: Whether to use precise mouse movement.
     """
-    if is_precise:
-        controller.move_mouse_precise(x, y)
-    else:
-        controller.move_mouse(x, y)
-    controller.attack_move(x, y)
+    controller.attack_move(x, y, is_precise)
 
 
 def in_turret_range(turret: Objective, loc, delta=0) -> bool:
@@ -1045,28 +1130,65 @@ def switch_status(new_main: str, new_sub="") -> None:
         sub_status_time = 0
 
 
-def process(img: np.ndarray) -> None:
+def get_capture_plan(w: int, h: int) -> CapturePlan:
+    """
+    Gets the parts of the screen that the AI will look at in its current state, so the rest doesn't need to be
+    captured. Health bars are only searched for when the AI uses them (ex: not while shopping).
+    :param w: The game's width.
+    :param h: The game's height.
+    """
+    if main_status == "base" and sub_status in ("loading", "shopping"):
+        gold = geometry.get_capture_regions(w, h)["gold"]
+        if sub_status == "loading":
+            # Level up text
+            text = (w // 4, h // 2, w * 3 // 4, h)
+        elif optimal is None:
+            # Optimal or victory/defeat text
+            text = (150, 150, w * 2 // 3, h * 3 // 4)
+        else:
+            text = (optimal.x1 - 10, optimal.y1 - 10, optimal.x2 + 560, optimal.y2 + 350)
+        regions = [(max(x1, 0), max(y1, 0), min(x2, w), min(y2, h)) for x1, y1, x2, y2 in (text, gold)]
+        return CapturePlan(tuple(regions), entities=False)
+    if main_status == "end":
+        return CapturePlan((), entities=False)
+    return FULL_CAPTURE
+
+
+def process(img: np.ndarray, detections: Optional[Tuple[List[Minion], List[Player], List[Objective]]] = None,
+            plan: CapturePlan = FULL_CAPTURE) -> None:
     """
     Chooses an action to perform based on the screenshot of the game state.
     Assumes that the AI is using locked camera.
     :param img: Screenshot of the game state.
+    :param detections: The result of vision.find_all on the screenshot, if it was already found (ex: by the vision
+    stage of a pipeline). If None, find_all is called here (if the plan needs it).
+    :param plan: What was captured in the screenshot (see get_capture_plan).
     """
     global curr_time, prev_time, last_log_time, level, main_status_time, sub_status_time
 
-    # Parse the screenshot and update variables
-    curr_time += time.time() - prev_time
-    main_status_time += time.time() - prev_time
-    sub_status_time += time.time() - prev_time
-    for i in range(len(cooldowns)):
-        cooldowns[i] -= time.time() - prev_time
-        cooldowns[i] = max(0, cooldowns[i])
-    if last_log_time + 5 < time.time():
-        logger.info(f"FPS: {1 / (time.time() - prev_time):.1f}")
-        last_log_time = time.time()
-    prev_time = time.time()
+    # Parse the screenshot and update variables (scripts can change them too)
+    with action_script.runner.lock:
+        now = clock.now()
+        curr_time += now - prev_time
+        main_status_time += now - prev_time
+        sub_status_time += now - prev_time
+        for i in range(len(cooldowns)):
+            cooldowns[i] -= now - prev_time
+            cooldowns[i] = max(0, cooldowns[i])
+    if last_log_time + 5 < now:
+        logger.info(f"FPS: {1 / max(now - prev_time, 1e-6):.1f}")
+        last_log_time = now
+    prev_time = now
+
+    # The state could have changed since the screenshot was planned
+    if not plan.covers(get_capture_plan(img.shape[1], img.shape[0])):
+        logger.debug("Skipping a frame that's missing parts for the current state")
+        return
 
     # Get all game information
-    raw_minions, raw_players, raw_objectives = vision.find_all(img, scale=1)
+    if detections is None:
+        detections = vision.find_all(img, scale=VISION_SCALE) if plan.entities else ([], [], [])
+    raw_minions, raw_players, raw_objectives = detections
     if is_debug:
         draw_results(img, raw_minions, raw_players, raw_objectives, display_scale=debug_display_scale)
 
@@ -1102,6 +1224,17 @@ def process(img: np.ndarray) -> None:
     #              f"Champs {len(ally_players)}/{len(enemy_players)}, "
     #              f"Objectives {len(ally_objectives)}/{len(enemy_objectives)}")
 
+    if main_status == "laning":
+        observe_laning(img, player, ally_minions, ally_players, ally_objectives, enemy_minions, enemy_players,
+                       enemy_objectives)
+
+    # Let the last actions play out before choosing new ones, unless something more important came up
+    if action_script.is_busy():
+        if not should_interrupt(player):
+            return
+        logger.info("Cancelling scripts to react")
+        action_script.cancel()
+
     # Run the AI
     if main_status == "base":
         do_base(img, player, ally_minions, ally_players, ally_objectives, enemy_minions, enemy_players,
@@ -1112,14 +1245,18 @@ def process(img: np.ndarray) -> None:
     elif main_status == "end":
         # Game is over; toggle and reset the bot
         logger.info("Automatically toggling and resetting the bot...")
-        rsleep(0.6)
-        key_listener.on_shift_t()
-        rsleep(0.2)
-        key_listener.on_shift_9()
+        action_script.run("end", end_script())
     else:
         logger.warning(f"Unknown main status {main_status}")
 
 
+def end_script() -> Iterator[float]:
+    yield 0.6
+    # Both at once, since toggling the bot off cancels scripts (the events are still handled in order)
+    key_listener.on_shift_t()
+    key_listener.on_shift_9()
+
+
 def draw_results(img, minions, players, objectives, display_scale=1.0) -> None:
     # Display minion matches
     res = img.copy()
@@ -250,7 +250,8 @@ def main():
             break
         logger.info(f"Game time: {get_game_time()}s")
         img = window_tracker.take_game_screenshot()
-        img_queue.put(img)
+        # The queue pickles the screenshot later, by which point its buffer could hold a newer one
+        img_queue.put(img.copy())
         raw_minions, raw_players, raw_objectives = game_vision.find_all(img)
         save_data(img, raw_minions, raw_players, raw_objectives)
     if all_data:
@@ -0,0 +1,223 @@
+"""
+Replays recorded footage of a match (see listeners.vision.frame_source) through the manual AI, as fast as possible.
+Time is simulated (each frame is a fixed amount of time after the last one, and sleeps don't wait), random numbers are
+seeded, and the AI's inputs are recorded instead of being sent to the game. So replaying the same footage always gives
+the same actions, which can be saved and compared against later (ex: to check that an optimization didn't change the
+AI's behavior, or to benchmark the decision logic without the game).
+
+Usage: python -m ai.replay --source images --path <folder> [--expected actions.json] [--save actions.json]
+"""
+
+import argparse
+import hashlib
+import json
+import numbers
+import time
+from dataclasses import asdict, dataclass
+from typing import List, Optional, Tuple
+
+from ai import manual_ai
+from controllers import action_script, game_controller
+from listeners.vision import game_vision
+from listeners.vision.frame_source import FRAME_SOURCES, FrameSource, SourceExhausted, create_source
+from misc import clock, color_logging, rng
+
+logger = color_logging.getLogger('ai', level=color_logging.DEBUG)
+
+
+@dataclass(frozen=True)
+class Action:
+    """
+    An input that the AI sent to the game.
+    """
+    # When the action happened (simulated time since the replay started), in seconds
+    time: float
+    # The game_controller function that was called (ex: "right_click")
+    name: str
+    # The function's arguments (keys as strings, coordinates rounded)
+    args: Tuple
+
+    def __str__(self):
+        return f"{self.time:.3f}s {self.name}{self.args}"
+
+
+class RecordingController:
+    """
+    Stands in for game_controller: records each input with the time it was sent, instead of sending it.
+    """
+
+    def __init__(self, replay_clock: clock.Clock):
+        """
+        :param replay_clock: The clock that actions are timed with.
+        """
+        self.clock = replay_clock
+        self.start_time = replay_clock.now()
+        self.actions: List[Action] = []
+
+    def record(self, name: str, *args) -> None:
+        # Rounded, so that tiny floating point differences (ex: between platforms) don't count as different actions
+        args = tuple(round(float(a), 2) if isinstance(a, numbers.Real) else str(a) for a in args)
+        action = Action(round(self.clock.now() - self.start_time, 3), name, args)
+        logger.debug(f"Recorded {action}")
+        self.actions.append(action)
+
+    def use_action(self, key) -> None:
+        self.record("use_action", key)
+
+    def use_skillshot(self, key, x: float, y: float) -> None:
+        self.record("use_skillshot", key, x, y)
+
+    def attack_move(self, x: float, y: float, precise=False) -> None:
+        self.record("attack_move_precise" if precise else "attack_move", x, y)
+
+    def level_ability(self, key) -> None:
+        self.record("level_ability", key)
+
+    def press_key(self, key) -> None:
+        self.record("press_key", key)
+
+    def left_click(self, x: float, y: float) -> None:
+        self.record("left_click", x, y)
+
+    def right_click(self, x: float, y: float) -> None:
+        self.record("right_click", x, y)
+
+    def left_click_precise(self, x: float, y: float) -> None:
+        self.record("left_click_precise", x, y)
+
+    def right_click_precise(self, x: float, y: float) -> None:
+        self.record("right_click_precise", x, y)
+
+    def left_click_only(self) -> None:
+        self.record("left_click_only")
+
+    def right_click_only(self) -> None:
+        self.record("right_click_only")
+
+    def move_mouse(self, x: float, y: float) -> None:
+        self.record("move_mouse", x, y)
+
+    def move_mouse_precise(self, x: float, y: float) -> None:
+        self.record("move_mouse_precise", x, y)
+
+
+def replay(source: FrameSource, seed=0, frame_time=1 / 30, max_frames: Optional[int] = None,
+           status: Optional[Tuple[str, str]] = None) -> List[Action]:
+    """
+    Feeds every frame of the footage through the AI (starting from a reset state), and records what it does.
+    The vision engine must already be initialized.
+    :param source: The recorded footage.
+    :param seed: The seed for the AI's random choices.
+    :param frame_time: The simulated time between frames, in seconds (ex: 1 / the footage's fps).
+    :param max_frames: Stops after this many frames (defaults to the whole footage).
+    :param status: The (main, sub) status to start in, for footage that doesn't start at the loading screen (ex:
+    ("laning", "passive")).
+    :return: The actions the AI took, in order.
+    """
+    old_clock, old_controller, old_debug = clock.get_clock(), manual_ai.controller, manual_ai.is_debug
+    old_runner, old_dry_run = action_script.runner, game_controller.dry_run
+    replay_clock = clock.SimulatedClock()
+    recorder = RecordingController(replay_clock)
+    # Action scripts run between frames, instead of on their own thread
+    runner = action_script.ScriptRunner(threaded=False)
+    clock.set_clock(replay_clock)
+    action_script.set_runner(runner)
+    rng.seed(seed)
+    manual_ai.controller = recorder
+    manual_ai.is_debug = False
+    # Anything that still reaches the real controller is dropped, so replays never load the input controllers (which
+    # need pynput and Windows) or touch the real mouse and keyboard
+    game_controller.dry_run = True
+    try:
+        manual_ai.reset()
+        if status is not None:
+            manual_ai.switch_status(*status)
+        while max_frames is None or source.count < max_frames:
+            # The end of the game toggles the bot off, which would affect the real key listener
+            if manual_ai.main_status == "end":
+                logger.info(f"Game ended after {source.count} frames")
+                break
+            try:
+                img = source.get_frame()
+            except SourceExhausted:
+                break
+            replay_clock.advance(frame_time)
+            runner.update()
+            h, w = img.shape[:2]
+            manual_ai.process(img, plan=manual_ai.get_capture_plan(w, h))
+            runner.update()
+    finally:
+        action_script.set_runner(old_runner)
+        clock.set_clock(old_clock)
+        manual_ai.controller = old_controller
+        manual_ai.is_debug = old_debug
+        game_controller.dry_run = old_dry_run
+        manual_ai.reset()
+    return recorder.actions
+
+
+def actions_digest(actions: List[Action]) -> str:
+    """
+    :return: A short hash of the actions, to quickly check whether two replays did the same thing.
+    """
+    return hashlib.sha256(json.dumps([asdict(a) for a in actions]).encode()).hexdigest()[:16]
+
+
+def save_actions(actions: List[Action], path: str) -> None:
+    with open(path, 'w') as f:
+        json.dump([asdict(a) for a in actions], f, indent=1)
+
+
+def load_actions(path: str) -> List[Action]:
+    with open(path) as f:
+        return [Action(a["time"], a["name"], tuple(a["args"])) for a in json.load(f)]
+
+
+def first_difference(actions: List[Action], expected: List[Action]) -> Optional[int]:
+    """
+    :return: The index of the first action that differs between the two lists, or None if they're the same.
+    """
+    for i, (a, b) in enumerate(zip(actions, expected)):
+        if a != b:
+            return i
+    return None if len(actions) == len(expected) else min(len(actions), len(expected))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Replay recorded footage through the manual AI.")
+    parser.add_argument("--source", choices=[s for s in FRAME_SOURCES if s != "live"], default="images")
+    parser.add_argument("--path", required=True, help="The screenshot folder or video file to replay.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fps", type=float, default=30, help="The simulated frame rate of the footage.")
+    parser.add_argument("--max-frames", type=int)
+    parser.add_argument("--runs", type=int, default=1, help="Replays this many times, checking they all match.")
+    parser.add_argument("--expected", help="A saved action stream to compare against.")
+    parser.add_argument("--save", help="Where to save the action stream.")
+    args = parser.parse_args()
+
+    game_vision.init_vision()
+    try:
+        results = []
+        for run in range(args.runs):
+            footage = create_source(args.source, args.path)
+            start_time = time.time()
+            results.append(replay(footage, args.seed, 1 / args.fps, args.max_frames))
+            elapsed = time.time() - start_time
+            footage.close()
+            logger.info(f"Run {run + 1}: {footage.count} frames in {elapsed:.2f}s "
+                        f"({footage.count / max(elapsed, 1e-9):.1f} frames/s), {len(results[-1])} actions, "
+                        f"digest {actions_digest(results[-1])}")
+        for run, actions in enumerate(results[1:], 2):
+            index = first_difference(actions, results[0])
+            if index is not None:
+                logger.error(f"Run {run} differs from run 1 at action {index}")
+        if args.save:
+            save_actions(results[0], args.save)
+        if args.expected:
+            index = first_difference(results[0], load_actions(args.expected))
+            if index is None:
+                logger.info(f"Actions match {args.expected}")
+            else:
+                logger.error(f"Actions differ from {args.expected} at action {index}")
+    finally:
+        game_vision.close()
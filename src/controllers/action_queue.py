@@ -0,0 +1,164 @@
+"""
+The queue that mouse and keyboard events wait in before their thread performs them.
+Urgent events (ex: flash or heal) skip ahead of less important ones (ex: walking), consecutive mouse movements are
+merged into the newest one, and every event has a deadline: if it can't start in time, it's thrown away instead of
+being performed late. The queue is bounded; when it's full, the oldest of the least important events is dropped.
+"""
+
+import heapq
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
+
+from misc import clock, color_logging
+
+logger = color_logging.getLogger('controls', level=color_logging.INFO)
+
+# Priorities (lower goes first)
+URGENT = 0
+NORMAL = 1
+LOW = 2
+
+
+@dataclass(order=True)
+class QueuedAction:
+    priority: int
+    # Order that actions were queued in, so that actions with the same priority run in order
+    seq: int
+    func: Callable = field(compare=False)
+    args: tuple = field(compare=False)
+    # When the action was queued, and when it has to start by
+    put_time: float = field(compare=False)
+    deadline: float = field(compare=False)
+    # Consecutive actions with the same key (ex: mouse movements) are merged
+    key: Optional[str] = field(compare=False, default=None)
+
+
+@dataclass
+class QueueStats:
+    name: str
+    # Number of actions performed, merged into a newer one, past their deadline, or dropped because the queue was full
+    done: int = 0
+    coalesced: int = 0
+    expired: int = 0
+    dropped: int = 0
+    # Time from queueing an action to starting it (in seconds)
+    total_latency: float = 0.0
+    max_latency: float = 0.0
+
+    @property
+    def avg_latency(self) -> float:
+        return self.total_latency / self.done if self.done else 0
+
+
+def describe(func: Callable, args: tuple) -> str:
+    return f"{getattr(func, '__name__', func)}{args}"
+
+
+class ActionQueue:
+    """
+    A bounded priority queue of actions (functions to call) with deadlines.
+    """
+
+    def __init__(self, name: str, max_size=10, ttl=1.0):
+        """
+        :param name: What the queue is for (for logging).
+        :param max_size: The most actions that can wait at once.
+        :param ttl: How long actions can wait before they expire (unless given when queueing them), in seconds.
+        """
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.cond = threading.Condition()
+        self.heap: List[QueuedAction] = []
+        self.seq = 0
+        # The last action queued, if it hasn't started yet
+        self.last: Optional[QueuedAction] = None
+        self.stats = QueueStats(name)
+
+    def put(self, func: Callable, *args, priority=NORMAL, ttl: Optional[float] = None,
+            key: Optional[str] = None) -> None:
+        """
+        Queues an action.
+        :param func: The function to call.
+        :param args: The function's arguments.
+        :param priority: URGENT, NORMAL, or LOW.
+        :param ttl: How long the action can wait before it expires, in seconds (defaults to the queue's).
+        :param key: If given, and the last action queued has the same key and priority and hasn't started yet, it's
+        replaced by this one (ex: to only move the mouse to the newest target).
+        """
+        with self.cond:
+            now = clock.now()
+            deadline = now + (self.ttl if ttl is None else ttl)
+            last = self.last
+            if key is not None and last is not None and last.key == key and last.priority == priority:
+                last.func, last.args, last.deadline = func, args, deadline
+                self.stats.coalesced += 1
+                return
+            if len(self.heap) >= self.max_size:
+                # The oldest of the least important actions is the most stale
+                victim = min(self.heap, key=lambda a: (-a.priority, a.seq))
+                if victim.priority < priority:
+                    logger.debug(f"{self.name} queue is full of more important actions, dropping "
+                                 f"{describe(func, args)}")
+                    self.stats.dropped += 1
+                    return
+                logger.debug(f"{self.name} queue is full ({len(self.heap)} actions), dropping "
+                             f"{describe(victim.func, victim.args)}")
+                self.heap.remove(victim)
+                heapq.heapify(self.heap)
+                if victim is self.last:
+                    self.last = None
+                self.stats.dropped += 1
+            self.seq += 1
+            action = QueuedAction(priority, self.seq, func, args, now, deadline, key)
+            heapq.heappush(self.heap, action)
+            self.last = action
+            self.cond.notify()
+
+    def get(self) -> QueuedAction:
+        """
+        Waits for the next action that hasn't expired, and takes it out of the queue.
+        """
+        with self.cond:
+            while True:
+                while not self.heap:
+                    self.cond.wait()
+                action = heapq.heappop(self.heap)
+                if action is self.last:
+                    self.last = None
+                now = clock.now()
+                if now > action.deadline:
+                    logger.debug(f"{describe(action.func, action.args)} expired after "
+                                 f"{(now - action.put_time) * 1000:.0f}ms in the {self.name} queue")
+                    self.stats.expired += 1
+                    continue
+                latency = now - action.put_time
+                self.stats.done += 1
+                self.stats.total_latency += latency
+                self.stats.max_latency = max(self.stats.max_latency, latency)
+                return action
+
+    def qsize(self) -> int:
+        return len(self.heap)
+
+    def clear(self) -> None:
+        """
+        Throws away every waiting action.
+        """
+        with self.cond:
+            self.heap.clear()
+            self.last = None
+
+    def get_stats(self) -> QueueStats:
+        """
+        :return: A copy of the queue's statistics.
+        """
+        with self.cond:
+            return QueueStats(**vars(self.stats))
+
+    def log_stats(self) -> None:
+        stats = self.get_stats()
+        logger.info(f"{stats.name} queue: {stats.done} actions, {stats.avg_latency * 1000:.1f}ms avg / "
+                    f"{stats.max_latency * 1000:.1f}ms max latency, {stats.coalesced} merged, "
+                    f"{stats.expired} expired, {stats.dropped} dropped")
@@ -0,0 +1,131 @@
+"""
+Runs timed action scripts: sequences of inputs with pauses in between (ex: opening the shop, then waiting for it to
+show up), on their own thread, so the AI doesn't have to sleep while they play out.
+
+A script is a generator that sends inputs (ex: through game_controller), and yields how long to wait (in seconds)
+before continuing. Waits are randomized like rsleep. Scripts run one at a time, in the order they were started.
+"""
+
+import threading
+from collections import deque
+from typing import Deque, Iterator, Optional, Tuple
+
+from misc import clock, color_logging
+from misc.rng import rnum
+
+logger = color_logging.getLogger('controls', level=color_logging.INFO)
+
+
+class ScriptRunner:
+    """
+    Runs scripts, either on a thread of its own, or whenever update() is called (ex: once per frame, while replaying
+    with a simulated clock).
+    """
+
+    def __init__(self, threaded=True):
+        """
+        :param threaded: Whether to run scripts on a thread (started when the first script is).
+        """
+        self.threaded = threaded
+        self.scripts: Deque[Tuple[str, Iterator[float]]] = deque()
+        # When the current script's next step should run
+        self.next_time = 0.0
+        # Held while a step runs, so that steps can safely change the state of whatever started them
+        self.lock = threading.RLock()
+        self.condition = threading.Condition(self.lock)
+        self.thread: Optional[threading.Thread] = None
+
+    def run(self, name: str, script: Iterator[float]) -> None:
+        """
+        Starts a script (after every script that's already running).
+        :param name: What the script does, for logging.
+        :param script: The script (a generator that yields wait times).
+        """
+        with self.condition:
+            if not self.scripts:
+                self.next_time = clock.now()
+            self.scripts.append((name, script))
+            logger.debug(f"Started script {name} ({len(self.scripts)} running)")
+            self.condition.notify()
+        if self.threaded and self.thread is None:
+            self.thread = threading.Thread(target=self._run_loop, name="scripts", daemon=True)
+            self.thread.start()
+
+    def is_busy(self) -> bool:
+        """
+        :return: Whether any scripts are still running.
+        """
+        return bool(self.scripts)
+
+    def cancel(self) -> None:
+        """
+        Stops every script (inputs that were already sent aren't undone).
+        """
+        with self.condition:
+            if self.scripts:
+                logger.debug(f"Cancelled scripts {[name for name, _ in self.scripts]}")
+            self.scripts.clear()
+            self.condition.notify()
+
+    def update(self) -> Optional[float]:
+        """
+        Runs every step of the scripts whose time has come.
+        :return: When the next step should run, or None if there are no scripts left.
+        """
+        with self.lock:
+            while self.scripts:
+                if clock.now() < self.next_time:
+                    return self.next_time
+                name, script = self.scripts[0]
+                try:
+                    delay = next(script)
+                except StopIteration:
+                    logger.debug(f"Finished script {name}")
+                    self.scripts.popleft()
+                    continue
+                except Exception as e:
+                    logger.error(f"Error running script {name}: {e}")
+                    self.scripts.popleft()
+                    continue
+                self.next_time = clock.now() + max(rnum(delay), 0)
+            return None
+
+    def _run_loop(self) -> None:
+        with self.condition:
+            while True:
+                next_time = self.update()
+                self.condition.wait(None if next_time is None else max(next_time - clock.now(), 0))
+
+
+def wait(seconds: float) -> Iterator[float]:
+    """
+    A script that only waits (ex: to hold off on new actions until the last ones have played out).
+    """
+    yield seconds
+
+
+runner = ScriptRunner()
+
+
+def run(name: str, script: Iterator[float]) -> None:
+    """
+    Starts a script on the current runner. See ScriptRunner.run.
+    """
+    runner.run(name, script)
+
+
+def is_busy() -> bool:
+    return runner.is_busy()
+
+
+def cancel() -> None:
+    runner.cancel()
+
+
+def set_runner(new_runner: ScriptRunner) -> None:
+    """
+    Replaces the runner that scripts are started on (ex: with one that isn't threaded, for replays).
+    """
+    global runner
+    runner.cancel()
+    runner = new_runner
@@ -1,17 +1,61 @@
 """
 Contains helper functions to do common actions in League of Legends.
 """
-from typing import Union, Tuple
+from types import ModuleType
+from typing import TYPE_CHECKING, Optional, Union, Tuple
 
-from pynput.keyboard import Key
-
-import controllers.keyboard.keyboard as keyboard
-import controllers.mouse.mouse as mouse
+from controllers.action_queue import LOW, NORMAL, URGENT
 from misc import color_logging
 from listeners.vision import window_tracker
 
+if TYPE_CHECKING:
+    from pynput.keyboard import Key
+
 logger = color_logging.getLogger('controls', level=color_logging.INFO)
 dry_run = False
+# The keyboard and mouse controllers, imported when the first input is sent. They need pynput (and the mouse needs
+# Windows), so importing them up front would stop the bot from running with dry_run on other platforms.
+keyboard: Optional[ModuleType] = None
+mouse: Optional[ModuleType] = None
+# Summoner spells (ex: flash and heal) skip ahead of everything else
+SUMMONER_KEYS = ('d', 'f')
+# Keys that change the state the AI keeps track of (the shop and recalling), so they're pressed however late they are
+# instead of expiring (like leveling abilities)
+STATE_KEYS = ('p', 'b')
+# How long movement can wait before it's outdated, in seconds
+MOVE_TTL = 0.5
+# Walking commands (right clicks and attack moves) share this key, so only the newest one that hasn't started yet is
+# performed (see ActionQueue.put)
+WALK_KEY = "walk"
+# Clicks on the UI (ex: buying items) change the state the AI keeps track of, so like STATE_KEYS they never expire
+UI_CLICK_TTL = float('inf')
+
+
+def get_keyboard() -> ModuleType:
+    global keyboard
+    if keyboard is None:
+        import controllers.keyboard.keyboard as keyboard_controller
+        keyboard = keyboard_controller
+    return keyboard
+
+
+def get_mouse() -> ModuleType:
+    global mouse
+    if mouse is None:
+        import controllers.mouse.mouse as mouse_controller
+        mouse = mouse_controller
+    return mouse
+
+
+def get_priority(key: Union[str, "Key"]) -> int:
+    return URGENT if key in SUMMONER_KEYS else NORMAL
+
+
+def get_ttl(key: Union[str, "Key"]) -> Optional[float]:
+    """
+    :return: How long pressing the key can wait before it expires (None for the queue's default).
+    """
+    return float('inf') if key in STATE_KEYS else None
 
 
 def calc_position(x: float, y: float) -> Tuple[float, float]:
@@ -21,7 +65,7 @@ def calc_position(x: float, y: float) -> Tuple[float, float]:
     return x, y
 
 
-def use_action(key: Union[str, Key]) -> None:
+def use_action(key: Union[str, "Key"]) -> None:
     """
     Uses an ability / item / summoner spell by pressing the given key.
     :param key: The key to press.
@@ -29,10 +73,10 @@ def use_action(key: Union[str, Key]) -> None:
     logger.debug(f"Use action {key}")
     if dry_run:
         return
-    keyboard.press_key(key)
+    get_keyboard().press_key(key, get_priority(key), get_ttl(key))
 
 
-def use_skillshot(key: Union[str, Key], x: float, y: float) -> None:
+def use_skillshot(key: Union[str, "Key"], x: float, y: float) -> None:
     """
     Uses a skillshot with the given key, aimed at the given coordinates.
     :param key: The key to press.
@@ -43,25 +87,26 @@ def use_skillshot(key: Union[str, Key], x: float, y: float) -> None:
     if dry_run:
         return
     x, y = calc_position(x, y)
-    mouse.move_mouse(x, y)
-    mouse.call_function(keyboard.press_key, key)
+    # Aiming and casting are one action, so the key is never pressed with the mouse somewhere else
+    get_mouse().move_mouse_and_call(x, y, get_keyboard().press_key_now, key, priority=get_priority(key))
 
 
-def attack_move(x: float, y: float) -> None:
+def attack_move(x: float, y: float, precise=False) -> None:
     """
     Attack moves to the given coordinates.
     :param x: The x coordinate to move to.
     :param y: The y coordinate to move to.
+    :param precise: Whether to move the mouse precisely.
     """
     logger.debug(f"Attack move to ({x}, {y})")
     if dry_run:
         return
     x, y = calc_position(x, y)
-    mouse.move_mouse(x, y)
-    mouse.call_function(keyboard.press_key, 'a')
+    get_mouse().move_mouse_and_call(x, y, get_keyboard().press_key_now, 'a', precise=precise, priority=LOW,
+                                    ttl=MOVE_TTL, key=WALK_KEY)
 
 
-def level_ability(key: Union[str, Key]) -> None:
+def level_ability(key: Union[str, "Key"]) -> None:
     """
     Attempts to level an ability by pressing Control + the given key.
     :param key: The key to press.
@@ -69,14 +114,14 @@ def level_ability(key: Union[str, Key]) -> None:
     logger.debug(f"Level ability {key}")
     if dry_run:
         return
-    keyboard.press_key_with_modifier(key, Key.ctrl)
+    get_keyboard().press_key_with_modifier(key, get_keyboard().Key.ctrl, ttl=float('inf'))
 
 
-def press_key(key: Union[str, Key]) -> None:
+def press_key(key: Union[str, "Key"]) -> None:
     logger.debug(f"Press key {key}")
     if dry_run:
         return
-    keyboard.press_key(key)
+    get_keyboard().press_key(key, get_priority(key), get_ttl(key))
 
 
 def left_click(x: float, y: float) -> None:
@@ -84,7 +129,7 @@ def left_click(x: float, y: float) -> None:
     if dry_run:
         return
     x, y = calc_position(x, y)
-    mouse.left_click(x, y)
+    get_mouse().left_click(x, y, ttl=UI_CLICK_TTL)
 
 
 def right_click(x: float, y: float) -> None:
@@ -92,23 +137,39 @@ def right_click(x: float, y: float) -> None:
     if dry_run:
         return
     x, y = calc_position(x, y)
-    mouse.right_click(x, y)
+    get_mouse().right_click(x, y, LOW, MOVE_TTL, key=WALK_KEY)
+
+
+def left_click_precise(x: float, y: float) -> None:
+    logger.debug(f"Left click precisely at ({x:.2f}, {y:.2f})")
+    if dry_run:
+        return
+    x, y = calc_position(x, y)
+    get_mouse().left_click_precise(x, y, ttl=UI_CLICK_TTL)
+
+
+def right_click_precise(x: float, y: float) -> None:
+    logger.debug(f"Right click precisely at ({x:.2f}, {y:.2f})")
+    if dry_run:
+        return
+    x, y = calc_position(x, y)
+    get_mouse().right_click_precise(x, y, ttl=UI_CLICK_TTL)
 
 
 def left_click_only() -> None:
     logger.debug("Left click")
     if dry_run:
         return
-    mouse.press_left()
-    mouse.release_left()
+    get_mouse().press_left()
+    get_mouse().release_left()
 
 
 def right_click_only() -> None:
     logger.debug("Right click")
     if dry_run:
         return
-    mouse.press_right()
-    mouse.release_right()
+    get_mouse().press_right()
+    get_mouse().release_right()
 
 
 def move_mouse(x: float, y: float) -> None:
@@ -116,7 +177,8 @@ def move_mouse(x: float, y: float) -> None:
     if dry_run:
         return
     x, y = calc_position(x, y)
-    mouse.move_mouse(x, y)
+    # Only the newest target matters
+    get_mouse().move_mouse(x, y, LOW, MOVE_TTL, coalesce=True)
 
 
 def move_mouse_precise(x: float, y: float) -> None:
@@ -124,6 +186,13 @@ def move_mouse_precise(x: float, y: float) -> None:
     if dry_run:
         return
     x, y = calc_position(x, y)
-    # Move twice to offset randomness
-    mouse.move_mouse(x, y)
-    mouse.move_mouse(x, y)
+    get_mouse().move_mouse_precise(x, y)
+
+
+def log_stats() -> None:
+    """
+    Logs how quickly mouse and keyboard actions were performed (if any were).
+    """
+    for controller in (mouse, keyboard):
+        if controller is not None:
+            controller.queue.log_stats()
@@ -3,13 +3,12 @@ Contains helper functions for using the keyboard.
 """
 
 import threading
-from queue import Queue
-
-from typing import Union
+from typing import Optional, Union
 
 import pynput
 from pynput.keyboard import Key
 
+from controllers.action_queue import ActionQueue, NORMAL
 from misc import color_logging
 from misc.rng import rsleep
 
@@ -45,38 +44,43 @@ def _press_key_with_modifier(key: Union[str, Key], modifier: Union[str, Key]) ->
     keyboard.release(key)
 
 
-# Process all keyboard events in a separate thread using a queue
-queue = Queue()
+# Process all keyboard events in a separate thread, most important first
+queue = ActionQueue("keyboard")
+
+
+def sleep(n: float, s=0.047, a=False, priority=NORMAL) -> None:
+    queue.put(rsleep, n, s, a, priority=priority)
 
 
-def sleep(n: float, s=0.047, a=False) -> None:
-    queue.put((rsleep, n, s, a))
+def hold_key(key: Union[str, Key], duration: float, priority=NORMAL) -> None:
+    queue.put(_hold_key, key, duration, priority=priority)
 
 
-def hold_key(key: Union[str, Key], duration: float) -> None:
-    queue.put((_hold_key, key, duration))
+def press_key(key: Union[str, Key], priority=NORMAL, ttl: Optional[float] = None) -> None:
+    queue.put(_press_key, key, priority=priority, ttl=ttl)
 
 
-def press_key(key: Union[str, Key]) -> None:
-    queue.put((_press_key, key))
+def press_key_now(key: Union[str, Key]) -> None:
+    """
+    Presses the key on the calling thread, instead of queueing it (ex: as part of an action in the mouse queue).
+    """
+    _press_key(key)
 
 
-def press_key_with_modifier(key: Union[str, Key], modifier: Union[str, Key]) -> None:
-    queue.put((_press_key_with_modifier, key, modifier))
+def press_key_with_modifier(key: Union[str, Key], modifier: Union[str, Key], priority=NORMAL,
+                            ttl: Optional[float] = None) -> None:
+    queue.put(_press_key_with_modifier, key, modifier, priority=priority, ttl=ttl)
 
 
-def call_function(func: callable, *args: tuple) -> None:
-    queue.put((func, *args))
+def call_function(func: callable, *args: tuple, priority=NORMAL, ttl: Optional[float] = None) -> None:
+    queue.put(func, *args, priority=priority, ttl=ttl)
 
 
 def _keyboard_event_loop() -> None:
     while True:
-        while queue.qsize() > 10:
-            logger.warning(f"Too many elements in keyboard queue ({queue.qsize()}), skipping event...")
-            queue.get()
         try:
-            func, *args = queue.get()
-            func(*args)
+            action = queue.get()
+            action.func(*action.args)
             rsleep(0.02)
         except KeyboardInterrupt:
             break
@@ -3,12 +3,12 @@ Contains helper functions for using the mouse.
 """
 
 import threading
-from queue import Queue
-from typing import Union
+from typing import Optional, Union
 
 import pynput
 from pynput.mouse import Button
 
+from controllers.action_queue import ActionQueue, NORMAL
 from controllers.mouse import bezier_mouse
 from misc import color_logging
 from misc.rng import rnum, rsleep
@@ -47,6 +47,20 @@ def _move_mouse(x: float, y: float) -> None:
     bezier_mouse.move_mouse(rnum(x, abs(cx-x)/40+abs_error, True), rnum(y, abs(cy-y)/40+abs_error, True))
 
 
+def _move_mouse_precise(x: float, y: float) -> None:
+    # Move twice to offset randomness
+    _move_mouse(x, y)
+    _move_mouse(x, y)
+
+
+def _move_and_call(x: float, y: float, precise: bool, func: callable, *args) -> None:
+    if precise:
+        _move_mouse_precise(x, y)
+    else:
+        _move_mouse(x, y)
+    func(*args)
+
+
 def _left_click(x: float, y: float) -> None:
     logger.debug(f"Left click at ({x:.2f}, {y:.2f})")
     _move_mouse(x, y)
@@ -61,54 +75,94 @@ def _right_click(x: float, y: float) -> None:
     _release_right()
 
 
-# Process all mouse events in a separate thread using a queue
-queue = Queue()
+def _left_click_precise(x: float, y: float) -> None:
+    logger.debug(f"Left click precisely at ({x:.2f}, {y:.2f})")
+    _move_mouse_precise(x, y)
+    _press_left()
+    _release_left()
+
+
+def _right_click_precise(x: float, y: float) -> None:
+    logger.debug(f"Right click precisely at ({x:.2f}, {y:.2f})")
+    _move_mouse_precise(x, y)
+    _press_right()
+    _release_right()
+
+
+# Process all mouse events in a separate thread, most important first
+queue = ActionQueue("mouse")
+
+
+def sleep(n: float, s=0.047, a=False, priority=NORMAL) -> None:
+    queue.put(rsleep, n, s, a, priority=priority)
+
+
+def press_left(priority=NORMAL) -> None:
+    queue.put(_press_left, priority=priority)
+
+
+def press_right(priority=NORMAL) -> None:
+    queue.put(_press_right, priority=priority)
+
+
+def release_left(priority=NORMAL) -> None:
+    queue.put(_release_left, priority=priority)
 
 
-def sleep(n: float, s=0.047, a=False) -> None:
-    queue.put((rsleep, n, s, a))
+def release_right(priority=NORMAL) -> None:
+    queue.put(_release_right, priority=priority)
 
 
-def press_left() -> None:
-    queue.put((_press_left,))
+def move_mouse(x: float, y: float, priority=NORMAL, ttl: Optional[float] = None, coalesce=False) -> None:
+    """
+    :param coalesce: Whether this movement can be replaced by the next one, if neither has started yet.
+    """
+    queue.put(_move_mouse, x, y, priority=priority, ttl=ttl, key="move" if coalesce else None)
 
 
-def press_right() -> None:
-    queue.put((_press_right,))
+def move_mouse_precise(x: float, y: float, priority=NORMAL, ttl: Optional[float] = None) -> None:
+    queue.put(_move_mouse_precise, x, y, priority=priority, ttl=ttl)
 
 
-def release_left() -> None:
-    queue.put((_release_left,))
+def move_mouse_and_call(x: float, y: float, func: callable, *args, precise=False, priority=NORMAL,
+                        ttl: Optional[float] = None, key: Optional[str] = None) -> None:
+    """
+    Moves the mouse, then calls the function (ex: to press a key once the mouse is aimed). Both are queued as one
+    action, so they're performed together or not at all.
+    :param precise: Whether to move precisely (see move_mouse_precise).
+    :param key: If given, this action can replace the last one queued with the same key (see ActionQueue.put).
+    """
+    queue.put(_move_and_call, x, y, precise, func, *args, priority=priority, ttl=ttl, key=key)
 
 
-def release_right() -> None:
-    queue.put((_release_right,))
+def left_click(x: float, y: float, priority=NORMAL, ttl: Optional[float] = None) -> None:
+    queue.put(_left_click, x, y, priority=priority, ttl=ttl)
 
 
-def move_mouse(x: float, y: float) -> None:
-    queue.put((_move_mouse, x, y))
+def right_click(x: float, y: float, priority=NORMAL, ttl: Optional[float] = None, key: Optional[str] = None) -> None:
+    """
+    :param key: If given, this click can replace the last action queued with the same key (see ActionQueue.put).
+    """
+    queue.put(_right_click, x, y, priority=priority, ttl=ttl, key=key)
 
 
-def left_click(x: float, y: float) -> None:
-    queue.put((_left_click, x, y))
+def left_click_precise(x: float, y: float, priority=NORMAL, ttl: Optional[float] = None) -> None:
+    queue.put(_left_click_precise, x, y, priority=priority, ttl=ttl)
 
 
-def right_click(x: float, y: float) -> None:
-    queue.put((_right_click, x, y))
+def right_click_precise(x: float, y: float, priority=NORMAL, ttl: Optional[float] = None) -> None:
+    queue.put(_right_click_precise, x, y, priority=priority, ttl=ttl)
 
 
-def call_function(func: callable, *args: Union[str, tuple]) -> None:
-    queue.put((func, *args))
+def call_function(func: callable, *args: Union[str, tuple], priority=NORMAL, ttl: Optional[float] = None) -> None:
+    queue.put(func, *args, priority=priority, ttl=ttl)
 
 
 def _mouse_event_loop() -> None:
     while True:
-        while queue.qsize() > 10:
-            logger.warning(f"Too many elements in mouse queue ({queue.qsize()}), skipping event...")
-            queue.get()
         try:
-            func, *args = queue.get()
-            func(*args)
+            action = queue.get()
+            action.func(*action.args)
         except KeyboardInterrupt:
             break
         except Exception as e:
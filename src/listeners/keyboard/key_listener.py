@@ -2,14 +2,16 @@
 Listens to and handles keyboard events (for manually controlling the AI).
 """
 
-import pynput
-from pynput.keyboard import HotKey, Key
 from queue import Queue
 
 from misc import color_logging
 
 logger = color_logging.getLogger('listener', level=color_logging.INFO)
 queue = Queue()
+# The hotkeys and the pynput listener, created by init_listener. pynput is only imported then, so the events below can
+# still be used without it (ex: when running headless, see main).
+hotkeys = []
+listener = None
 
 
 def init_listener(q: Queue) -> None:
@@ -17,8 +19,19 @@ def init_listener(q: Queue) -> None:
     Initializes the keyboard listener.
     :param q: The queue to put events into.
     """
-    global queue
+    global queue, hotkeys, listener
+    from pynput.keyboard import HotKey, Listener
     logger.info("Initializing keyboard listener...")
+    hotkeys = [
+        HotKey(HotKey.parse('<shift>+h'), on_shift_h),
+        HotKey(HotKey.parse('<shift>+t'), on_shift_t),
+        HotKey(HotKey.parse('<shift>+c'), on_shift_c),
+        HotKey(HotKey.parse('<shift>+l'), on_shift_l),
+        HotKey(HotKey.parse('<shift>+8'), on_shift_8),
+        HotKey(HotKey.parse('<shift>+9'), on_shift_9),
+        HotKey(HotKey.parse('<shift>+0'), on_shift_0),
+    ]
+    listener = Listener(on_press=on_press, on_release=on_release)
     listener.start()
     logger.info("Keyboard listener active! Press Shift-H to display a help menu.")
     queue = q
@@ -88,6 +101,7 @@ def on_shift_9() -> None:
 
 
 def on_press(key) -> None:
+    from pynput.keyboard import Key
     # Hotkeys
     for hotkey in hotkeys:
         hotkey.press(listener.canonical(key))
@@ -104,6 +118,7 @@ def on_press(key) -> None:
 
 
 def on_release(key) -> None:
+    from pynput.keyboard import Key
     # Hotkeys
     for hotkey in hotkeys:
         hotkey.release(listener.canonical(key))
@@ -117,16 +132,3 @@ def on_release(key) -> None:
 
     # Log
     logger.debug("Key {0} released".format(key))
-
-
-# Initialize the hotkeys and the listener
-hotkeys = [
-    HotKey(HotKey.parse('<shift>+h'), on_shift_h),
-    HotKey(HotKey.parse('<shift>+t'), on_shift_t),
-    HotKey(HotKey.parse('<shift>+c'), on_shift_c),
-    HotKey(HotKey.parse('<shift>+l'), on_shift_l),
-    HotKey(HotKey.parse('<shift>+8'), on_shift_8),
-    HotKey(HotKey.parse('<shift>+9'), on_shift_9),
-    HotKey(HotKey.parse('<shift>+0'), on_shift_0),
-]
-listener = pynput.keyboard.Listener(on_press=on_press, on_release=on_release)
@@ -0,0 +1,190 @@
+"""
+Contains a fast reader for numbers shown in the game's HUD font (ex: gold and champion levels).
+Each digit is cut out of the image and compared to templates built from labelled crops, which takes a fraction of a
+millisecond, compared to a few milliseconds (or more) for EasyOCR. When the reader isn't sure, it gives up, and the
+number should be read with EasyOCR instead.
+
+The templates aren't built in: until img/digits.npz exists, every number is read with OCR. To build it, save
+labelled crops (see save_number_crops in tests/listeners/vision/test_game_ocr.py), check the labels by hand, then run:
+python -m listeners.vision.digit_reader --samples <crop folder>
+"""
+
+import argparse
+import os
+from typing import Dict, List, Optional, Tuple
+
+import cv2 as cv
+import numpy as np
+
+from misc import color_logging
+from misc.definitions import ROOT_DIR
+
+logger = color_logging.getLogger('vision', level=color_logging.DEBUG)
+
+# Where the templates are loaded from by default
+TEMPLATES_PATH = os.path.join(ROOT_DIR, "img", "digits.npz")
+# Size (h, w) that every digit is normalized to before comparing
+GLYPH_SHAPE = (14, 10)
+
+
+def _binarize(img: np.ndarray, min_contrast=40) -> Optional[np.ndarray]:
+    """
+    Separates the text from the background.
+    :param img: The image, in BGR or grayscale format.
+    :param min_contrast: The minimum difference between the brightest and darkest pixel for there to be any text.
+    :return: A mask with the text as nonzero pixels, or None if the image is too flat to contain text.
+    """
+    if img.size == 0:
+        return None
+    gray = cv.cvtColor(img, cv.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    if int(gray.max()) - int(gray.min()) < min_contrast:
+        return None
+    _, mask = cv.threshold(gray, 0, 255, cv.THRESH_BINARY + cv.THRESH_OTSU)
+    # The text is whichever side has less pixels
+    if np.count_nonzero(mask) > mask.size // 2:
+        mask = cv.bitwise_not(mask)
+    return mask
+
+
+def segment_glyphs(img: np.ndarray, min_pixels=3) -> Optional[List[np.ndarray]]:
+    """
+    Cuts the image into individual characters, using columns with no text pixels as separators.
+    :param img: The image, in BGR or grayscale format.
+    :param min_pixels: Smaller pieces than this are treated as noise.
+    :return: Each character's mask, from left to right, or None if the image doesn't look like a line of text.
+    """
+    mask = _binarize(img)
+    if mask is None:
+        return None
+    cols = np.count_nonzero(mask, axis=0)
+    # Start and end of every run of columns with text in them
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], cols > 0, [0])).astype(np.int8)))
+    glyphs = []
+    for x1, x2 in zip(edges[::2].tolist(), edges[1::2].tolist()):
+        if cols[x1:x2].sum() < min_pixels:
+            continue
+        rows = np.flatnonzero(mask[:, x1:x2].any(axis=1))
+        glyph = mask[rows[0]:rows[-1] + 1, x1:x2]
+        # Digits are taller than they are wide; anything else is probably several characters stuck together
+        if glyph.shape[1] > glyph.shape[0] * 1.2:
+            return None
+        glyphs.append(glyph)
+    return glyphs if glyphs else None
+
+
+def normalize_glyph(glyph: np.ndarray) -> np.ndarray:
+    """
+    Scales a character mask to the glyph height (keeping its aspect ratio), centers it, and normalizes it so that
+    comparing two glyphs is a dot product.
+    :param glyph: The character mask.
+    :return: A flat vector with zero mean and unit length.
+    """
+    gh, gw = GLYPH_SHAPE
+    h, w = glyph.shape
+    new_w = min(gw, max(1, round(w * gh / h)))
+    scaled = cv.resize(glyph, (new_w, gh), interpolation=cv.INTER_AREA)
+    padded = np.zeros(GLYPH_SHAPE, np.float32)
+    x = (gw - new_w) // 2
+    padded[:, x:x + new_w] = scaled
+    vec = padded.ravel()
+    vec -= vec.mean()
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm > 0 else vec
+
+
+def load_samples(folder: str) -> List[Tuple[np.ndarray, str]]:
+    """
+    Loads labelled crops from a folder. Each file should be named after the number it shows (ex: 1250_3.png).
+    :param folder: The folder to load from.
+    :return: Pairs of (image, the number shown in it).
+    """
+    samples = []
+    for file in sorted(os.listdir(folder)):
+        label = file.split('_')[0].split('.')[0]
+        if file.endswith('.png') and label.isdigit():
+            samples.append((cv.imread(os.path.join(folder, file), cv.IMREAD_COLOR), label))
+    return samples
+
+
+class DigitReader:
+    """
+    Reads numbers by comparing each digit to a set of labelled example glyphs.
+    """
+
+    def __init__(self, templates: np.ndarray, labels: np.ndarray, min_score=0.8):
+        """
+        :param templates: Normalized example glyphs, with shape (n, GLYPH_SHAPE[0] * GLYPH_SHAPE[1]).
+        :param labels: The digit that each example shows.
+        :param min_score: The minimum correlation needed to accept a digit.
+        """
+        self.templates = templates.astype(np.float32)
+        self.labels = np.asarray(labels)
+        self.min_score = min_score
+
+    @staticmethod
+    def build(samples: List[Tuple[np.ndarray, str]], max_per_digit=20) -> "DigitReader":
+        """
+        Builds a reader from labelled crops.
+        :param samples: Pairs of (image, the number shown in it).
+        :param max_per_digit: The maximum number of examples to keep for each digit.
+        :return: The reader.
+        """
+        examples: Dict[str, List[np.ndarray]] = {}
+        for img, label in samples:
+            glyphs = segment_glyphs(img)
+            if glyphs is None or len(glyphs) != len(label):
+                logger.debug(f"Skipping sample '{label}': found {0 if glyphs is None else len(glyphs)} glyphs")
+                continue
+            for glyph, digit in zip(glyphs, label):
+                if len(examples.setdefault(digit, [])) < max_per_digit:
+                    examples[digit].append(normalize_glyph(glyph))
+        missing = [d for d in "0123456789" if d not in examples]
+        if missing:
+            logger.warning(f"No examples for digits {missing}, these will always fall back to OCR")
+        labels = [d for d in sorted(examples) for _ in examples[d]]
+        templates = [t for d in sorted(examples) for t in examples[d]]
+        return DigitReader(np.array(templates, np.float32).reshape(len(templates), -1), np.array(labels))
+
+    @staticmethod
+    def load(path: str) -> "DigitReader":
+        """
+        Loads a reader that was saved with save().
+        """
+        data = np.load(path)
+        return DigitReader(data["templates"], data["labels"])
+
+    def save(self, path: str) -> None:
+        """
+        Saves the reader's templates to a .npz file.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        np.savez_compressed(path, templates=self.templates, labels=self.labels)
+
+    def read(self, img: np.ndarray) -> Optional[int]:
+        """
+        Reads the (positive) number shown in the image.
+        :param img: The image, in BGR or grayscale format. There should only be 1 number in it!
+        :return: The number, or None if any digit couldn't be read confidently.
+        """
+        if len(self.templates) == 0:
+            return None
+        glyphs = segment_glyphs(img)
+        if glyphs is None:
+            return None
+        scores = np.stack([normalize_glyph(g) for g in glyphs]) @ self.templates.T
+        best = scores.argmax(axis=1)
+        if scores[np.arange(len(glyphs)), best].min() < self.min_score:
+            return None
+        return int(''.join(self.labels[best].tolist()))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build the digit reader's templates from labelled crops.")
+    parser.add_argument("--samples", required=True, help="The folder of labelled crops (ex: 1250_3.png).")
+    parser.add_argument("--out", default=TEMPLATES_PATH, help="Where to save the templates.")
+    parser.add_argument("--max-per-digit", type=int, default=20)
+    args = parser.parse_args()
+
+    reader = DigitReader.build(load_samples(args.samples), args.max_per_digit)
+    reader.save(args.out)
+    logger.info(f"Saved {len(reader.labels)} templates ({len(set(reader.labels.tolist()))} digits) to {args.out}")
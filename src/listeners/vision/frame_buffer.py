@@ -0,0 +1,138 @@
+"""
+Contains a ring buffer of frames stored in shared memory.
+Worker processes attach to the same buffer, so a frame only needs to be written once, and workers are sent a tiny
+reference (slot index + size) instead of a pickled copy of the whole screenshot.
+"""
+
+import threading
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from misc import color_logging
+
+logger = color_logging.getLogger('vision', level=color_logging.DEBUG)
+
+
+@dataclass(frozen=True)
+class FrameRef:
+    """
+    A reference to a frame stored in a FrameBuffer slot.
+    """
+    slot: int
+    h: int
+    w: int
+
+
+class FrameBuffer:
+    """
+    A fixed number of frame slots in shared memory, reused in round-robin order.
+    Each slot is split into planes (ex: the BGR image, the HSV image, and some masks). A plane is sized for the
+    largest supported frame, and smaller frames use the start of their plane, so views are always contiguous.
+    """
+
+    def __init__(self, max_shape: Tuple[int, int], planes: Dict[str, int], slots=4, name: Optional[str] = None):
+        """
+        Creates a new frame buffer, or attaches to an existing one if a name is given.
+        :param max_shape: The largest frame size (h, w) that fits in the buffer.
+        :param planes: The number of channels for each plane, by plane name (in order).
+        :param slots: The number of frames that can be stored at once.
+        :param name: The name of an existing buffer to attach to.
+        """
+        self.max_shape = tuple(max_shape)
+        self.planes = dict(planes)
+        self.slots = slots
+        # Byte offset of each plane within a slot
+        self.plane_offsets = {}
+        offset = 0
+        for plane, channels in self.planes.items():
+            self.plane_offsets[plane] = offset
+            offset += self.max_shape[0] * self.max_shape[1] * channels
+        self.slot_size = offset
+        self.is_owner = name is None
+        if self.is_owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=self.slot_size * slots)
+            logger.debug(f"Created frame buffer {self.shm.name} ({self.slot_size * slots / 1e6:.1f} MB)")
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        # Start address of the shared memory, used to check if an image lives in the buffer
+        self.address = np.frombuffer(self.shm.buf, dtype=np.uint8).__array_interface__["data"][0]
+        self.next = 0
+        # Slots are claimed by the capture thread and by analyze_frame, so claiming one has to be atomic
+        self.next_lock = threading.Lock()
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def get_spec(self) -> dict:
+        """
+        :return: The arguments needed to attach to this buffer from another process.
+        """
+        return {"max_shape": self.max_shape, "planes": self.planes, "slots": self.slots, "name": self.name}
+
+    def fits(self, h: int, w: int) -> bool:
+        return h <= self.max_shape[0] and w <= self.max_shape[1]
+
+    def next_slot(self) -> int:
+        """
+        Claims the next slot in the ring. The oldest frame gets overwritten.
+        :return: The slot index.
+        """
+        with self.next_lock:
+            slot = self.next
+            self.next = (self.next + 1) % self.slots
+        return slot
+
+    def view(self, slot: int, plane: str, h: int, w: int) -> np.ndarray:
+        """
+        Gets a (writable) view of a plane in the given slot, without copying.
+        :param slot: The slot index.
+        :param plane: The plane name.
+        :param h: The frame height.
+        :param w: The frame width.
+        :return: An array of shape (h, w, channels), or (h, w) for single channel planes.
+        """
+        channels = self.planes[plane]
+        shape = (h, w, channels) if channels != 1 else (h, w)
+        offset = slot * self.slot_size + self.plane_offsets[plane]
+        return np.ndarray(shape, dtype=np.uint8, buffer=self.shm.buf, offset=offset)
+
+    def next_image(self, h: int, w: int, plane="img") -> np.ndarray:
+        """
+        Claims the next slot and returns a view to write a new frame into (ex: directly from a screenshot).
+        :param h: The frame height.
+        :param w: The frame width.
+        :param plane: The plane to write into.
+        :return: The view of the plane.
+        """
+        return self.view(self.next_slot(), plane, h, w)
+
+    def find_slot(self, img: np.ndarray, plane="img") -> Optional[int]:
+        """
+        Checks if the given image was written directly into one of the slots.
+        :param img: The image to check.
+        :param plane: The plane that the image should be in.
+        :return: The slot index, or None if the image doesn't live in this buffer.
+        """
+        if not img.flags.c_contiguous or img.dtype != np.uint8:
+            return None
+        start = img.__array_interface__["data"][0] - self.address
+        if start < 0 or start >= self.slot_size * self.slots:
+            return None
+        slot, offset = divmod(start, self.slot_size)
+        return slot if offset == self.plane_offsets[plane] else None
+
+    def close(self) -> None:
+        """
+        Detaches from the buffer. The owner also frees the shared memory.
+        """
+        try:
+            self.shm.close()
+        except BufferError:
+            # Views of the frames are still around somewhere; they'll be freed with the process
+            logger.debug(f"Frame buffer {self.name} still in use, leaving it mapped")
+        if self.is_owner:
+            self.shm.unlink()
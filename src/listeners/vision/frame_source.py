@@ -0,0 +1,171 @@
+"""
+Contains the places that frames of the game can come from: the live game window, or recorded footage (a folder of
+screenshots, or a video file). Recorded footage lets the whole bot run without the game (or Windows), ex: to measure
+how fast it is.
+"""
+
+import os
+from abc import ABC, abstractmethod
+from typing import Iterable, List, Optional, Tuple
+
+import cv2 as cv
+import numpy as np
+
+from listeners.vision import window_tracker
+from listeners.vision.frame_buffer import FrameBuffer
+from misc import color_logging
+
+logger = color_logging.getLogger('vision', level=color_logging.DEBUG)
+FRAME_SOURCES = ["live", "images", "video"]
+
+
+class SourceExhausted(Exception):
+    """
+    Raised when recorded footage has no frames left.
+    """
+    pass
+
+
+class FrameSource(ABC):
+    """
+    Somewhere to get frames of the game from.
+    """
+
+    def __init__(self):
+        # Number of frames read so far
+        self.count = 0
+
+    @abstractmethod
+    def get_res(self) -> Tuple[Optional[int], Optional[int]]:
+        """
+        :return: The size (w, h) of the frames, or (None, None) if there aren't any right now.
+        """
+
+    @abstractmethod
+    def get_frame(self, frame_buffer: Optional[FrameBuffer] = None,
+                  regions: Optional[Iterable[Tuple[int, int, int, int]]] = None) -> np.ndarray:
+        """
+        Gets the next frame.
+        :param frame_buffer: If given, the frame is written directly into the next slot of this frame buffer (if it
+        fits).
+        :param regions: The only regions (x1, y1, x2, y2) of the frame that will be looked at. Sources may skip the
+        rest.
+        :return: The frame, in BGR format.
+        :raises RuntimeWarning: If the game isn't open.
+        :raises SourceExhausted: If there are no frames left.
+        """
+
+    def close(self) -> None:
+        pass
+
+    def _get_out(self, frame_buffer: Optional[FrameBuffer], h: int, w: int) -> Optional[np.ndarray]:
+        return frame_buffer.next_image(h, w) if frame_buffer is not None and frame_buffer.fits(h, w) else None
+
+
+class LiveSource(FrameSource):
+    """
+    Captures the game window.
+    """
+
+    def get_res(self) -> Tuple[Optional[int], Optional[int]]:
+        return window_tracker.get_game_res()
+
+    def get_frame(self, frame_buffer: Optional[FrameBuffer] = None,
+                  regions: Optional[Iterable[Tuple[int, int, int, int]]] = None) -> np.ndarray:
+        img = window_tracker.take_game_screenshot(frame_buffer, regions)
+        self.count += 1
+        return img
+
+
+class ImageFolderSource(FrameSource):
+    """
+    Reads screenshots from a folder (and its subfolders), in order of their names.
+    """
+
+    def __init__(self, folder: str, loop=False):
+        """
+        :param folder: The folder to read from.
+        :param loop: Whether to start over after the last screenshot, instead of running out.
+        """
+        super().__init__()
+        self.files: List[str] = []
+        for subdir, dirs, files in os.walk(folder):
+            self.files += [os.path.join(subdir, file) for file in files if file.endswith('.png')]
+        self.files.sort()
+        if not self.files:
+            raise FileNotFoundError(f"No screenshots found in {folder}")
+        self.loop = loop
+        self.res = cv.imread(self.files[0], cv.IMREAD_COLOR).shape[1::-1]
+        logger.debug(f"Found {len(self.files)} screenshots in {folder}")
+
+    def get_res(self) -> Tuple[Optional[int], Optional[int]]:
+        return self.res
+
+    def get_frame(self, frame_buffer: Optional[FrameBuffer] = None,
+                  regions: Optional[Iterable[Tuple[int, int, int, int]]] = None) -> np.ndarray:
+        if self.count >= len(self.files) and not self.loop:
+            raise SourceExhausted(f"All {len(self.files)} screenshots were read")
+        img = cv.imread(self.files[self.count % len(self.files)], cv.IMREAD_COLOR)
+        self.count += 1
+        out = self._get_out(frame_buffer, *img.shape[:2])
+        if out is None:
+            return img
+        np.copyto(out, img)
+        return out
+
+
+class VideoSource(FrameSource):
+    """
+    Reads frames from a video file (anything cv.VideoCapture can open).
+    """
+
+    def __init__(self, path: str, loop=False):
+        """
+        :param path: The video file.
+        :param loop: Whether to start over after the last frame, instead of running out.
+        """
+        super().__init__()
+        self.path = path
+        self.loop = loop
+        self.video = cv.VideoCapture(path)
+        if not self.video.isOpened():
+            raise FileNotFoundError(f"Couldn't open video {path}")
+        self.res = (int(self.video.get(cv.CAP_PROP_FRAME_WIDTH)), int(self.video.get(cv.CAP_PROP_FRAME_HEIGHT)))
+        logger.debug(f"Opened video {path} ({self.res[0]}x{self.res[1]}, "
+                     f"{int(self.video.get(cv.CAP_PROP_FRAME_COUNT))} frames)")
+
+    def get_res(self) -> Tuple[Optional[int], Optional[int]]:
+        return self.res
+
+    def get_frame(self, frame_buffer: Optional[FrameBuffer] = None,
+                  regions: Optional[Iterable[Tuple[int, int, int, int]]] = None) -> np.ndarray:
+        out = self._get_out(frame_buffer, self.res[1], self.res[0])
+        # Frames are decoded straight into the frame buffer, if there is one
+        ok, img = self.video.read(out) if out is not None else self.video.read()
+        if not ok and self.loop and self.count > 0:
+            self.video.set(cv.CAP_PROP_POS_FRAMES, 0)
+            ok, img = self.video.read(out) if out is not None else self.video.read()
+        if not ok:
+            raise SourceExhausted(f"All {self.count} frames of {self.path} were read")
+        self.count += 1
+        return img
+
+    def close(self) -> None:
+        self.video.release()
+
+
+def create_source(kind: str, path: Optional[str] = None, loop=False) -> FrameSource:
+    """
+    :param kind: One of FRAME_SOURCES.
+    :param path: The folder or video file to read from (for recorded footage).
+    :param loop: Whether recorded footage should start over when it runs out.
+    """
+    if kind == "live":
+        return LiveSource()
+    if path is None:
+        raise ValueError(f"A path is needed for the {kind} source")
+    if kind == "images":
+        return ImageFolderSource(path, loop)
+    if kind == "video":
+        return VideoSource(path, loop)
+    raise ValueError(f"Unknown frame source {kind}, should be one of {FRAME_SOURCES}")
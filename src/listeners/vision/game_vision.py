@@ -2,29 +2,43 @@
 Contains helper functions for parsing info about the current game state.
 TODO: Lots of code reuse here, could probably be boiled down a LOT.
 """
+import copy
+import hashlib
 import multiprocessing as mp
+import threading
 
+from collections import OrderedDict
 from dataclasses import dataclass
-from typing import List, Tuple
+from multiprocessing.pool import ThreadPool
+from typing import Any, Dict, Hashable, List, Optional, Tuple, Union
 
 import numpy as np
 import cv2 as cv
 import os
 import math
 import easyocr
+import torch
 
 from misc import color_logging
-from misc.definitions import ROOT_DIR
-from listeners.vision import image_handler
+from misc.definitions import ROOT_DIR, MAX_MATCHES
+from listeners.vision import geometry, image_handler, screenshot
+from listeners.vision.digit_reader import TEMPLATES_PATH, DigitReader
+from listeners.vision.frame_buffer import FrameBuffer, FrameRef
 
 logger = color_logging.getLogger('vision', level=color_logging.DEBUG)
 
 dummy_img = cv.imread(os.path.join(ROOT_DIR, "img", "minion.png"))
+# Blank screenshot for warming up the detectors (health bars are scaled to the frame height, so it needs a real size)
+dummy_frame = np.zeros((geometry.REFERENCE_HEIGHT, geometry.REFERENCE_HEIGHT * 16 // 9, 3), np.uint8)
 ocr_reader: easyocr.Reader
 minion_template: np.ndarray
+minion_template_mask: np.ndarray
 player_template: np.ndarray
+player_template_mask: np.ndarray
 big_objective_template: np.ndarray
+big_objective_template_mask: np.ndarray
 small_objective_template: np.ndarray
+small_objective_template_mask: np.ndarray
 
 # These wider bounds detect everything, including stuff like ward health bars, which may be undesirable.
 lower_blue = np.array([90, 140, 95])
@@ -32,11 +46,38 @@ upper_blue = np.array([112, 240, 230])
 lower_red = np.array([0, 120, 100])
 upper_red = np.array([10, 230, 225])
 
+# HSV bounds for the edges of each type of health bar
+# Minions (old: 0 0 10 and 255 255 22)
+lower_minion_edge = np.array([80, 0, 10])
+upper_minion_edge = np.array([140, 255, 23])
+# Players (old: 22 0 51 and 60 32 115)
+lower_player_edge = np.array([0, 0, 62])
+upper_player_edge = np.array([179, 33, 121])
+# Objectives (both small and big)
+lower_objective_edge = np.array([16, 68, 70])
+upper_objective_edge = np.array([28, 190, 220])
+
+# Planes stored for each frame in the shared memory frame buffer (name -> number of channels)
+FRAME_PLANES = {"img": 3, "hsv": 3, "minion_mask": 1, "player_mask": 1, "objective_mask": 1}
+FRAME_SLOTS = 4
+# Owned by the main process, and attached to by every worker process
+frame_buffer: Optional[FrameBuffer] = None
+
+# Ways to run the vision workers (see init_vision)
+VISION_ENGINES = ["process", "thread"]
 pool_find_text: mp.Pool
 pool_find_minions: mp.Pool
 pool_find_players: mp.Pool
 pool_find_small_objectives: mp.Pool
 pool_find_big_objectives: mp.Pool
+# Splits full frame searches into horizontal tiles, one per worker (None if disabled, see init_vision)
+pool_find_tiles: Optional[mp.Pool] = None
+tile_count = 0
+# Reads HUD numbers without OCR, if templates have been built (see listeners.vision.digit_reader)
+DIGIT_TEMPLATES_PATH = TEMPLATES_PATH
+digit_reader: Optional[DigitReader] = None
+# Limits find_all to the parts of the screen that changed (None if disabled)
+region_tracker: Optional["RegionTracker"] = None
 
 
 @dataclass
@@ -56,54 +97,469 @@ class Text:
         return (self.y1 + self.y2) / 2
 
 
-def init_pool_find_text():
+def attach_frame_buffer(frame_buffer_spec: Optional[dict]) -> None:
+    """
+    Attaches a worker process to the main process's frame buffer.
+    :param frame_buffer_spec: The buffer's spec, or None to receive frames by pickling.
+    """
+    global frame_buffer
+    if frame_buffer_spec is not None:
+        frame_buffer = FrameBuffer(**frame_buffer_spec)
+
+
+# Supported OCR backends (see create_ocr_reader). All of them run EasyOCR's own PyTorch models, only the device and
+# precision differ: there's no ONNX Runtime (or other runtime) path, since EasyOCR doesn't ship exported models and
+# the only OCR dependency is EasyOCR itself.
+OCR_BACKENDS = ["auto", "gpu", "cpu", "cpu_float32"]
+
+
+def create_ocr_reader(backend="auto") -> easyocr.Reader:
+    """
+    Creates an EasyOCR reader that runs on the given backend.
+    :param backend: "gpu" for CUDA, "cpu" for EasyOCR's stock CPU models (with PyTorch's dynamic int8 quantization),
+    "cpu_float32" for the same models without quantization (slower, but a reference for accuracy), or "auto" to use
+    the GPU if there is one, and the stock CPU models otherwise.
+    :return: The reader.
+    """
+    if backend not in OCR_BACKENDS:
+        raise ValueError(f"Unknown OCR backend {backend}, should be one of {OCR_BACKENDS}")
+    if backend == "auto":
+        backend = "gpu" if torch.cuda.is_available() else "cpu"
+    if backend == "gpu":
+        if not torch.cuda.is_available():
+            logger.warning("OCR backend is gpu, but CUDA isn't available! OCR will be slow.")
+        reader = easyocr.Reader(['en'], gpu=True, verbose=False)
+    else:
+        reader = easyocr.Reader(['en'], gpu=False, verbose=False, quantize=backend == "cpu")
+    logger.debug(f"OCR backend: {backend} (device {reader.device}, {torch.get_num_threads()} threads)")
+    return reader
+
+
+def init_pool_find_text(frame_buffer_spec=None, ocr_backend="auto", ocr_threads: Optional[int] = None):
+    """
+    :param ocr_threads: If given, the number of threads PyTorch runs OCR with in this process (it's a setting for the
+    whole process, so it's only given to the OCR worker process).
+    """
     global ocr_reader
-    ocr_reader = easyocr.Reader(['en'], gpu=True, verbose=False)
+    attach_frame_buffer(frame_buffer_spec)
+    if ocr_threads is not None:
+        torch.set_num_threads(ocr_threads)
+    ocr_reader = create_ocr_reader(ocr_backend)
     ocr_reader.detect(dummy_img)
     ocr_reader.recognize(dummy_img)
     logger.debug("OCR module loaded")
 
 
-def init_pool_find_minions():
-    global minion_template
+def init_pool_find_minions(frame_buffer_spec=None):
+    attach_frame_buffer(frame_buffer_spec)
+    global minion_template, minion_template_mask
     minion_template = cv.imread(os.path.join(ROOT_DIR, "img", "minion.png"))
+    minion_template_mask = image_handler.get_outline_mask(minion_template, lower_minion_edge, upper_minion_edge)
     logger.debug("Minions module loaded")
 
 
-def init_pool_find_players():
-    global player_template
+def init_pool_find_players(frame_buffer_spec=None):
+    attach_frame_buffer(frame_buffer_spec)
+    global player_template, player_template_mask
     player_template = cv.imread(os.path.join(ROOT_DIR, "img", "player.png"))
+    player_template_mask = image_handler.get_outline_mask(player_template, lower_player_edge, upper_player_edge)
     logger.debug("Players module loaded")
 
 
-def init_pool_find_small_objectives():
-    global small_objective_template
+def init_pool_find_small_objectives(frame_buffer_spec=None):
+    attach_frame_buffer(frame_buffer_spec)
+    global small_objective_template, small_objective_template_mask
     small_objective_template = cv.imread(os.path.join(ROOT_DIR, "img", "small_objective.png"))
+    small_objective_template_mask = image_handler.get_outline_mask(small_objective_template, lower_objective_edge,
+                                                                   upper_objective_edge)
     logger.debug("Small objective module loaded")
 
 
-def init_pool_find_big_objectives():
-    global big_objective_template
+def init_pool_find_big_objectives(frame_buffer_spec=None):
+    attach_frame_buffer(frame_buffer_spec)
+    global big_objective_template, big_objective_template_mask
     big_objective_template = cv.imread(os.path.join(ROOT_DIR, "img", "big_objective.png"))
+    big_objective_template_mask = image_handler.get_outline_mask(big_objective_template, lower_objective_edge,
+                                                                 upper_objective_edge)
     logger.debug("Big objective module loaded")
 
 
-def init_vision() -> None:
+def init_pool_find_tiles(frame_buffer_spec=None):
+    attach_frame_buffer(frame_buffer_spec)
+    init_pool_find_minions()
+    init_pool_find_players()
+    init_pool_find_small_objectives()
+    init_pool_find_big_objectives()
+
+
+def init_vision(track_regions=False, ocr_backend="auto", ocr_threads: Optional[int] = None,
+                engine="process", tile_workers: Optional[int] = None,
+                max_res: Optional[Tuple[int, int]] = None) -> None:
     """
     Initializes the vision module.
+    :param track_regions: Whether find_all should only search the parts of the screen that changed since the last call
+    (see RegionTracker). This is only faster when find_all is called on consecutive frames of the same game.
+    :param ocr_backend: Where to run OCR (see create_ocr_reader).
+    :param ocr_threads: The number of CPU threads to run OCR with. Defaults to half of the CPU cores, since the
+    detectors need some too. With the thread engine, this is set for this whole process.
+    :param engine: "process" to run each detector and OCR in its own worker process, or "thread" to run everything in
+    this process with a thread pool. Threads use less memory (one copy of each template and model) and don't need to
+    send frames anywhere, so they're better on machines with few cores. OpenCV releases the GIL, so detectors still run
+    in parallel.
+    :param tile_workers: The number of workers that find_all splits full frame searches between. Each detector searches
+    the frame in this many horizontal tiles, which are spread over all workers, so find_all isn't limited by its
+    slowest detector. Defaults to the CPU cores that the other workers leave free (with the thread engine, the tiles
+    run on the detector threads). With 1 or less, each detector searches the whole frame.
+    :param max_res: The size (w, h) of the largest frames that will be analyzed. Defaults to the screen resolution.
     """
-    logger.info("Initializing vision modules (this might take a bit)...")
-    global pool_find_text, pool_find_minions, pool_find_players, pool_find_small_objectives, pool_find_big_objectives
-    pool_find_text = mp.Pool(processes=1, initializer=init_pool_find_text)
-    pool_find_minions = mp.Pool(processes=1, initializer=init_pool_find_minions)
-    pool_find_players = mp.Pool(processes=1, initializer=init_pool_find_players)
-    pool_find_small_objectives = mp.Pool(processes=1, initializer=init_pool_find_small_objectives)
-    pool_find_big_objectives = mp.Pool(processes=1, initializer=init_pool_find_big_objectives)
+    if engine not in VISION_ENGINES:
+        raise ValueError(f"Unknown vision engine {engine}, should be one of {VISION_ENGINES}")
+    logger.info(f"Initializing vision modules with the {engine} engine (this might take a bit)...")
+    global pool_find_text, pool_find_minions, pool_find_players, pool_find_small_objectives, pool_find_big_objectives, \
+        pool_find_tiles, tile_count, frame_buffer, region_tracker, digit_reader
+    if ocr_threads is None:
+        ocr_threads = max(1, (os.cpu_count() or 1) // 2)
+    if tile_workers is not None:
+        tile_count = tile_workers
+    else:
+        # Leave a core for each worker that's always running (OCR, and each detector process)
+        tile_count = max(1, (os.cpu_count() or 1) - (5 if engine == "process" else 1))
+    if engine == "process":
+        # Frames are shared with the workers through shared memory, so they don't need to be pickled
+        max_w, max_h = max_res if max_res is not None else screenshot.get_screen_res()
+        frame_buffer = FrameBuffer((max_h, max_w), FRAME_PLANES, FRAME_SLOTS)
+        spec = (frame_buffer.get_spec(),)
+        pool_find_text = mp.Pool(processes=1, initializer=init_pool_find_text,
+                                 initargs=spec + (ocr_backend, ocr_threads))
+        pool_find_minions = mp.Pool(processes=1, initializer=init_pool_find_minions, initargs=spec)
+        pool_find_players = mp.Pool(processes=1, initializer=init_pool_find_players, initargs=spec)
+        pool_find_small_objectives = mp.Pool(processes=1, initializer=init_pool_find_small_objectives, initargs=spec)
+        pool_find_big_objectives = mp.Pool(processes=1, initializer=init_pool_find_big_objectives, initargs=spec)
+        if tile_count > 1:
+            pool_find_tiles = mp.Pool(processes=tile_count, initializer=init_pool_find_tiles, initargs=spec)
+    else:
+        # Frames are passed to the threads directly, so there's nothing to share
+        frame_buffer = None
+        # OCR runs in this process, so PyTorch's thread count applies to everything here
+        torch.set_num_threads(ocr_threads)
+        init_pool_find_text(None, ocr_backend)
+        init_pool_find_minions()
+        init_pool_find_players()
+        init_pool_find_small_objectives()
+        init_pool_find_big_objectives()
+        # OCR keeps its own thread, since the reader can only run one call at a time
+        pool_find_text = ThreadPool(processes=1)
+        # One thread per detector, so that players don't wait for the other detectors in find_all
+        detector_pool = ThreadPool(processes=max(4, tile_count))
+        pool_find_minions = pool_find_players = pool_find_small_objectives = pool_find_big_objectives = detector_pool
+        if tile_count > 1:
+            # Tiles and detectors are never searched at the same time, so they can share threads
+            pool_find_tiles = detector_pool
+    if tile_count <= 1:
+        pool_find_tiles = None
+    logger.debug(f"Full frame searches split into {tile_count} tiles" if pool_find_tiles is not None else
+                 "Full frame searches aren't split into tiles")
+    if os.path.exists(DIGIT_TEMPLATES_PATH):
+        digit_reader = DigitReader.load(DIGIT_TEMPLATES_PATH)
+        logger.debug(f"Digit reader loaded ({len(digit_reader.labels)} templates)")
+    else:
+        logger.info(f"No digit templates at {DIGIT_TEMPLATES_PATH}, numbers will be read with OCR")
     find_text(dummy_img)
-    find_all(dummy_img, timeout=30)
+    find_all(dummy_frame, timeout=30)
+    region_tracker = RegionTracker() if track_regions else None
     logger.info("Vision modules loaded!")
 
 
+@dataclass
+class Frame:
+    """
+    A screenshot that has been preprocessed once, so that all detectors can share the work.
+    """
+    img: np.ndarray
+    hsv: np.ndarray
+    minion_mask: np.ndarray
+    player_mask: np.ndarray
+    objective_mask: np.ndarray
+    # Where the frame is stored in the frame buffer (None if it isn't)
+    ref: Optional[FrameRef] = None
+
+
+def analyze_frame(img: np.ndarray) -> Frame:
+    """
+    Converts the screenshot to HSV and computes the health bar edge masks for every detector (once per frame).
+    If the frame buffer is active, everything is written into shared memory, so workers can read it without copies.
+    :param img: The screenshot to analyze, in BGR format.
+    :return: The analyzed frame.
+    """
+    h, w = img.shape[:2]
+    if frame_buffer is None or not frame_buffer.fits(h, w):
+        frame = Frame(img, np.empty_like(img), *[np.empty((h, w), np.uint8) for _ in range(3)])
+    else:
+        slot = frame_buffer.find_slot(img)
+        if slot is None:
+            # Not captured directly into the buffer; one copy is still much cheaper than pickling for each worker
+            slot = frame_buffer.next_slot()
+            np.copyto(frame_buffer.view(slot, "img", h, w), img)
+        frame = _load_frame(FrameRef(slot, h, w))
+    cv.cvtColor(frame.img, cv.COLOR_BGR2HSV, dst=frame.hsv)
+    cv.inRange(frame.hsv, lower_minion_edge, upper_minion_edge, dst=frame.minion_mask)
+    cv.inRange(frame.hsv, lower_player_edge, upper_player_edge, dst=frame.player_mask)
+    cv.inRange(frame.hsv, lower_objective_edge, upper_objective_edge, dst=frame.objective_mask)
+    return frame
+
+
+def _load_frame(frame: Union[Frame, FrameRef]) -> Frame:
+    """
+    Gets the frame that was sent to a worker, either directly or as a reference into the frame buffer.
+    """
+    if isinstance(frame, Frame):
+        return frame
+    return Frame(*[frame_buffer.view(frame.slot, plane, frame.h, frame.w) for plane in FRAME_PLANES], ref=frame)
+
+
+def _share(frame: Frame) -> Union[Frame, FrameRef]:
+    """
+    Gets the cheapest way to send a frame to a worker.
+    """
+    return frame.ref if frame.ref is not None else frame
+
+
+def _share_img(img: np.ndarray) -> Union[np.ndarray, FrameRef]:
+    """
+    Gets the cheapest way to send a screenshot to a worker.
+    """
+    if frame_buffer is not None:
+        slot = frame_buffer.find_slot(img)
+        if slot is not None:
+            return FrameRef(slot, img.shape[0], img.shape[1])
+    return img
+
+
+class RegionTracker:
+    """
+    Keeps track of which parts of the screen need to be searched again, so the detectors can skip the static parts.
+    A detector searches everywhere the frame changed since the last frame, plus around everything it found last frame
+    (so entities standing still are still found, and their health is read again). Every few frames, or when most of
+    the frame changed, the whole screen is searched instead.
+    """
+
+    def __init__(self, full_scan_interval=10, diff_threshold=20, block_size=16, margin=60, max_changed=0.5):
+        """
+        :param full_scan_interval: Search the whole screen once every this many frames.
+        :param diff_threshold: How much a pixel's grayscale value needs to change to count as changed.
+        :param block_size: The size of the blocks that changed regions are made of (in pixels at 1920x1080).
+        :param margin: How far around last frame's detections to search (in pixels at 1920x1080).
+        :param max_changed: If more than this fraction of the blocks changed, search the whole screen.
+        """
+        self.full_scan_interval = full_scan_interval
+        self.diff_threshold = diff_threshold
+        self.block_size = block_size
+        self.margin = margin
+        self.max_changed = max_changed
+        self.prev_gray: Optional[np.ndarray] = None
+        self.frames_since_full_scan = 0
+        # Areas (x1, y1, x2, y2) that changed in the current frame, or None if doing a full scan
+        self.changed: Optional[List[Tuple[int, int, int, int]]] = None
+        # Last frame's detections, by detector name
+        self.detections: Dict[str, list] = {}
+
+    def reset(self) -> None:
+        """
+        Forgets the last frame, so the next one gets a full scan.
+        """
+        self.prev_gray = None
+        self.changed = None
+        self.detections = {}
+
+    def update(self, img: np.ndarray, ui_scale: Optional[float] = None) -> bool:
+        """
+        Compares a new frame to the last one, and finds the areas that changed.
+        :param img: The new frame, in BGR format.
+        :param ui_scale: The frame's UI scale (see geometry.get_ui_scale).
+        :return: True if the whole frame should be searched.
+        """
+        gray = cv.cvtColor(img, cv.COLOR_BGR2GRAY)
+        prev_gray = self.prev_gray
+        self.prev_gray = gray
+        self.frames_since_full_scan += 1
+        self.changed = None
+        if prev_gray is None or prev_gray.shape != gray.shape or \
+                self.frames_since_full_scan >= self.full_scan_interval:
+            self.frames_since_full_scan = 0
+            return True
+        # A block changed if any pixel in it changed by more than the threshold
+        h, w = gray.shape
+        if ui_scale is None:
+            ui_scale = geometry.get_ui_scale(img)
+        block_size = max(geometry.scale_px(self.block_size, ui_scale), 1)
+        bh, bw = math.ceil(h / block_size), math.ceil(w / block_size)
+        diff = cv.threshold(cv.absdiff(gray, prev_gray), self.diff_threshold, 255, cv.THRESH_BINARY)[1]
+        blocks = (cv.resize(diff, (bw, bh), interpolation=cv.INTER_AREA) > 0).astype(np.uint8)
+        # Also search the neighboring blocks, in case something is moving into them
+        blocks = cv.dilate(blocks, np.ones((3, 3), np.uint8))
+        if np.count_nonzero(blocks) > self.max_changed * bh * bw:
+            self.frames_since_full_scan = 0
+            return True
+        n, _, stats, _ = cv.connectedComponentsWithStats(blocks, connectivity=8)
+        sx, sy = w / bw, h / bh
+        self.changed = [(math.floor(bx * sx), math.floor(by * sy), math.ceil((bx + bw_) * sx),
+                         math.ceil((by + bh_) * sy)) for bx, by, bw_, bh_, _ in stats[1:n].tolist()]
+        return False
+
+    def get_regions(self, name: str, template_shape: Tuple[int, ...],
+                    ui_scale=1.0) -> Optional[List[Tuple[int, int, int, int]]]:
+        """
+        Gets the regions that a detector needs to search in the current frame.
+        :param name: The detector's name.
+        :param template_shape: The shape of the detector's health bar template.
+        :param ui_scale: The frame's UI scale (see geometry.get_ui_scale).
+        :return: Regions of health bar positions (top-left corners) to search, or None to search everywhere.
+        """
+        if self.changed is None:
+            return None
+        areas = list(self.changed)
+        margin = geometry.scale_px(self.margin, ui_scale)
+        for d in self.detections.get(name, []):
+            # Health bars are above the entity, less than one entity height away
+            areas.append((d.x1 - margin, d.y1 - (d.y2 - d.y1) - margin, d.x2 + margin, d.y2 + margin))
+        # Search every health bar position that overlaps one of the areas
+        th, tw = template_shape[:2]
+        return merge_regions([(x1 - tw + 1, y1 - th + 1, x2, y2) for x1, y1, x2, y2 in areas])
+
+    def remember(self, name: str, detections: list) -> None:
+        """
+        Saves what a detector found in the current frame, so it gets searched for again in the next frame.
+        """
+        self.detections[name] = detections
+
+
+def merge_regions(regions: List[Tuple[int, int, int, int]]) -> List[Tuple[int, int, int, int]]:
+    """
+    Merges overlapping regions into their bounding boxes, so no area is searched twice.
+    :param regions: The regions (x1, y1, x2, y2) to merge.
+    :return: A list of regions that don't overlap each other.
+    """
+    merged = []
+    for region in regions:
+        x1, y1, x2, y2 = map(int, region)
+        # Keep absorbing regions until the box stops growing
+        i = 0
+        while i < len(merged):
+            mx1, my1, mx2, my2 = merged[i]
+            if x1 < mx2 and mx1 < x2 and y1 < my2 and my1 < y2:
+                x1, y1, x2, y2 = min(x1, mx1), min(y1, my1), max(x2, mx2), max(y2, my2)
+                merged.pop(i)
+                i = 0
+            else:
+                i += 1
+        merged.append((x1, y1, x2, y2))
+    return merged
+
+
+# Outline masks of templates resized for other resolutions, by (template file, UI scale)
+scaled_template_masks: Dict[Tuple[str, float], np.ndarray] = {}
+
+
+def _get_template_mask(layout: geometry.BarLayout, template: np.ndarray, template_mask: np.ndarray,
+                       lower: np.ndarray, upper: np.ndarray, ui_scale: float) -> np.ndarray:
+    """
+    Gets the outline mask of a health bar template, resized to the frame's UI scale.
+    """
+    if ui_scale == 1:
+        return template_mask
+    key = (layout.template, ui_scale)
+    if key not in scaled_template_masks:
+        scaled_template_masks[key] = image_handler.get_outline_mask(image_handler.scale_image(template, ui_scale),
+                                                                    lower, upper)
+    return scaled_template_masks[key]
+
+
+def _read_bars(frame: Frame, matches: List[image_handler.Match], layout: geometry.BarLayout,
+               colors: List[Tuple[np.ndarray, np.ndarray]], row: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Reads the fill of the health (or mana) bars found at each match (see image_handler.read_bars).
+    :param layout: The bars' layout, in screen pixels.
+    :param row: The row to read, below the top of each match.
+    """
+    return image_handler.read_bars(frame.hsv, [m.x1 + layout.fill_left for m in matches],
+                                   [m.y1 + row for m in matches],
+                                   [(m.x2 - layout.fill_right) - (m.x1 + layout.fill_left) for m in matches], colors,
+                                   start=layout.fill_start)
+
+
+def _find_bar_matches(mask: np.ndarray, template_mask: np.ndarray, scale=1.0,
+                      regions: Optional[List[Tuple[int, int, int, int]]] = None) -> List[image_handler.Match]:
+    """
+    Finds health bar edges in the whole mask, or only in the given regions.
+    If scale isn't 1, candidates are found at that scale, then refined at full resolution.
+    """
+    if regions is None:
+        return image_handler.find_mask_matches_refined(mask, template_mask, scale)
+    return image_handler.find_mask_matches_in_regions(mask, template_mask, regions)
+
+
+def _get_bar_masks(frame: Frame, layout: geometry.BarLayout, ui_scale: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Gets the frame's mask that a type of health bar is found in, and the bar's outline mask at the frame's UI scale.
+    :param layout: The bar's layout (unscaled).
+    """
+    scaled = layout.scaled(ui_scale)
+    if layout == geometry.MINION_BAR:
+        return frame.minion_mask, _get_template_mask(scaled, minion_template, minion_template_mask, lower_minion_edge,
+                                                     upper_minion_edge, ui_scale)
+    if layout == geometry.PLAYER_BAR:
+        return frame.player_mask, _get_template_mask(scaled, player_template, player_template_mask, lower_player_edge,
+                                                     upper_player_edge, ui_scale)
+    if layout == geometry.SMALL_OBJECTIVE_BAR:
+        return frame.objective_mask, _get_template_mask(scaled, small_objective_template, small_objective_template_mask,
+                                                        lower_objective_edge, upper_objective_edge, ui_scale)
+    return frame.objective_mask, _get_template_mask(scaled, big_objective_template, big_objective_template_mask,
+                                                    lower_objective_edge, upper_objective_edge, ui_scale)
+
+
+def _find_tile_matches(frame: Union[Frame, FrameRef], layout: geometry.BarLayout, tile: Tuple[int, int],
+                       scale=1.0, ui_scale: Optional[float] = None) -> List[image_handler.Match]:
+    """
+    Finds health bar edges (with duplicates) whose top edge is in the given rows of the frame.
+    :param layout: The type of health bar to find (unscaled).
+    :param tile: The rows (y1, y2) to search, where y2 is exclusive.
+    :return: The matches, sorted by highest score first.
+    """
+    frame = _load_frame(frame)
+    mask, template_mask = _get_bar_masks(frame, layout, geometry.get_ui_scale(frame.img, ui_scale))
+    y1, y2 = tile
+    # The crop also covers the bars whose top edge is in the tile
+    matches = []
+    for m in _find_bar_matches(mask[y1:y2 + template_mask.shape[0]], template_mask, scale):
+        m.y1 += y1
+        m.y2 += y1
+        if y1 <= m.y1 < y2:
+            matches.append(m)
+    return matches
+
+
+def _find_tiled_matches(frame: Frame, layouts: List[geometry.BarLayout], scale=1.0, timeout=5,
+                        ui_scale: Optional[float] = None) -> Dict[str, List[image_handler.Match]]:
+    """
+    Finds health bar edges (with duplicates) in the whole frame, split into horizontal tiles that are searched by all
+    tile workers at once.
+    :param layouts: The types of health bars to find (unscaled).
+    :return: The matches for each type of bar (by template), sorted by highest score first.
+    """
+    h = frame.img.shape[0]
+    bounds = np.linspace(0, h, tile_count + 1).round().astype(int).tolist()
+    tiles = [(y1, y2) for y1, y2 in zip(bounds, bounds[1:]) if y2 > y1]
+    jobs = {layout.template: [pool_find_tiles.apply_async(_find_tile_matches,
+                                                          args=(_share(frame), layout, tile, scale, ui_scale))
+                              for tile in tiles] for layout in layouts}
+    merged = {}
+    for template, tile_jobs in jobs.items():
+        matches = [m for job in tile_jobs for m in job.get(timeout=timeout)]
+        # Same order as a full search (highest score first, then scan order)
+        merged[template] = sorted(matches, key=lambda m: (-m.score, m.y1, m.x1))[:MAX_MATCHES]
+    return merged
+
+
 @dataclass
 class Minion:
     x1: float
@@ -120,13 +576,87 @@ class Minion:
         return (self.y1 + self.y2) / 2
 
 
-def _find_text(img: np.ndarray, x1=-1, y1=-1, x2=-1, y2=-1, scale=1.0, lower=True) -> List[Text]:
-    if x1 != -1:
-        # Crop image
-        img = img[int(y1):int(y2), int(x1):int(x2)]
-    else:
-        x1 = 0
-        y1 = 0
+class OCRCache:
+    """
+    Remembers OCR results by the exact pixels that were read (and the OCR params), so reading the same crop again
+    (ex: a shop panel or chat line that stays on screen for a while) doesn't need to run OCR.
+    Least recently used results are thrown out first. Safe to use from several threads.
+    """
+
+    def __init__(self, max_size=256):
+        """
+        :param max_size: The maximum number of results to remember.
+        """
+        self.max_size = max_size
+        self.entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def get_key(img: np.ndarray, *params) -> Tuple:
+        """
+        Gets the cache key for reading the given image with the given params.
+        Hashing takes about 1ms per megapixel, so only pass the crop that's actually read.
+        """
+        digest = hashlib.blake2b(np.ascontiguousarray(img).data, digest_size=16).digest()
+        return (digest, img.shape, img.dtype.str) + params
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        :return: A copy of the cached result, or None if there isn't one.
+        """
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            result = self.entries[key]
+        return copy.deepcopy(result)
+
+    def put(self, key: Hashable, result: Any) -> None:
+        result = copy.deepcopy(result)
+        with self.lock:
+            self.entries[key] = result
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def get_hit_rate(self) -> float:
+        with self.lock:
+            total = self.hits + self.misses
+            return self.hits / total if total else 0
+
+
+ocr_cache = OCRCache()
+
+
+def _clip_region(shape: Tuple[int, ...], x1=-1, y1=-1, x2=-1, y2=-1) -> Tuple[int, int, int, int]:
+    """
+    Converts a find_text region to integer coordinates inside the image (the whole image if x1 is -1).
+    """
+    h, w = shape[:2]
+    if x1 == -1:
+        return 0, 0, w, h
+    return (min(max(int(x1), 0), w), min(max(int(y1), 0), h), min(max(int(x2), 0), w),
+            min(max(int(y2), 0), h))
+
+
+def _find_text(img: Union[np.ndarray, FrameRef], x1=-1, y1=-1, x2=-1, y2=-1, scale=1.0, lower=True) -> List[Text]:
+    if isinstance(img, FrameRef):
+        img = _load_frame(img).img
+    # Crop image
+    x1, y1, x2, y2 = _clip_region(img.shape, x1, y1, x2, y2)
+    img = img[y1:y2, x1:x2]
+    if img.size == 0:
+        return []
     # Read text from image
     if scale != 1:
         img = image_handler.scale_image(img, scale)
@@ -157,16 +687,67 @@ def find_text(img: np.ndarray, x1=-1, y1=-1, x2=-1, y2=-1, scale=1.0, lower=True
     :param lower: Whether to lowercase the text.
     :return: A list of all the text in the screenshot, along with their locations.
     """
-    return pool_find_text.apply(_find_text, (img, x1, y1, x2, y2, scale, lower))
+    # Only the crop that's read is hashed, not the whole screenshot
+    x1, y1, x2, y2 = _clip_region(img.shape, x1, y1, x2, y2)
+    key = OCRCache.get_key(img[y1:y2, x1:x2], "text", x1, y1, scale, lower)
+    text = ocr_cache.get(key)
+    if text is None:
+        text = pool_find_text.apply(_find_text, (_share_img(img), x1, y1, x2, y2, scale, lower))
+        ocr_cache.put(key, text)
+    return text
 
 
-def _find_number(img: np.ndarray, scale=1.0) -> int:
+def _find_numbers(crops: List[np.ndarray], scale=1.0) -> List[int]:
     if scale != 1:
-        img = image_handler.scale_image(img, scale)
-    result = ocr_reader.recognize(img, allowlist="0123456789", detail=0, paragraph=True)
-    logger.debug(f"Found number: {result}")
-    result = ''.join(result)
-    return int(result) if result.isdigit() else -1
+        crops = [image_handler.scale_image(crop, scale) for crop in crops]
+    # Paste the crops side by side, so they can all be recognized in one batch
+    gap = 8
+    canvas = np.zeros((max(crop.shape[0] for crop in crops), sum(crop.shape[1] + gap for crop in crops), 3), np.uint8)
+    boxes = []
+    box_index = {}
+    x = 0
+    for i, crop in enumerate(crops):
+        h, w = crop.shape[:2]
+        if h == 0 or w == 0:
+            continue
+        canvas[:h, x:x + w] = crop[:, :, :3] if crop.ndim == 3 else crop[:, :, np.newaxis]
+        boxes.append([x, x + w, 0, h])
+        box_index[x] = i
+        x += w + gap
+    texts = [''] * len(crops)
+    if boxes:
+        results = ocr_reader.recognize(canvas, horizontal_list=boxes, free_list=[], batch_size=len(boxes),
+                                       allowlist="0123456789", detail=1, paragraph=False)
+        # Results are sorted by position, so match them back to the crops using the left x coordinate
+        for r in results:
+            i = box_index.get(int(r[0][0][0]))
+            if i is not None:
+                texts[i] += r[1]
+    logger.debug(f"Found numbers: {texts}")
+    return [int(text) if text.isdigit() else -1 for text in texts]
+
+
+def find_numbers(crops: List[np.ndarray], scale=1.0) -> List[int]:
+    """
+    Find the (positive) number displayed in each image. All images are read at once, which is much faster than
+    calling find_number for each of them. There should only be 1 number in each image!
+    Numbers are read with the digit reader when possible, and with OCR otherwise.
+    :param crops: The images to search in.
+    :param scale: The amount to scale the images by (OCR only). Lower values will be faster, but less accurate.
+    :return: The number shown in each image, or -1 if no number was found.
+    """
+    keys = [OCRCache.get_key(crop, "number", scale) for crop in crops]
+    numbers = [ocr_cache.get(key) for key in keys]
+    if digit_reader is not None:
+        numbers = [digit_reader.read(crop) if number is None else number for crop, number in zip(crops, numbers)]
+    # Anything the digit reader wasn't sure about goes to OCR
+    missing = [i for i, number in enumerate(numbers) if number is None]
+    if missing:
+        for i, number in zip(missing, pool_find_text.apply(_find_numbers, ([crops[i] for i in missing], scale))):
+            numbers[i] = number
+    for key, number in zip(keys, numbers):
+        ocr_cache.put(key, number)
+    return numbers
 
 
 def find_number(img: np.ndarray, scale=1.0) -> int:
@@ -176,83 +757,57 @@ def find_number(img: np.ndarray, scale=1.0) -> int:
     :param scale: The amount to scale the image by. Lower values will be faster, but less accurate.
     :return: The number shown in the image, or -1 if no number was found.
     """
-    return pool_find_text.apply(_find_number, (img, scale))
+    return find_numbers([img], scale)[0]
 
 
-def _find_minions(img: np.ndarray, scale=1.0) -> List[Minion]:
-    # Find the edges of minion health bars to locate them
-    # Old: 0 0 10 and 255 255 22
-    lower_edge = np.array([80, 0, 10])
-    upper_edge = np.array([140, 255, 23])
-    template = minion_template
-    all_matches = image_handler.find_outline_matches(img, template, lower_edge, upper_edge, scale)
+def _find_minions(frame: Union[Frame, FrameRef], scale=1.0, regions=None, ui_scale: Optional[float] = None,
+                  all_matches: Optional[List[image_handler.Match]] = None) -> List[Minion]:
+    frame = _load_frame(frame)
+    ui_scale = ui_scale if ui_scale is not None else geometry.get_ui_scale(frame.img)
+    layout = geometry.MINION_BAR.scaled(ui_scale)
+    # Find the edges of minion health bars to locate them (unless they were already found in tiles)
+    if all_matches is None:
+        mask, template_mask = _get_bar_masks(frame, geometry.MINION_BAR, ui_scale)
+        all_matches = _find_bar_matches(mask, template_mask, scale, regions)
 
-    # Eliminate duplicate matches
-    matches = []
+    # Eliminate duplicate matches (same health bars)
     # logger.debug(f"Found {len(all_matches)} matches with duplicates")
-    for m1 in all_matches:
-        for m2 in matches:
-            # Check if these are the same health bars
-            if m1.x1 + 10 < m2.x2 - 10 and m1.x2 - 10 > m2.x1 + 10 and abs(m1.y1 - m2.y1) <= 2 and abs(
-                    m1.y2 - m2.y2) <= 2:
-                break
-        else:
-            # No intersections
-            matches.append(m1)
+    matches = image_handler.remove_duplicate_matches(all_matches, layout.duplicate_margin, layout.duplicate_dy)
     # logger.debug(f"Found {len(matches)} unique matches")
 
     # Determine minion side and health
-    img = cv.cvtColor(img, cv.COLOR_BGR2HSV)
     # lower_blue = np.array([101, 156, 117])
     # upper_blue = np.array([105, 163, 212])
     # lower_red = np.array([0, 135, 118])
     # upper_red = np.array([4, 143, 212])
+    # Rightmost pixel with a visible health bar color (pixel 0 is part of the edge)
+    health, sides = _read_bars(frame, matches, layout, [(lower_blue, upper_blue), (lower_red, upper_red)],
+                               layout.health_row)
     minions = []
-    for m in matches:
-        # Rightmost pixel with a visible health bar color
-        width = template.shape[1] - 2
-        y = (m.y1 + m.y2) // 2
-        low = 0
-        high = width
-        allied = None
-        while low < high:
-            mid = (low + high + 1) // 2
-            color = img[y, m.x1 + mid]
-            # Check if color is within defined bounds
-            is_blue = all(lower_blue[i] <= color[i] <= upper_blue[i] for i in range(3))
-            is_red = all(lower_red[i] <= color[i] <= upper_red[i] for i in range(3))
-            if is_blue:
-                allied = True
-            elif is_red:
-                allied = False
-            if is_blue or is_red:
-                low = mid
-            else:
-                high = mid - 1
-        health = low / width
+    for m, h, side in zip(matches, health.tolist(), sides.tolist()):
         # Only add confirmed minions (no false positives)
-        if allied is not None:
+        if side != -1:
             # Minion is below health bar
-            # 1280 x 720:
-            # minion = Minion(m.x1+10, m.y1+20, m.x2-10, m.y2+45, allied, health)
-            # 1920 x 1080:
-            minion = Minion(m.x1, m.y1 + 25, m.x2, m.y2 + 75, allied, health)
+            minion = Minion(*layout.get_box(m), side == 0, h)
             minions.append(minion)
     logger.debug(f"Found {len(minions)} minions")
     return minions
 
 
-def find_minions(img: np.ndarray, scale=1.0) -> List[Minion]:
+def find_minions(img: np.ndarray, scale=1.0, ui_scale: Optional[float] = None) -> List[Minion]:
     """
     Find all minions in the given screenshot.
     Note: This function cannot tell the difference between the different types of minions.
     :param img: The screenshot to search in.
     :param scale: The amount to scale the images by. Lower values will be faster, but less accurate.
+    :param ui_scale: The UI scale of the screenshot (see geometry.get_ui_scale). Defaults to the game window's scale.
     :return: A list of all minions in the screenshot.
     TODO: Use more precise color masks? Maybe don't need to? (Using vague ones detects wards /
     has false positives and weird detections for jg monsters)
     """
-    return pool_find_minions.apply(_find_minions, args=(img, scale))
+    frame = analyze_frame(img)
+    return pool_find_minions.apply(_find_minions,
+                                   args=(_share(frame), scale, None, geometry.get_ui_scale(img, ui_scale)))
 
 
 @dataclass
@@ -274,30 +829,21 @@ class Player:
         return (self.y1 + self.y2) / 2
 
 
-def _find_players(img: np.ndarray, scale=1.0) -> List[Player]:
-    # Find the edges of player health bars to locate them
-    # Lower: 22 0 51
-    # Upper: 60 32 115
-    lower_edge = np.array([0, 0, 62])
-    upper_edge = np.array([179, 33, 121])
-    template = player_template
-    all_matches = image_handler.find_outline_matches(img, template, lower_edge, upper_edge, scale)
+def _find_players(frame: Union[Frame, FrameRef], scale=1.0, regions=None, ui_scale: Optional[float] = None,
+                  all_matches: Optional[List[image_handler.Match]] = None) -> List[Player]:
+    frame = _load_frame(frame)
+    ui_scale = ui_scale if ui_scale is not None else geometry.get_ui_scale(frame.img)
+    layout = geometry.PLAYER_BAR.scaled(ui_scale)
+    # Find the edges of player health bars to locate them (unless they were already found in tiles)
+    if all_matches is None:
+        mask, template_mask = _get_bar_masks(frame, geometry.PLAYER_BAR, ui_scale)
+        all_matches = _find_bar_matches(mask, template_mask, scale, regions)
     # logger.debug(f"Found {len(all_matches)} matches with duplicates")
 
-    # Eliminate duplicate matches
-    matches = []
-    for m1 in all_matches:
-        for m2 in matches:
-            # Check if these are the same health bars
-            if m1.x1 + 30 < m2.x2 - 30 and m1.x2 - 30 > m2.x1 + 30 and abs(m1.y1 - m2.y1) <= 3 and abs(
-                    m1.y2 - m2.y2) <= 3:
-                break
-        else:
-            # No intersections
-            matches.append(m1)
+    # Eliminate duplicate matches (same health bars)
+    matches = image_handler.remove_duplicate_matches(all_matches, layout.duplicate_margin, layout.duplicate_dy)
     # logger.debug(f"Found {len(matches)} unique matches")
 
-    hsv = cv.cvtColor(img, cv.COLOR_BGR2HSV)
     lower_green = np.array([53, 190, 131])
     upper_green = np.array([60, 200, 149])
     # lower_blue = np.array([97, 219, 192])
@@ -306,71 +852,57 @@ def _find_players(img: np.ndarray, scale=1.0) -> List[Player]:
     # upper_red = np.array([5, 217, 152])
     lower_mana = np.array([93, 155, 208])
     upper_mana = np.array([104, 195, 225])
+    # Parse health and mana bars, from rightmost pixel with a visible color
+    # TODO: Does not account for shielding (which causes a white hp bar)
+    health, player_types = _read_bars(frame, matches, layout, [(lower_green, upper_green), (lower_blue, upper_blue),
+                                                               (lower_red, upper_red)], layout.health_row)
+    mana, _ = _read_bars(frame, matches, layout, [(lower_mana, upper_mana)], layout.mana_row)
     players = []
-    for m in matches:
-        # Parse health bar
-        # TODO: Does not account for shielding (which causes a white hp bar)
-        xh_left = m.x1 + 26
-        xh_right = m.x2 - 4
-        width = xh_right - xh_left
-        yh = m.y1 + 15
-        player_type = -1
-        for i in range(round(width), -1, -1):
-            color = hsv[yh, xh_left + i]
-            # Check if color is within defined bounds
-            is_green = all(lower_green[i] <= color[i] <= upper_green[i] for i in range(3))
-            is_blue = all(lower_blue[i] <= color[i] <= upper_blue[i] for i in range(3))
-            is_red = all(lower_red[i] <= color[i] <= upper_red[i] for i in range(3))
-            if is_green:
-                player_type = 0
-            elif is_blue:
-                player_type = 1
-            elif is_red:
-                player_type = 2
-            if is_green or is_blue or is_red:
-                health = i / width
-                break
-        else:
-            health = 0
+    for m, h, player_type, mp_ in zip(matches, health.tolist(), player_types.tolist(), mana.tolist()):
         # Avoid false positives
         if player_type == -1:
             continue
-        # Parse mana bar
-        ym = m.y1 + 21
-        for i in range(round(width), -1, -1):
-            color = hsv[ym, xh_left + i]
-            # Check if color is within defined bounds
-            is_mana = all(lower_mana[i] <= color[i] <= upper_mana[i] for i in range(3))
-            if is_mana:
-                mana = i / width
-                break
-        else:
-            mana = 0
-        player = Player(m.x1 + 20, m.y1 + 75, m.x2 - 20, m.y2 + 150, player_type != 2, player_type == 0, health, mana, -1)
+        player = Player(*layout.get_box(m), player_type != 2, player_type == 0, h, mp_, -1)
         players.append(player)
     logger.debug(f"Found {len(players)} players")
     return players
 
 
-def find_players(img: np.ndarray, scale=1.0) -> List[Player]:
+def find_players(img: np.ndarray, scale=1.0, ui_scale: Optional[float] = None) -> List[Player]:
     """
     Find all players in the given screenshot.
     Note: This function cannot tell who the player actually is.
     :param img: The screenshot to search in.
     :param scale: The amount to scale the images by. Lower values will be faster, but less accurate.
+    :param ui_scale: The UI scale of the screenshot (see geometry.get_ui_scale). Defaults to the game window's scale.
     :return: A list of all players in the screenshot. Level will be -1 if it can't be parsed.
     """
-    players = pool_find_players.apply(_find_players, args=(img, scale))
-    # Attempt to parse player levels
+    return _find_player_levels(img, analyze_frame(img), scale, ui_scale=ui_scale)
+
+
+def _find_player_levels(img: np.ndarray, frame: Frame, scale=1.0, regions=None,
+                        all_matches: Optional[List[image_handler.Match]] = None,
+                        ui_scale: Optional[float] = None) -> List[Player]:
+    ui_scale = geometry.get_ui_scale(img, ui_scale)
+    if all_matches is None:
+        players = pool_find_players.apply(_find_players, args=(_share(frame), scale, regions, ui_scale))
+    else:
+        # Only duplicates and bars are left to check, which is quicker than sending the matches to a worker
+        players = _find_players(frame, scale, ui_scale=ui_scale, all_matches=all_matches)
+    # Attempt to parse player levels (all at once)
+    lx, ly, lw, lh = [geometry.scale_px(v, ui_scale) for v in geometry.PLAYER_LEVEL]
+    level_imgs = []
     for player in players:
-        x1 = player.x1 + 6 - 20
-        y1 = player.y1 + 8 - 75
-        x2 = x1 + 16
-        y2 = y1 + 12
-        img_level = img[y1:y2, x1:x2]
+        x1, y1 = geometry.get_bar_origin(player.x1, player.y1, geometry.PLAYER_BAR, ui_scale)
+        x1 += lx
+        y1 += ly
+        x2 = x1 + lw
+        y2 = y1 + lh
+        img_level = img[max(y1, 0):y2, max(x1, 0):x2]
+        level_imgs.append(img_level)
         # disp = image_handler.scale_image(img_level, 4)
         # cv.imshow("level", disp)
-        level = find_number(img_level)
+    for player, level in zip(players, find_numbers(level_imgs)):
         if level < 1 or level > 18:
             level = -1
         player.level = level
@@ -394,158 +926,151 @@ class Objective:
         return (self.y1 + self.y2) / 2
 
 
-def _find_small_objectives(img: np.ndarray, scale=1.0) -> List[Objective]:
-    # Find the edges of objective health bars to locate them
-    lower_edge = np.array([16, 68, 70])
-    upper_edge = np.array([28, 190, 220])
-    hsv = cv.cvtColor(img, cv.COLOR_BGR2HSV)
-
-    # Find small objectives
-    all_matches = image_handler.find_outline_matches(img, small_objective_template, lower_edge, upper_edge, scale)
-    # Eliminate duplicate matches
-    matches = []
-    for m1 in all_matches:
-        for m2 in matches:
-            # Check if these are the same health bars
-            if m1.x1 + 10 < m2.x2 - 10 and m1.x2 - 10 > m2.x1 + 10 and abs(m1.y1 - m2.y1) <= 2 and abs(
-                    m1.y2 - m2.y2) <= 2:
-                break
-        else:
-            # No intersections
-            matches.append(m1)
+def _find_small_objectives(frame: Union[Frame, FrameRef], scale=1.0, regions=None, ui_scale: Optional[float] = None,
+                           all_matches: Optional[List[image_handler.Match]] = None) -> List[Objective]:
+    frame = _load_frame(frame)
+    ui_scale = ui_scale if ui_scale is not None else geometry.get_ui_scale(frame.img)
+    layout = geometry.SMALL_OBJECTIVE_BAR.scaled(ui_scale)
+    # Find small objectives using the edges of their health bars (unless they were already found in tiles)
+    if all_matches is None:
+        mask, template_mask = _get_bar_masks(frame, geometry.SMALL_OBJECTIVE_BAR, ui_scale)
+        all_matches = _find_bar_matches(mask, template_mask, scale, regions)
+    # Eliminate duplicate matches (same health bars)
+    matches = image_handler.remove_duplicate_matches(all_matches, layout.duplicate_margin, layout.duplicate_dy)
+    # Parse health bar, from rightmost pixel with a visible color
+    health, obj_types = _read_bars(frame, matches, layout, [(lower_blue, upper_blue), (lower_red, upper_red)],
+                                   layout.health_row)
     small = []
-    for m in matches:
-        # Parse health bar
-        xh_left = m.x1 + 3
-        xh_right = m.x2 - 4
-        width = xh_right - xh_left
-        yh = m.y1 + 8
-        obj_type = -1
-        for i in range(round(width), -1, -1):
-            color = hsv[yh, xh_left + i]
-            # Check if color is within defined bounds
-            is_blue = all(lower_blue[i] <= color[i] <= upper_blue[i] for i in range(3))
-            is_red = all(lower_red[i] <= color[i] <= upper_red[i] for i in range(3))
-            if is_blue:
-                obj_type = 0
-            elif is_red:
-                obj_type = 1
-            if is_blue or is_red:
-                health = i / width
-                break
-        else:
-            health = 0
+    for m, h, obj_type in zip(matches, health.tolist(), obj_types.tolist()):
         # Avoid false positives
         if obj_type == -1:
             continue
-        small.append(Objective(m.x1 + 15, m.y1 + 100, m.x2 - 15, m.y2 + 270, obj_type == 0, "small", health))
+        small.append(Objective(*layout.get_box(m), obj_type == 0, "small", h))
 
     logger.debug(f"Found {len(small)} small objectives")
     return small
 
 
-def find_small_objectives(img: np.ndarray, scale=1.0) -> List[Objective]:
+def find_small_objectives(img: np.ndarray, scale=1.0, ui_scale: Optional[float] = None) -> List[Objective]:
     """
     Find all small objectives in the given screenshot.
     :param img: The screenshot to search in.
     :param scale: The amount to scale the images by. Lower values will be faster, but less accurate.
+    :param ui_scale: The UI scale of the screenshot (see geometry.get_ui_scale). Defaults to the game window's scale.
     :return: A list of all small objectives in the screenshot.
     """
-    return pool_find_small_objectives.apply(_find_small_objectives, args=(img, scale))
-
-
-def _find_big_objectives(img: np.ndarray, scale=1.0) -> List[Objective]:
-    # Find the edges of objective health bars to locate them
-    lower_edge = np.array([16, 68, 70])
-    upper_edge = np.array([28, 190, 220])
-    hsv = cv.cvtColor(img, cv.COLOR_BGR2HSV)
-
-    # Find big objectives
-    all_matches = image_handler.find_outline_matches(img, big_objective_template, lower_edge, upper_edge, scale)
-    # Eliminate duplicate matches
-    matches = []
-    for m1 in all_matches:
-        for m2 in matches:
-            # Check if these are the same health bars
-            if m1.x1 + 10 < m2.x2 - 10 and m1.x2 - 10 > m2.x1 + 10 and abs(m1.y1 - m2.y1) <= 2 and abs(
-                    m1.y2 - m2.y2) <= 2:
-                break
-        else:
-            # No intersections
-            matches.append(m1)
+    frame = analyze_frame(img)
+    return pool_find_small_objectives.apply(_find_small_objectives,
+                                            args=(_share(frame), scale, None, geometry.get_ui_scale(img, ui_scale)))
+
+
+def _find_big_objectives(frame: Union[Frame, FrameRef], scale=1.0, regions=None, ui_scale: Optional[float] = None,
+                         all_matches: Optional[List[image_handler.Match]] = None) -> List[Objective]:
+    frame = _load_frame(frame)
+    ui_scale = ui_scale if ui_scale is not None else geometry.get_ui_scale(frame.img)
+    layout = geometry.BIG_OBJECTIVE_BAR.scaled(ui_scale)
+    # Find big objectives using the edges of their health bars (unless they were already found in tiles)
+    if all_matches is None:
+        mask, template_mask = _get_bar_masks(frame, geometry.BIG_OBJECTIVE_BAR, ui_scale)
+        all_matches = _find_bar_matches(mask, template_mask, scale, regions)
+    # Eliminate duplicate matches (same health bars)
+    matches = image_handler.remove_duplicate_matches(all_matches, layout.duplicate_margin, layout.duplicate_dy)
+    # Parse health bar, from rightmost pixel with a visible color
+    health, obj_types = _read_bars(frame, matches, layout, [(lower_blue, upper_blue), (lower_red, upper_red)],
+                                   layout.health_row)
     big = []
-    for m in matches:
-        # Parse health bar
-        xh_left = m.x1 + 6
-        xh_right = m.x2 - 7
-        width = xh_right - xh_left
-        yh = m.y1 + 12
-        obj_type = -1
-        for i in range(round(width), -1, -1):
-            color = hsv[yh, xh_left + i]
-            # Check if color is within defined bounds
-            is_blue = all(lower_blue[i] <= color[i] <= upper_blue[i] for i in range(3))
-            is_red = all(lower_red[i] <= color[i] <= upper_red[i] for i in range(3))
-            if is_blue:
-                obj_type = 0
-            elif is_red:
-                obj_type = 1
-            if is_blue or is_red:
-                health = i / width
-                break
-        else:
-            health = 0
+    for m, h, obj_type in zip(matches, health.tolist(), obj_types.tolist()):
         # Avoid false positives
         if obj_type == -1:
             continue
-        big.append(Objective(m.x1 + 40, m.y1 + 100, m.x2 - 40, m.y2 + 320, obj_type == 0, "big", health))
+        big.append(Objective(*layout.get_box(m), obj_type == 0, "big", h))
 
     logger.debug(f"Found {len(big)} big objectives")
     return big
 
 
-def find_big_objectives(img: np.ndarray, scale=1.0) -> List[Objective]:
+def find_big_objectives(img: np.ndarray, scale=1.0, ui_scale: Optional[float] = None) -> List[Objective]:
     """
     Find all big objectives in the given screenshot.
     :param img: The screenshot to search in.
     :param scale: The amount to scale the images by. Lower values will be faster, but less accurate.
+    :param ui_scale: The UI scale of the screenshot (see geometry.get_ui_scale). Defaults to the game window's scale.
     :return: A list of all big objectives in the screenshot.
     """
-    return pool_find_big_objectives.apply(_find_big_objectives, args=(img, scale))
+    frame = analyze_frame(img)
+    return pool_find_big_objectives.apply(_find_big_objectives,
+                                          args=(_share(frame), scale, None, geometry.get_ui_scale(img, ui_scale)))
 
 
-def find_all(img, scale=1.0, timeout=5) -> Tuple[List[Minion], List[Player], List[Objective]]:
+def find_all(img, scale=1.0, timeout=5,
+             ui_scale: Optional[float] = None) -> Tuple[List[Minion], List[Player], List[Objective]]:
     """
     Finds players, turrets, and all objectives in the given screenshot.
     Does not find text!
+    The screenshot is converted to HSV and masked only once, and the result is shared by all detectors.
+    For the lowest overhead, capture the screenshot directly into the frame buffer (see take_game_screenshot).
+    If region tracking is on, only the parts of the screen that changed (or had detections) are searched.
     :param img: The screenshot to search in.
     :param scale: The amount to scale the images by. Lower values will be faster, but less accurate.
     :param timeout: The maximum amount of time to wait for the searches to finish.
+    :param ui_scale: The UI scale of the screenshot (see geometry.get_ui_scale). Defaults to the game window's scale.
     :return: Lists of minions, players, and objectives.
     """
-    raw_minions = pool_find_minions.apply_async(_find_minions, args=(img, scale))
-    raw_small_objectives = pool_find_small_objectives.apply_async(_find_small_objectives, args=(img, scale))
-    raw_big_objectives = pool_find_big_objectives.apply_async(_find_big_objectives, args=(img, scale))
-    raw_players = find_players(img, scale)
-    # raw_players = pool_find_players.apply_async(_find_players, args=(img, scale))
-    # raw_players = raw_players.get(timeout=timeout)
-    raw_minions = raw_minions.get(timeout=timeout)
-    raw_small_objectives = raw_small_objectives.get(timeout=timeout)
-    raw_big_objectives = raw_big_objectives.get(timeout=timeout)
+    frame = analyze_frame(img)
+    regions = {}
+    ui_scale = geometry.get_ui_scale(frame.img, ui_scale)
+    if region_tracker is not None and not region_tracker.update(frame.img, ui_scale):
+        for layout in [geometry.MINION_BAR, geometry.PLAYER_BAR, geometry.SMALL_OBJECTIVE_BAR,
+                       geometry.BIG_OBJECTIVE_BAR]:
+            template = image_handler.load_image(os.path.join(ROOT_DIR, "img", layout.template), ui_scale)
+            regions[layout.template] = region_tracker.get_regions(layout.template, template.shape, ui_scale)
+    if pool_find_tiles is not None and not regions:
+        # Full searches are split into tiles, so that every core helps with the slowest detector
+        layouts = [geometry.MINION_BAR, geometry.PLAYER_BAR, geometry.SMALL_OBJECTIVE_BAR, geometry.BIG_OBJECTIVE_BAR]
+        tiled = _find_tiled_matches(frame, layouts, scale, timeout, ui_scale)
+        raw_minions = _find_minions(frame, scale, ui_scale=ui_scale, all_matches=tiled[geometry.MINION_BAR.template])
+        raw_small_objectives = _find_small_objectives(frame, scale, ui_scale=ui_scale,
+                                                      all_matches=tiled[geometry.SMALL_OBJECTIVE_BAR.template])
+        raw_big_objectives = _find_big_objectives(frame, scale, ui_scale=ui_scale,
+                                                  all_matches=tiled[geometry.BIG_OBJECTIVE_BAR.template])
+        raw_players = _find_player_levels(img, frame, scale, all_matches=tiled[geometry.PLAYER_BAR.template],
+                                          ui_scale=ui_scale)
+    else:
+        raw_minions = pool_find_minions.apply_async(
+            _find_minions, args=(_share(frame), scale, regions.get(geometry.MINION_BAR.template), ui_scale))
+        raw_small_objectives = pool_find_small_objectives.apply_async(
+            _find_small_objectives,
+            args=(_share(frame), scale, regions.get(geometry.SMALL_OBJECTIVE_BAR.template), ui_scale))
+        raw_big_objectives = pool_find_big_objectives.apply_async(
+            _find_big_objectives,
+            args=(_share(frame), scale, regions.get(geometry.BIG_OBJECTIVE_BAR.template), ui_scale))
+        raw_players = _find_player_levels(img, frame, scale, regions.get(geometry.PLAYER_BAR.template),
+                                          ui_scale=ui_scale)
+        # raw_players = pool_find_players.apply_async(_find_players, args=(img, scale))
+        # raw_players = raw_players.get(timeout=timeout)
+        raw_minions = raw_minions.get(timeout=timeout)
+        raw_small_objectives = raw_small_objectives.get(timeout=timeout)
+        raw_big_objectives = raw_big_objectives.get(timeout=timeout)
+    if region_tracker is not None:
+        region_tracker.remember(geometry.MINION_BAR.template, raw_minions)
+        region_tracker.remember(geometry.PLAYER_BAR.template, raw_players)
+        region_tracker.remember(geometry.SMALL_OBJECTIVE_BAR.template, raw_small_objectives)
+        region_tracker.remember(geometry.BIG_OBJECTIVE_BAR.template, raw_big_objectives)
     return raw_minions, raw_players, raw_small_objectives + raw_big_objectives
 
 
 def close() -> None:
-    pool_find_text.close()
-    pool_find_text.join()
-    pool_find_minions.close()
-    pool_find_minions.join()
-    pool_find_players.close()
-    pool_find_players.join()
-    pool_find_small_objectives.close()
-    pool_find_small_objectives.join()
-    pool_find_big_objectives.close()
-    pool_find_big_objectives.join()
+    global frame_buffer, pool_find_tiles
+    # With the thread engine, the detectors all share one pool
+    for pool in dict.fromkeys([pool_find_text, pool_find_minions, pool_find_players, pool_find_small_objectives,
+                               pool_find_big_objectives, pool_find_tiles]):
+        if pool is not None:
+            pool.close()
+            pool.join()
+    pool_find_tiles = None
+    if frame_buffer is not None:
+        frame_buffer.close()
+        frame_buffer = None
 
 
 # Fix for PyInstaller multiprocessing issues
@@ -0,0 +1,157 @@
+"""
+Contains the positions and sizes of everything that the vision module reads off the screen.
+Everything is measured in reference pixels (at 1920x1080), and scaled by the frame height, since League scales its
+HUD and health bars with the vertical resolution. This lets capture, matching, and OCR run natively at lower
+resolutions (ex: 1280x720), instead of capturing at 1080p.
+"""
+
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+# All offsets are measured at this frame height
+REFERENCE_HEIGHT = 1080
+# Height of the game's client area (the part the game draws in), by the height of the whole game window.
+# In windowed mode, captures of the window include its title bar and borders, which the HUD doesn't scale with.
+client_heights: Dict[int, int] = {}
+
+
+def set_client_height(window_height: int, client_height: int) -> None:
+    """
+    Remembers how tall the game's client area is in captures of the whole window (see window_tracker).
+    """
+    client_heights[window_height] = client_height
+
+
+def get_scale_for_height(h: int) -> float:
+    """
+    :param h: The height of a capture of the game window.
+    :return: How big the HUD and health bars are compared to 1920x1080.
+    """
+    return client_heights.get(h, h) / REFERENCE_HEIGHT
+
+
+def get_ui_scale(img: np.ndarray, ui_scale: Optional[float] = None) -> float:
+    """
+    :param img: A screenshot of the game.
+    :param ui_scale: If given, it's used as is (ex: for recorded frames from a windowed game).
+    :return: How big the HUD and health bars are compared to 1920x1080.
+    """
+    return ui_scale if ui_scale is not None else get_scale_for_height(img.shape[0])
+
+
+def scale_px(value: float, ui_scale: float) -> int:
+    """
+    Converts a distance in reference pixels to screen pixels.
+    """
+    return round(value * ui_scale)
+
+
+@dataclass(frozen=True)
+class BarLayout:
+    """
+    Where to read a type of health bar, and where its entity is, relative to the bar's outline match.
+    All values are in reference pixels.
+    """
+    # Template file of the bar's outline (in the img folder)
+    template: str
+    # The fill is read from this far right of the match's left edge, to this far left of its right edge (inclusive)
+    fill_left: int
+    fill_right: int
+    # The first pixel of the fill that is checked (relative to fill_left)
+    fill_start: int
+    # The row of the health fill, and mana fill (if any), below the match's top edge
+    health_row: int
+    mana_row: Optional[int]
+    # The entity's box, as offsets from the match's (x1, y1, x2, y2)
+    box: Tuple[int, int, int, int]
+    # Matches closer than this are the same bar (see image_handler.remove_duplicate_matches)
+    duplicate_margin: int
+    duplicate_dy: int
+
+    def scaled(self, ui_scale: float) -> "BarLayout":
+        """
+        :return: The layout in screen pixels, for frames with the given UI scale.
+        """
+        return _scale_layout(self, ui_scale)
+
+    def get_box(self, m) -> Tuple[float, float, float, float]:
+        """
+        :param m: A match of the bar's outline (in screen pixels, with the layout already scaled).
+        :return: The box (x1, y1, x2, y2) of the entity that the bar belongs to.
+        """
+        return m.x1 + self.box[0], m.y1 + self.box[1], m.x2 + self.box[2], m.y2 + self.box[3]
+
+
+@lru_cache(maxsize=64)
+def _scale_layout(layout: BarLayout, ui_scale: float) -> BarLayout:
+    if ui_scale == 1:
+        return layout
+    s = ui_scale
+    return BarLayout(layout.template, scale_px(layout.fill_left, s), scale_px(layout.fill_right, s),
+                     scale_px(layout.fill_start, s), scale_px(layout.health_row, s),
+                     scale_px(layout.mana_row, s) if layout.mana_row is not None else None,
+                     tuple(scale_px(v, s) for v in layout.box), scale_px(layout.duplicate_margin, s),
+                     max(1, scale_px(layout.duplicate_dy, s)))
+
+
+MINION_BAR = BarLayout("minion.png", fill_left=0, fill_right=1, fill_start=1, health_row=2, mana_row=None,
+                       box=(0, 25, 0, 75), duplicate_margin=10, duplicate_dy=2)
+PLAYER_BAR = BarLayout("player.png", fill_left=26, fill_right=4, fill_start=0, health_row=15, mana_row=21,
+                       box=(20, 75, -20, 150), duplicate_margin=30, duplicate_dy=3)
+SMALL_OBJECTIVE_BAR = BarLayout("small_objective.png", fill_left=3, fill_right=4, fill_start=0, health_row=8,
+                                mana_row=None, box=(15, 100, -15, 270), duplicate_margin=10, duplicate_dy=2)
+BIG_OBJECTIVE_BAR = BarLayout("big_objective.png", fill_left=6, fill_right=7, fill_start=0, health_row=12,
+                              mana_row=None, box=(40, 100, -40, 320), duplicate_margin=10, duplicate_dy=2)
+
+# Player level number (x, y, w, h), relative to the top-left of the player's health bar match
+PLAYER_LEVEL = (6, 8, 16, 12)
+# A pixel that turns purple when the player has stun up (x, y), relative to the player's health bar match
+PLAYER_STUN = (104, 30)
+# Gold count (x1, y1, x2, y2), relative to the bottom center of the screen
+GOLD = (165, -35, 220, -8)
+# How far from the bottom-right corner to look for the minimap
+MINIMAP_SEARCH = 500
+# Chat box (x1, y1, x2, y2), relative to the bottom-left of the screen
+CHAT = (0, -380, 520, -150)
+
+
+def get_bar_origin(x1: float, y1: float, layout: BarLayout, ui_scale: float) -> Tuple[int, int]:
+    """
+    Gets the top-left corner of an entity's health bar match, from the top-left corner of the entity's box.
+    """
+    box = layout.scaled(ui_scale).box
+    return round(x1) - box[0], round(y1) - box[1]
+
+
+def get_hud_region(img: np.ndarray, region: Tuple[float, float, float, float]) -> Tuple[int, int, int, int]:
+    """
+    Converts a region anchored to the bottom center of the screen (ex: GOLD) to screen pixels.
+    :return: The region (x1, y1, x2, y2) in screen pixels.
+    """
+    h, w = img.shape[:2]
+    return _get_anchored_region(w, h, w * 0.5, region)
+
+
+def _get_anchored_region(w: int, h: int, anchor_x: float,
+                         region: Tuple[float, float, float, float]) -> Tuple[int, int, int, int]:
+    s = get_scale_for_height(h)
+    x1, y1, x2, y2 = region
+    return int(anchor_x + x1 * s), int(h + y1 * s), int(anchor_x + x2 * s), int(h + y2 * s)
+
+
+def get_capture_regions(w: int, h: int) -> Dict[str, Tuple[int, int, int, int]]:
+    """
+    Gets the parts of the HUD that can be captured on their own (see screenshot.grab_regions).
+    :param w: The game's width.
+    :param h: The game's height.
+    :return: Each region (x1, y1, x2, y2) in screen pixels, by name.
+    """
+    minimap = scale_px(MINIMAP_SEARCH, get_scale_for_height(h))
+    return {
+        "minimap": (max(w - minimap, 0), max(h - minimap, 0), w, h),
+        "gold": _get_anchored_region(w, h, w * 0.5, GOLD),
+        "chat": _get_anchored_region(w, h, 0, CHAT),
+    }
@@ -3,11 +3,13 @@ Contains helper functions for matching templates to images.
 Has functions for exact matches, outline matches, and scaled matches.
 """
 
+import math
+from collections import defaultdict
 from dataclasses import dataclass
 
 import cv2 as cv
 import numpy as np
-from typing import List
+from typing import Dict, List, Optional, Tuple, Union
 
 from misc import color_logging
 from misc.definitions import MAX_MATCHES
@@ -49,19 +51,36 @@ class Match:
     score: float
 
 
-def find_exact_matches(img: np.ndarray, template: np.ndarray, scale=1, threshold=0.75) -> List[Match]:
+# Compact form of a list of matches (one row per match)
+MATCH_DTYPE = np.dtype([('x1', np.int32), ('y1', np.int32), ('x2', np.int32), ('y2', np.int32), ('score', np.float32)])
+
+
+def matches_from_peaks(peaks: np.ndarray) -> List[Match]:
+    """
+    Converts a structured array of matches (see find_exact_peaks) into a list of Match objects.
+    :param peaks: The structured array.
+    :return: The list of matches, in the same order.
+    """
+    return [Match(*p) for p in peaks.tolist()]
+
+
+def find_exact_peaks(img: np.ndarray, template: np.ndarray, scale=1, threshold=0.75, max_matches=MAX_MATCHES,
+                     local_max=False) -> np.ndarray:
     """
     Finds the locations where a given template is present on the image, without scaling or rotation.
+    Unlike find_exact_matches, this never builds Python objects for each point, and returns a structured array.
     :param img: The image to search in.
     :param template: The template to search for.
     :param scale: The amount to scale the images by. Lower values will be faster, but less accurate.
     :param threshold: The threshold needed to count as a match. Lower values allow for more lenient matches.
-    :return: A list of matches, sorted by highest score first.
+    :param max_matches: The max number of matches to return. The ones with the highest scores are kept.
+    :param local_max: Whether to only keep points that have the highest score in their 3x3 neighborhood.
+    :return: A structured array of matches (see MATCH_DTYPE), sorted by highest score first.
     """
 
     # Can the image have a match?
     if template.shape[0] > img.shape[0] or template.shape[1] > img.shape[1]:
-        return []
+        return np.empty(0, dtype=MATCH_DTYPE)
 
     # Downscale images for efficiency
     if scale != 1:
@@ -70,58 +89,306 @@ def find_exact_matches(img: np.ndarray, template: np.ndarray, scale=1, threshold
 
     # Locate template in original image
     res = cv.matchTemplate(img, template, cv.TM_CCORR_NORMED)
-    # Invert all values of the 2D res array
-    loc = np.where(res >= threshold)
-    points = list(zip(*loc[::-1]))
+    peaks = _peaks_from_scores(res, template.shape[:2], threshold, max_matches, local_max)
 
-    # Return matches
-    matches = []
-    for pt in points:
-        matches.append(Match(x1=pt[0], y1=pt[1], x2=pt[0]+template.shape[1]-1, y2=pt[1]+template.shape[0]-1,
-                             score=res[pt[1]][pt[0]]))
-        if len(matches) >= MAX_MATCHES:
-            break
     # Upscale coordinates
     if scale != 1:
-        for m in matches:
-            m.x1 = round(m.x1 / scale)
-            m.x2 = round(m.x2 / scale)
-            m.y1 = round(m.y1 / scale)
-            m.y2 = round(m.y2 / scale)
-    matches = sorted(matches, key=lambda m: m.score, reverse=True)
-    return matches
+        for c in ('x1', 'y1', 'x2', 'y2'):
+            peaks[c] = np.round(peaks[c] / scale)
+    return peaks
 
 
-def find_outline_matches(img: np.ndarray, template: np.ndarray, lower_mask: np.ndarray, upper_mask: np.ndarray,
-                         scale=1, threshold=0.75) -> List[Match]:
+def _peaks_from_scores(res: np.ndarray, template_shape: Tuple[int, int], threshold: float, max_matches: int,
+                       local_max: bool) -> np.ndarray:
     """
-    Finds the locations where a given template's outline is present on the image, without scaling or rotation.
-    This turns the images into binary images depending on whether the colors are in [lower_mask, upper_mask], then looks
-    for template matches in the binary images.
+    Finds the matches in a score map (ex: from cv.matchTemplate), as a structured array sorted by highest score first.
+    """
+    is_peak = res >= threshold
+    if local_max:
+        # A point is a local max if dilating the scores doesn't change it
+        is_peak &= res >= cv.dilate(res, np.ones((3, 3), np.uint8))
+    ys, xs = np.nonzero(is_peak)
+    return _peaks_from_points(ys, xs, res[ys, xs], template_shape, max_matches)
+
+
+def _peaks_from_points(ys: np.ndarray, xs: np.ndarray, scores: np.ndarray, template_shape: Tuple[int, int],
+                       max_matches: int) -> np.ndarray:
+    """
+    Converts matched points (in scan order) into a structured array of the best matches, sorted by highest score first.
+    """
+    # Keep the best matches (ties stay in scan order)
+    if len(scores) > max_matches:
+        best = np.sort(np.argpartition(-scores, max_matches - 1)[:max_matches])
+        ys, xs, scores = ys[best], xs[best], scores[best]
+    order = np.argsort(-scores, kind='stable')
+    peaks = np.empty(len(order), dtype=MATCH_DTYPE)
+    peaks['x1'] = xs[order]
+    peaks['y1'] = ys[order]
+    peaks['x2'] = xs[order] + template_shape[1] - 1
+    peaks['y2'] = ys[order] + template_shape[0] - 1
+    peaks['score'] = scores[order]
+    return peaks
+
+
+def find_exact_matches(img: np.ndarray, template: np.ndarray, scale=1, threshold=0.75, local_max=False) -> List[Match]:
+    """
+    Finds the locations where a given template is present on the image, without scaling or rotation.
     :param img: The image to search in.
     :param template: The template to search for.
+    :param scale: The amount to scale the images by. Lower values will be faster, but less accurate.
+    :param threshold: The threshold needed to count as a match. Lower values allow for more lenient matches.
+    :param local_max: Whether to only keep points that have the highest score in their 3x3 neighborhood.
+    :return: A list of matches, sorted by highest score first (at most MAX_MATCHES of the best ones).
+    """
+    return matches_from_peaks(find_exact_peaks(img, template, scale, threshold, local_max=local_max))
+
+
+def remove_duplicate_matches(matches: List[Match], margin: float, max_dy: float) -> List[Match]:
+    """
+    Removes duplicate matches, keeping the first (highest score) one of each group.
+    A match is a duplicate of a kept match if their x ranges still overlap after shrinking both by the margin, and
+    their top and bottom edges are both within max_dy of each other.
+    Kept matches are bucketed into a grid, so each match is only compared to kept matches in nearby cells.
+    :param matches: The matches, in priority order (ex: sorted by highest score first).
+    :param margin: The amount to shrink each side of the x ranges by.
+    :param max_dy: The max vertical distance between the edges of duplicates.
+    :return: The unique matches, in the same order.
+    """
+    if not matches:
+        return []
+    # Duplicates can never be further apart than this, so they're always in neighboring cells
+    cell_w = max(m.x2 - m.x1 for m in matches) + 2 * abs(margin) + 1
+    cell_h = max_dy + 1
+    grid = defaultdict(list)
+    unique = []
+    for m1 in matches:
+        cx = math.floor(m1.x1 / cell_w)
+        cy = math.floor(m1.y1 / cell_h)
+        is_duplicate = False
+        for nx in range(cx - 1, cx + 2):
+            for ny in range(cy - 1, cy + 2):
+                for m2 in grid.get((nx, ny), ()):
+                    # Check if these are the same object
+                    if m1.x1 + margin < m2.x2 - margin and m1.x2 - margin > m2.x1 + margin and \
+                            abs(m1.y1 - m2.y1) <= max_dy and abs(m1.y2 - m2.y2) <= max_dy:
+                        is_duplicate = True
+                        break
+                if is_duplicate:
+                    break
+            if is_duplicate:
+                break
+        if not is_duplicate:
+            # No intersections
+            unique.append(m1)
+            grid[(cx, cy)].append(m1)
+    return unique
+
+
+def get_outline_mask(img: np.ndarray, lower_mask: np.ndarray, upper_mask: np.ndarray, is_hsv=False) -> np.ndarray:
+    """
+    Turns an image into a binary image depending on whether the colors are in [lower_mask, upper_mask].
+    :param img: The image to convert.
     :param lower_mask: The lower HSV mask to use.
     :param upper_mask: The upper HSV mask to use.
-    :param scale: The amount to scale the images by. Lower values will be faster, but less accurate.
+    :param is_hsv: Whether the image is already in HSV format (skips the color conversion).
+    :return: The binary image (0 or 255 for each pixel).
+    """
+    if not is_hsv:
+        img = cv.cvtColor(img, cv.COLOR_BGR2HSV)
+    return cv.inRange(img, lower_mask, upper_mask)
+
+
+# Binary templates made of more rectangles than this are matched with cv.matchTemplate instead
+MAX_TEMPLATE_RECTS = 64
+
+
+def decompose_mask(mask: np.ndarray) -> List[Tuple[int, int, int, int]]:
+    """
+    Splits the nonzero pixels of a binary mask into rectangles that don't overlap. Health bar outlines are mostly long
+    lines, so they only need a few rectangles.
+    :param mask: The binary mask.
+    :return: The rectangles (x1, y1, x2, y2), where x2 and y2 are exclusive, sorted by biggest area first.
+    """
+    on = mask > 0
+    used = np.zeros_like(on)
+    h, w = on.shape
+    rects = []
+    for y, x in zip(*np.nonzero(on)):
+        if used[y, x]:
+            continue
+        # Extend right as far as possible, then down while the whole row is still free
+        x2 = x + 1
+        while x2 < w and on[y, x2] and not used[y, x2]:
+            x2 += 1
+        y2 = y + 1
+        while y2 < h and on[y2, x:x2].all() and not used[y2, x:x2].any():
+            y2 += 1
+        used[y:y2, x:x2] = True
+        rects.append((int(x), int(y), int(x2), int(y2)))
+    return sorted(rects, key=lambda r: (r[2] - r[0]) * (r[3] - r[1]), reverse=True)
+
+
+class BinaryTemplate:
+    """
+    A binary template split into rectangles (see decompose_mask), so that it can be matched with box sums.
+    """
+
+    def __init__(self, template_mask: np.ndarray, max_full_rects=4):
+        """
+        :param template_mask: The binary template (0 or 255 for each pixel).
+        :param max_full_rects: The max number of rectangles to sum at every position (see binary_match_scores).
+        """
+        self.mask = template_mask
+        self.shape: Tuple[int, int] = template_mask.shape[:2]
+        self.rects = decompose_mask(template_mask)
+        self.area = sum((x2 - x1) * (y2 - y1) for x1, y1, x2, y2 in self.rects)
+        # The biggest rectangles (covering at least half of the template) are used to rule out most positions
+        self.full_rects = 0
+        covered = 0
+        while self.full_rects < min(max_full_rects, len(self.rects)) and covered * 2 < self.area:
+            x1, y1, x2, y2 = self.rects[self.full_rects]
+            covered += (x2 - x1) * (y2 - y1)
+            self.full_rects += 1
+
+
+# Binary templates by template contents
+binary_template_cache: Dict[Tuple, BinaryTemplate] = {}
+
+
+def get_binary_template(template_mask: np.ndarray) -> BinaryTemplate:
+    """
+    Gets the (cached) decomposition of a binary template.
+    """
+    key = (template_mask.shape, template_mask.tobytes())
+    if key not in binary_template_cache:
+        binary_template_cache[key] = BinaryTemplate(template_mask)
+    return binary_template_cache[key]
+
+
+def _binary_match_points(img_mask: np.ndarray, template: BinaryTemplate,
+                         threshold: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Finds the positions where the binary template scores at least the threshold (see binary_match_scores).
+    :return: The y and x coordinates of the positions (in scan order), and their scores.
+    """
+    th, tw = template.shape
+    rh, rw = img_mask.shape[0] - th + 1, img_mask.shape[1] - tw + 1
+
+    def box_sums(x1: int, y1: int, x2: int, y2: int) -> np.ndarray:
+        # Sum of the image under the rectangle, at every template position (each on pixel adds 255, which is exact in
+        # float32 for any template smaller than 256x256)
+        sums = cv.boxFilter(img_mask, cv.CV_32F, (x2 - x1, y2 - y1), anchor=(0, 0), normalize=False,
+                            borderType=cv.BORDER_CONSTANT)
+        return sums[y1:y1 + rh, x1:x1 + rw]
+
+    # Every sum is 255x the pixel count, so hits >= threshold * sqrt(window * area) becomes
+    # hits >= sqrt(min_window * window), where min_window = threshold^2 * area * 255
+    min_window = threshold * threshold * template.area * 255
+    slack = np.float32(min_window * 0.9999)
+    window = box_sums(0, 0, tw, th)
+    possible = window >= slack
+    checked = 0
+    unchecked = template.area
+    if np.count_nonzero(possible) > possible.size // 32:
+        # Too many positions have enough pixels on, so rule out more of them with the biggest rectangles, summed
+        # everywhere at once (compared in float32 with some slack, since the remaining positions are scored exactly)
+        hits = box_sums(*template.rects[0])
+        for rect in template.rects[1:template.full_rects]:
+            hits += box_sums(*rect)
+        for x1, y1, x2, y2 in template.rects[:template.full_rects]:
+            unchecked -= (x2 - x1) * (y2 - y1)
+        checked = template.full_rects
+        possible &= hits + np.float32(unchecked * 255) >= np.sqrt(window * slack)
+    ys, xs = np.nonzero(possible)
+
+    # Check the other rectangles one at a time, only at positions that can still reach the threshold
+    integral = cv.integral(img_mask, sdepth=cv.CV_32S)
+    window = window[ys, xs].astype(np.float64)
+    hits = hits[ys, xs].astype(np.int64) if checked else np.zeros(len(ys), np.int64)
+    needed = np.sqrt(window * min_window)
+    for x1, y1, x2, y2 in template.rects[checked:]:
+        hits += integral[ys + y2, xs + x2] - integral[ys + y1, xs + x2] - integral[ys + y2, xs + x1] + \
+            integral[ys + y1, xs + x1]
+        unchecked -= (x2 - x1) * (y2 - y1)
+        keep = hits + unchecked * 255 >= needed
+        ys, xs, window, hits, needed = ys[keep], xs[keep], window[keep], hits[keep], needed[keep]
+    scores = (hits / np.sqrt(window * (template.area * 255))).astype(np.float32)
+    keep = scores >= threshold
+    return ys[keep], xs[keep], scores[keep]
+
+
+def binary_match_scores(img_mask: np.ndarray, template: Union[np.ndarray, BinaryTemplate],
+                        threshold=0.75) -> np.ndarray:
+    """
+    Computes the same scores as cv.matchTemplate(img_mask, template_mask, cv.TM_CCORR_NORMED) (up to float rounding),
+    but only where they are at least the threshold. Everywhere else is 0.
+    For binary masks, the score is hits / sqrt(window * area), where hits is the number of image pixels that are on
+    under the template's on pixels, window is the number of image pixels that are on under the whole template, and area
+    is the number of on pixels in the template. These are all sums over rectangles, so no correlation is needed.
+    Since hits <= min(window, area), a position can only reach the threshold if window >= threshold^2 * area, and if the
+    hits found so far (plus the template pixels that weren't checked yet) are enough. The biggest rectangles are summed
+    everywhere to rule out most positions, then the rest are only summed where the threshold can still be reached.
+    :param img_mask: The binary image to search in (0 or 255 for each pixel).
+    :param template: The binary template to search for, or its decomposition (see BinaryTemplate).
+    :param threshold: The lowest score to compute. Must be above 0.
+    :return: The scores, with the same shape as cv.matchTemplate's output.
+    """
+    template = template if isinstance(template, BinaryTemplate) else get_binary_template(template)
+    res = np.zeros((img_mask.shape[0] - template.shape[0] + 1, img_mask.shape[1] - template.shape[1] + 1), np.float32)
+    if template.area > 0:
+        ys, xs, scores = _binary_match_points(img_mask, template, threshold)
+        res[ys, xs] = scores
+    return res
+
+
+def find_binary_peaks(img_mask: np.ndarray, template: Union[np.ndarray, BinaryTemplate], threshold=0.75,
+                      max_matches=MAX_MATCHES, local_max=False) -> np.ndarray:
+    """
+    Like find_exact_peaks (without scaling), but for binary masks, using binary_match_scores instead of
+    cv.matchTemplate. Only the points above the threshold are ever scored or compared to their neighbors.
+    :param img_mask: The binary image to search in (0 or 255 for each pixel).
+    :param template: The binary template to search for, or its decomposition (see BinaryTemplate).
+    :param threshold: The threshold needed to count as a match. Must be above 0.
+    :param max_matches: The max number of matches to return. The ones with the highest scores are kept.
+    :param local_max: Whether to only keep points that have the highest score in their 3x3 neighborhood.
+    :return: A structured array of matches (see MATCH_DTYPE), sorted by highest score first.
+    """
+    template = template if isinstance(template, BinaryTemplate) else get_binary_template(template)
+    th, tw = template.shape
+    if th > img_mask.shape[0] or tw > img_mask.shape[1] or template.area == 0:
+        return np.empty(0, dtype=MATCH_DTYPE)
+    ys, xs, scores = _binary_match_points(img_mask, template, threshold)
+    if local_max:
+        # Points below the threshold can't beat a point above it, so they're left at 0 (padded for the edges)
+        res = np.zeros((img_mask.shape[0] - th + 3, img_mask.shape[1] - tw + 3), np.float32)
+        res[ys + 1, xs + 1] = scores
+        is_peak = np.ones(len(scores), bool)
+        for dy in range(3):
+            for dx in range(3):
+                is_peak &= scores >= res[ys + dy, xs + dx]
+        ys, xs, scores = ys[is_peak], xs[is_peak], scores[is_peak]
+    return _peaks_from_points(ys, xs, scores, template.shape, max_matches)
+
+
+def find_mask_matches(img_mask: np.ndarray, template_mask: np.ndarray, scale=1, threshold=0.75,
+                      local_max=False, binary=True) -> List[Match]:
+    """
+    Finds the locations where a binary template is present on a binary image, without scaling or rotation.
+    Use this instead of find_outline_matches when the masks are already computed (ex: shared between detectors).
+    :param img_mask: The binary image to search in.
+    :param template_mask: The binary template to search for.
+    :param scale: The amount to scale the masks by. Lower values will be faster, but less accurate.
     :param threshold: The threshold needed to count as a match. Lower values allow for more lenient matches.
+    :param local_max: Whether to only keep points that have the highest score in their 3x3 neighborhood.
+    :param binary: Whether to use the binary matcher (see binary_match_scores) when possible. Scores are the same as
+    with cv.matchTemplate, up to float rounding.
     :return: A list of matches, sorted by highest score first.
     """
 
     # Can the image have a match?
-    if template.shape[0] > img.shape[0] or template.shape[1] > img.shape[1]:
+    if template_mask.shape[0] > img_mask.shape[0] or template_mask.shape[1] > img_mask.shape[1]:
         return []
 
-    # Downscale images for efficiency
-    if scale != 1:
-        img = scale_image(img, scale)
-        template = scale_image(template, scale)
-
-    # Generate binary images
-    img = cv.cvtColor(img, cv.COLOR_BGR2HSV)
-    img_mask = cv.inRange(img, lower_mask, upper_mask)
-    template = cv.cvtColor(template, cv.COLOR_BGR2HSV)
-    template_mask = cv.inRange(template, lower_mask, upper_mask)
-
     # Display images for debugging purposes
     '''
     # Combine images
@@ -135,8 +402,127 @@ def find_outline_matches(img: np.ndarray, template: np.ndarray, lower_mask: np.n
     cv.waitKey(0)
     '''
 
+    # Binary masks can be matched with box sums, unless downscaling made them not binary
+    if binary and scale == 1 and threshold > 0:
+        template = get_binary_template(template_mask)
+        if len(template.rects) <= MAX_TEMPLATE_RECTS:
+            return matches_from_peaks(find_binary_peaks(img_mask, template, threshold, local_max=local_max))
+
+    # Find exact matches (this also handles downscaling)
+    return find_exact_matches(img_mask, template_mask, scale=scale, threshold=threshold, local_max=local_max)
+
+
+def find_mask_matches_in_regions(img_mask: np.ndarray, template_mask: np.ndarray,
+                                 regions: List[Tuple[int, int, int, int]], scale=1, threshold=0.75,
+                                 local_max=False) -> List[Match]:
+    """
+    Like find_mask_matches, but only searches for matches whose top-left corner is inside one of the given regions.
+    Scores are the same as in a full search (up to float rounding), so this returns a subset of what find_mask_matches
+    would.
+    :param img_mask: The binary image to search in.
+    :param template_mask: The binary template to search for.
+    :param regions: The regions (x1, y1, x2, y2) to search, where x2 and y2 are exclusive.
+    :param scale: The amount to scale the masks by. Lower values will be faster, but less accurate.
+    :param threshold: The threshold needed to count as a match. Lower values allow for more lenient matches.
+    :param local_max: Whether to only keep points that have the highest score in their 3x3 neighborhood.
+    :return: A list of matches, sorted by highest score first.
+    """
+    th, tw = template_mask.shape[:2]
+    h, w = img_mask.shape[:2]
+    found = {}
+    for x1, y1, x2, y2 in regions:
+        # Search one extra position on each side, so local maxima on the edges are the same as in a full search
+        cx1 = max(int(x1) - 1, 0)
+        cy1 = max(int(y1) - 1, 0)
+        cx2 = min(int(x2) + 1, w - tw + 1)
+        cy2 = min(int(y2) + 1, h - th + 1)
+        if cx2 <= cx1 or cy2 <= cy1:
+            continue
+        crop = img_mask[cy1:cy2 + th - 1, cx1:cx2 + tw - 1]
+        for m in find_mask_matches(crop, template_mask, scale, threshold, local_max):
+            m.x1 += cx1
+            m.x2 += cx1
+            m.y1 += cy1
+            m.y2 += cy1
+            if x1 <= m.x1 < x2 and y1 <= m.y1 < y2:
+                found[(m.x1, m.y1)] = m
+    # Same order as a full search (highest score first, then scan order)
+    return sorted(found.values(), key=lambda m: (-m.score, m.y1, m.x1))
+
+
+def find_mask_matches_refined(img_mask: np.ndarray, template_mask: np.ndarray, scale=0.5, threshold=0.75,
+                              local_max=False, coarse_threshold: Optional[float] = None) -> List[Match]:
+    """
+    Like find_mask_matches, but finds candidates on downscaled masks first, then only matches at full resolution
+    around the candidates. Scores are the same as in a full resolution search (up to float rounding), so thin edges
+    aren't lost like when matching on downscaled masks only.
+    :param img_mask: The binary image to search in.
+    :param template_mask: The binary template to search for.
+    :param scale: The amount to scale the masks by when looking for candidates.
+    :param threshold: The threshold needed to count as a match. Lower values allow for more lenient matches.
+    :param local_max: Whether to only keep points that have the highest score in their 3x3 neighborhood.
+    :param coarse_threshold: The threshold needed to count as a candidate. Defaults to a bit below the threshold,
+    since downscaling blurs the edges and lowers the scores.
+    :return: A list of matches, sorted by highest score first.
+    """
+    if coarse_threshold is None:
+        coarse_threshold = threshold - 0.15
+    small_img = scale_image(img_mask, scale) if scale != 1 else img_mask
+    small_template = scale_image(template_mask, scale) if scale != 1 else template_mask
+    if scale == 1 or min(small_template.shape[:2]) < 2 or small_template.shape[0] > small_img.shape[0] or \
+            small_template.shape[1] > small_img.shape[1]:
+        return find_mask_matches(img_mask, template_mask, 1, threshold, local_max)
+    res = cv.matchTemplate(small_img, small_template, cv.TM_CCORR_NORMED)
+    # Group nearby candidates into regions, so each region only needs one full resolution search
+    candidates = cv.dilate((res >= coarse_threshold).astype(np.uint8), np.ones((3, 3), np.uint8))
+    n, _, stats, _ = cv.connectedComponentsWithStats(candidates, connectivity=8)
+    # Each candidate could be any of the full resolution positions that were merged into it
+    radius = math.ceil(1 / scale)
+    regions = [(math.floor(x / scale) - radius, math.floor(y / scale) - radius, math.ceil((x + w) / scale) + radius,
+                math.ceil((y + h) / scale) + radius) for x, y, w, h, _ in stats[1:n].tolist()]
+    # If most of the image is a candidate, a full search is faster
+    area = sum((x2 - x1) * (y2 - y1) for x1, y1, x2, y2 in regions)
+    if area > 0.5 * (img_mask.shape[0] - template_mask.shape[0] + 1) * (img_mask.shape[1] - template_mask.shape[1] + 1):
+        return find_mask_matches(img_mask, template_mask, 1, threshold, local_max)
+    return find_mask_matches_in_regions(img_mask, template_mask, regions, threshold=threshold, local_max=local_max)
+
+
+def find_outline_matches(img: np.ndarray, template: np.ndarray, lower_mask: np.ndarray, upper_mask: np.ndarray,
+                         scale=1, threshold=0.75, refine=True) -> List[Match]:
+    """
+    Finds the locations where a given template's outline is present on the image, without scaling or rotation.
+    This turns the images into binary images depending on whether the colors are in [lower_mask, upper_mask], then looks
+    for template matches in the binary images.
+    :param img: The image to search in.
+    :param template: The template to search for.
+    :param lower_mask: The lower HSV mask to use.
+    :param upper_mask: The upper HSV mask to use.
+    :param scale: The amount to scale the images by. Lower values will be faster, but less accurate.
+    :param threshold: The threshold needed to count as a match. Lower values allow for more lenient matches.
+    :param refine: Whether to only look for candidates at the lower scale, then confirm them at full resolution (see
+    find_mask_matches_refined). This is as accurate as scale=1, since thin edges aren't lost.
+    :return: A list of matches, sorted by highest score first.
+    """
+
+    # Can the image have a match?
+    if template.shape[0] > img.shape[0] or template.shape[1] > img.shape[1]:
+        return []
+
+    if refine and scale != 1:
+        return find_mask_matches_refined(get_outline_mask(img, lower_mask, upper_mask),
+                                         get_outline_mask(template, lower_mask, upper_mask), scale, threshold)
+
+    # Downscale images for efficiency
+    if scale != 1:
+        img = scale_image(img, scale)
+        template = scale_image(template, scale)
+
+    # Generate binary images
+    img_mask = get_outline_mask(img, lower_mask, upper_mask)
+    template_mask = get_outline_mask(template, lower_mask, upper_mask)
+
     # Find exact matches
-    matches = find_exact_matches(img_mask, template_mask, threshold=threshold)
+    matches = find_mask_matches(img_mask, template_mask, threshold=threshold)
 
     # Upscale coordinates
     if scale != 1:
@@ -148,36 +534,165 @@ def find_outline_matches(img: np.ndarray, template: np.ndarray, lower_mask: np.n
     return matches
 
 
-def find_exact_scaled_matches(img: np.ndarray, template: np.ndarray, scale=1, threshold=0.75) -> List[Match]:
+def read_bars(hsv: np.ndarray, x1: np.ndarray, y: np.ndarray, width: Union[int, np.ndarray],
+              colors: List[Tuple[np.ndarray, np.ndarray]], start=0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Reads many horizontal bars (ex: health bars) at once, by finding the rightmost pixel in each bar that matches one
+    of the given colors. Pixels x1 + start to x1 + width (inclusive) are checked on each bar's row.
+    :param hsv: The image to read from, in HSV format.
+    :param x1: The left x coordinate of each bar.
+    :param y: The y coordinate (row) of each bar.
+    :param width: The width of the bars, either shared or one per bar.
+    :param colors: The (lower, upper) HSV bounds of each color. If a pixel matches multiple colors, the first one wins.
+    :param start: The first pixel (relative to x1) to check.
+    :return: The fill of each bar (rightmost matching pixel / width, or 0 if none match), and the index of the color
+    at that pixel (or -1 if none match).
+    """
+    x1 = np.asarray(x1, dtype=int)
+    y = np.asarray(y, dtype=int)
+    widths = np.broadcast_to(np.round(width).astype(int), x1.shape)
+    fill = np.zeros(len(x1))
+    kinds = np.full(len(x1), -1)
+    # Bars of the same width can be sliced out together
+    for w in np.unique(widths):
+        bars = np.flatnonzero(widths == w)
+        offsets = np.arange(start, w + 1)
+        if len(offsets) == 0:
+            continue
+        xs = np.clip(x1[bars, None] + offsets, 0, hsv.shape[1] - 1)
+        ys = np.clip(y[bars, None], 0, hsv.shape[0] - 1)
+        pixels = hsv[ys, xs]
+        # Which pixels match each color, with shape (colors, bars, pixels)
+        matches = np.stack([np.all((lower <= pixels) & (pixels <= upper), axis=2) for lower, upper in colors])
+        any_match = matches.any(axis=0)
+        found = any_match.any(axis=1)
+        rightmost = any_match.shape[1] - 1 - np.argmax(any_match[:, ::-1], axis=1)
+        kind = np.argmax(matches[:, np.arange(len(bars)), rightmost], axis=0)
+        fill[bars] = np.where(found, (rightmost + start) / max(w, 1), 0)
+        kinds[bars] = np.where(found, kind, -1)
+    return fill, kinds
+
+
+# Scales (relative to 1920x1080) of the resolutions that League supports
+LEAGUE_SCALES = [2560/1920, 1920/1920, 1600/1920, 1280/1920, 1024/1920]
+
+
+class TemplatePyramid:
+    """
+    A template precomputed at every supported game resolution (and optionally its outline mask), so that
+    find_exact_scaled_matches doesn't need to rescale it on every call.
+    After the first match, the pyramid locks onto the scale it was found at, since the game resolution rarely changes.
+    Call unlock() if it does.
+    """
+
+    def __init__(self, template: np.ndarray, scales: List[float] = None, lower: np.ndarray = None,
+                 upper: np.ndarray = None):
+        """
+        :param template: The template, at 1920x1080.
+        :param scales: The scales to search at. Defaults to all supported League resolutions.
+        :param lower: Lower HSV bound of the template's outline. If given, matching is done on outline masks.
+        :param upper: Upper HSV bound of the template's outline.
+        """
+        self.template = template
+        self.scales = list(scales) if scales is not None else list(LEAGUE_SCALES)
+        self.lower = lower
+        self.upper = upper
+        self.locked_scale: Optional[float] = None
+        # (scale, downscale) -> template / outline mask
+        self.templates: Dict[Tuple[float, float], np.ndarray] = {}
+        self.masks: Dict[Tuple[float, float], np.ndarray] = {}
+        for s in self.scales:
+            self.get_template(s)
+
+    def uses_masks(self) -> bool:
+        return self.lower is not None
+
+    def get_template(self, s: float, downscale=1) -> np.ndarray:
+        """
+        Gets the template to use at the given scale. Scales above 1 downscale the image instead of upscaling the
+        template, so they all use the unscaled template.
+        :param s: The game resolution scale.
+        :param downscale: The extra amount that everything is scaled by (for speed).
+        :return: The scaled template, or its outline mask if the pyramid uses masks.
+        """
+        key = (min(s, 1), downscale)
+        if key not in self.templates:
+            # Resized in the same steps as an uncached search, so the matches are exactly the same
+            template = scale_image(self.template, downscale) if downscale != 1 else self.template
+            self.templates[key] = scale_image(template, s) if s <= 1 else template
+            if self.uses_masks():
+                self.masks[key] = get_outline_mask(self.templates[key], self.lower, self.upper)
+        return self.masks[key] if self.uses_masks() else self.templates[key]
+
+    def get_scales(self) -> List[float]:
+        """
+        :return: The scales to search at (only the locked one, if any).
+        """
+        return [self.locked_scale] if self.locked_scale is not None else self.scales
+
+    def lock(self, s: float) -> None:
+        if self.locked_scale is None:
+            logger.debug(f"Locked template scale to {s:.3f}")
+        self.locked_scale = s
+
+    def unlock(self) -> None:
+        self.locked_scale = None
+
+
+# Pyramids for templates passed directly to find_exact_scaled_matches, by template contents
+pyramid_cache: Dict[Tuple, TemplatePyramid] = {}
+
+
+def get_template_pyramid(template: np.ndarray) -> TemplatePyramid:
+    """
+    Gets the (cached) pyramid for a template.
+    """
+    key = (template.shape, template.tobytes())
+    if key not in pyramid_cache:
+        pyramid_cache[key] = TemplatePyramid(template)
+    return pyramid_cache[key]
+
+
+def unlock_template_pyramids() -> None:
+    """
+    Unlocks every cached pyramid (ex: when the game resolution changes).
+    """
+    for pyramid in pyramid_cache.values():
+        pyramid.unlock()
+
+
+def find_exact_scaled_matches(img: np.ndarray, template: Union[np.ndarray, TemplatePyramid], scale=1,
+                              threshold=0.75) -> List[Match]:
     """
     Finds the locations where a given template is present on the image, with scaling but without rotation.
     :param img: The image to search in.
-    :param template: The template to search for.
+    :param template: The template to search for, or its pyramid (see TemplatePyramid).
     :param scale: The amount to scale the images by. Lower values will be faster, but less accurate.
     :param threshold: The threshold needed to count as a match. Lower values allow for more lenient matches.
     :return: A list of matches.
     """
+    pyramid = template if isinstance(template, TemplatePyramid) else get_template_pyramid(template)
 
     # Downscale images for efficiency
     if scale != 1:
         img = scale_image(img, scale)
-        template = scale_image(template, scale)
+    if pyramid.uses_masks():
+        img = get_outline_mask(img, pyramid.lower, pyramid.upper)
 
-    # Try a bunch of different scales, and return the best one
+    # Try each scale (or only the locked one), and return the best one
     # Scales are relative to known League resolutions
-    scales = [2560/1920, 1920/1920, 1600/1920, 1280/1920, 1024/1920]
     all_matches = []
     scores = []
-    for s in scales:
+    scales = []
+    for s in pyramid.get_scales():
         # s = Amount to scale the template by to find the image
         matches: List[Match]
         if s <= 1:
-            new_template = scale_image(template, s)
-            matches = find_exact_matches(img, new_template, threshold=threshold)
+            matches = find_exact_matches(img, pyramid.get_template(s, scale), threshold=threshold)
         else:
             # Downscale image instead of upscaling template for efficiency
             new_img = scale_image(img, 1/s)
-            matches = find_exact_matches(new_img, template, threshold=threshold)
+            matches = find_exact_matches(new_img, pyramid.get_template(s, scale), threshold=threshold)
             for m in matches:
                 m.x1 *= s
                 m.x2 *= s
@@ -187,11 +702,14 @@ def find_exact_scaled_matches(img: np.ndarray, template: np.ndarray, scale=1, th
         if len(matches) > 0:
             all_matches.append(matches)
             scores.append(max(m.score for m in matches))
+            scales.append(s)
 
     # Get and return best matches
     matches = []
     if all_matches:
-        matches = all_matches[np.argmax(scores)]
+        best = int(np.argmax(scores))
+        matches = all_matches[best]
+        pyramid.lock(scales[best])
     # Upscale coordinates
     if scale != 1:
         for m in matches:
@@ -1,40 +1,225 @@
 """
 Contains helper functions for taking screenshots of various portions of the screen.
+Screenshots are converted straight from mss's raw BGRA data (without copying it first) into preallocated buffers, so
+capturing doesn't allocate any new arrays once the buffers exist (screenshots taken without an output array go into a
+small ring of reused buffers). Named regions (ex: the minimap and gold count) can be registered, and grabbed together in
+a single call.
 """
 
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
 import cv2 as cv
 import numpy as np
-from mss import mss, screenshot
+from mss import mss
 
 from misc import color_logging
 
 logger = color_logging.getLogger('vision', level=color_logging.INFO)
-sct = mss()
-scr: screenshot.ScreenShot
-screen_res = (sct.monitors[0]['width'], sct.monitors[0]['height'])
+# mss instances can't be shared between threads, so each thread gets its own (along with its own buffers)
+local = threading.local()
+screen_res: Optional[Tuple[int, int]] = None
+# Named regions (x1, y1, x2, y2), relative to the origin given to grab_regions
+regions: Dict[str, Tuple[int, int, int, int]] = {}
+# Screenshots taken without an output array are written into this many reused buffers in turn (shared by all threads,
+# since screenshots are usually taken by one thread and looked at by another)
+CAPTURE_SLOTS = 4
+capture_buffers: Dict[Tuple[int, ...], List[np.ndarray]] = {}
+capture_slot = 0
+capture_lock = threading.Lock()
+
+
+def get_sct():
+    """
+    :return: This thread's mss instance (created on first use).
+    """
+    sct = getattr(local, "sct", None)
+    if sct is None:
+        sct = local.sct = mss()
+    return sct
+
+
+def get_buffer(name: str, shape: Tuple[int, ...]) -> np.ndarray:
+    """
+    Gets a reusable array of the given shape for this thread. It's overwritten the next time it's requested!
+    :param name: What the buffer is used for (buffers with different names or shapes never overlap).
+    :param shape: The array's shape.
+    :return: The array (uint8, with uninitialized values if it was just created).
+    """
+    buffers = getattr(local, "buffers", None)
+    if buffers is None:
+        buffers = local.buffers = {}
+    buffer = buffers.get((name, shape))
+    if buffer is None:
+        buffer = buffers[(name, shape)] = np.empty(shape, dtype=np.uint8)
+        logger.debug(f"Allocated capture buffer {name} with shape {shape}")
+    return buffer
+
+
+def next_capture_buffer(shape: Tuple[int, ...]) -> np.ndarray:
+    """
+    Claims the next reused screenshot buffer, for screenshots taken without an output array.
+    It's overwritten once CAPTURE_SLOTS more screenshots have been taken (copy it to keep it around)!
+    :param shape: The screenshot's shape.
+    :return: The array (uint8, with the values of an older screenshot, or uninitialized).
+    """
+    global capture_slot
+    with capture_lock:
+        slot = capture_slot
+        capture_slot = (capture_slot + 1) % CAPTURE_SLOTS
+        buffers = capture_buffers.get(shape)
+        if buffers is None:
+            buffers = capture_buffers[shape] = [np.empty(shape, dtype=np.uint8) for _ in range(CAPTURE_SLOTS)]
+            logger.debug(f"Allocated {CAPTURE_SLOTS} screenshot buffers with shape {shape}")
+    return buffers[slot]
+
+
+def is_capture_buffer(img: np.ndarray) -> bool:
+    """
+    :return: Whether the image is (part of) one of the reused screenshot buffers, so it will be overwritten.
+    """
+    with capture_lock:
+        return any(np.may_share_memory(img, buffer) for buffers in capture_buffers.values() for buffer in buffers)
+
+
+def grab_bgra(x1: int, y1: int, x2: int, y2: int) -> np.ndarray:
+    """
+    Grabs a portion of the screen.
+    :return: A view of the raw BGRA data (not copied, so it's only valid until the next grab).
+    """
+    sct_img = get_sct().grab({'top': y1, 'left': x1, 'width': x2 - x1, 'height': y2 - y1})
+    return np.frombuffer(sct_img.raw, dtype=np.uint8).reshape(sct_img.height, sct_img.width, 4)
 
 
-def take_screenshot(x1=0, y1=0, x2=screen_res[0], y2=screen_res[1], scale=1.0) -> np.ndarray:
+def take_screenshot(x1=0, y1=0, x2: Optional[int] = None, y2: Optional[int] = None, scale=1.0,
+                    out: Optional[np.ndarray] = None) -> np.ndarray:
     """
     Takes a screenshot of a given portion of the screen (defaults to entire screen).
     :param x1: Top left x coordinate.
     :param y1: Top left y coordinate.
-    :param x2: Bottom right x coordinate.
-    :param y2: Bottom right y coordinate.
+    :param x2: Bottom right x coordinate (defaults to the screen width).
+    :param y2: Bottom right y coordinate (defaults to the screen height).
     :param scale: Amount to scale the returned image by (<1 = smaller, >1 = larger).
-    :return: The requested OpenCV image, in BGR format.
+    :param out: Optional array to write the screenshot into (ex: a frame buffer slot). Must have the output's shape.
+    :return: The requested OpenCV image, in BGR format. Unless out is given, it's one of the reused screenshot buffers,
+    so it's only valid until CAPTURE_SLOTS more screenshots have been taken (see next_capture_buffer).
     """
-    sct_img = sct.grab({'top': y1, 'left': x1, 'width': x2-x1, 'height': y2-y1})
-    # noinspection PyTypeChecker
-    scr = np.array(sct_img)[:, :, :3]
-    scr = cv.resize(scr, (int(scr.shape[1] * scale), int(scr.shape[0] * scale)), interpolation=cv.INTER_AREA)
+    if x2 is None or y2 is None:
+        w, h = get_screen_res()
+        x2 = w if x2 is None else x2
+        y2 = h if y2 is None else y2
+    bgra = grab_bgra(x1, y1, x2, y2)
+    if out is None:
+        h, w = bgra.shape[:2]
+        out = next_capture_buffer((h, w, 3) if scale == 1 else (int(h * scale), int(w * scale), 3))
+    if scale == 1:
+        scr = cv.cvtColor(bgra, cv.COLOR_BGRA2BGR, dst=out)
+    else:
+        size = (out.shape[1], out.shape[0])
+        # Convert into a reused buffer, then scale into the output
+        bgr = cv.cvtColor(bgra, cv.COLOR_BGRA2BGR, dst=get_buffer("scale", bgra.shape[:2] + (3,)))
+        scr = cv.resize(bgr, size, dst=out, interpolation=cv.INTER_AREA)
     logger.debug(f"Screenshot ({x1}, {y1}) to ({x2}, {y2})")
     return scr
 
 
+def register_region(name: str, x1: int, y1: int, x2: int, y2: int) -> None:
+    """
+    Registers a named region that can be grabbed with grab_regions (replacing any region with the same name).
+    Coordinates are relative to the origin given to grab_regions (ex: the top left of the game window).
+    """
+    regions[name] = (int(x1), int(y1), int(x2), int(y2))
+
+
+def grab_regions(names: Iterable[str], x=0, y=0, out: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+    """
+    Takes screenshots of the given named regions, all at once. The screen is only grabbed once (covering every
+    region), so this is much faster than taking a screenshot of each region.
+    :param names: The names of the regions (see register_region).
+    :param x: The x coordinate that the regions are relative to.
+    :param y: The y coordinate that the regions are relative to.
+    :param out: See grab_boxes.
+    :return: Each region's image, in BGR format, by name. Unless out is given, these are views of a reused buffer, so
+    they're only valid until the next call to grab_regions in this thread (copy them to keep them around).
+    """
+    return grab_boxes({name: regions[name] for name in names}, x, y, out)
+
+
+def grab_boxes(boxes: Dict[Any, Tuple[int, int, int, int]], x=0, y=0,
+               out: Optional[np.ndarray] = None) -> Dict[Any, np.ndarray]:
+    """
+    Same as grab_regions, but with the regions (x1, y1, x2, y2) given directly.
+    :param out: If given, each region is written into this image at its own position (ex: to only fill in the parts of
+    a frame that will be looked at), instead of into a reused buffer. It should cover every region.
+    """
+    if not boxes:
+        return {}
+    bx1 = min(b[0] for b in boxes.values())
+    by1 = min(b[1] for b in boxes.values())
+    bx2 = max(b[2] for b in boxes.values())
+    by2 = max(b[3] for b in boxes.values())
+    bgra = grab_bgra(x + bx1, y + by1, x + bx2, y + by2)
+    if out is None:
+        bgr = get_buffer("regions", bgra.shape[:2] + (3,))
+    else:
+        bgr = out[by1:by2, bx1:bx2]
+    # Only the regions themselves are converted
+    crops = {}
+    for key, (x1, y1, x2, y2) in boxes.items():
+        crop = bgr[y1 - by1:y2 - by1, x1 - bx1:x2 - bx1]
+        cv.cvtColor(bgra[y1 - by1:y2 - by1, x1 - bx1:x2 - bx1], cv.COLOR_BGRA2BGR, dst=crop)
+        crops[key] = crop
+    logger.debug(f"Screenshot of regions {list(boxes)}")
+    return crops
+
+
+@dataclass(frozen=True)
+class CapturePlan:
+    """
+    What needs to be captured for a frame, so that parts of the screen that won't be looked at aren't grabbed.
+    """
+    # Regions (x1, y1, x2, y2) to capture, relative to the captured window, or None to capture all of it
+    regions: Optional[Tuple[Tuple[int, int, int, int], ...]] = None
+    # Whether health bars (minions, players, objectives) will be searched for, which needs the whole window
+    entities: bool = True
+
+    def covers(self, other: "CapturePlan") -> bool:
+        """
+        :return: Whether a frame captured with this plan has everything that the other plan needs.
+        """
+        if other.entities and not self.entities:
+            return False
+        if self.regions is None:
+            return True
+        if other.regions is None:
+            return False
+        return all(any(a[0] <= b[0] and a[1] <= b[1] and b[2] <= a[2] and b[3] <= a[3] for a in self.regions)
+                   for b in other.regions)
+
+    def copy_frame(self, img: np.ndarray) -> np.ndarray:
+        """
+        Copies the parts of a frame captured with this plan that have something in them.
+        """
+        if self.regions is None:
+            return img.copy()
+        copy = np.empty_like(img)
+        for x1, y1, x2, y2 in self.regions:
+            copy[y1:y2, x1:x2] = img[y1:y2, x1:x2]
+        return copy
+
+
+# Captures the whole window, and finds everything in it
+FULL_CAPTURE = CapturePlan()
+
+
 def get_screen_res() -> (int, int):
     """
     Returns the resolution of the screen.
     :return: The screen resolution as a tuple (x, y).
     """
+    global screen_res
+    if screen_res is None:
+        monitor = get_sct().monitors[0]
+        screen_res = (monitor['width'], monitor['height'])
     return screen_res
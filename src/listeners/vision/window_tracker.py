@@ -1,17 +1,227 @@
 """
 Manages the location of the League of Legends client and game windows.
-TODO: This code is Windows-specific
+Window positions and sizes are cached, so converting coordinates is just a memory read. The cache is refreshed when
+it's older than REFRESH_INTERVAL (which also notices windows being moved or resized), and the full window search runs
+when a window is missing or every SEARCH_INTERVAL. The platform-specific parts are in a WindowBackend (Win32 by
+default, or a headless stand-in where win32gui isn't available).
 """
 
-from typing import Tuple, Optional
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Tuple, Optional
 
 import numpy as np
-import win32gui
-from listeners.vision import screenshot
-
+from listeners.vision import geometry, image_handler, screenshot
+from listeners.vision.frame_buffer import FrameBuffer
+from misc import color_logging
+
+logger = color_logging.getLogger('vision', level=color_logging.DEBUG)
+# How long window positions are cached for, in seconds
+REFRESH_INTERVAL = 0.5
+# How often to search for the windows again (ex: in case the game was restarted), in seconds
+SEARCH_INTERVAL = 5.0
 client = None
 game = None
-screen_res = screenshot.get_screen_res()
+# Game resolution that the HUD regions were registered for (see take_game_regions)
+regions_res = None
+# Where HeadlessBackend assumes the game is, if it isn't told
+DEFAULT_GAME_RES = (1920, 1080)
+
+
+@dataclass(frozen=True)
+class WindowRect:
+    x: int
+    y: int
+    w: int
+    h: int
+
+
+class WindowBackend(ABC):
+    """
+    Finds windows, and reads and changes their positions.
+    """
+
+    @abstractmethod
+    def find_windows(self) -> Tuple[Any, Any]:
+        """
+        :return: The handles of the client and game windows (None for missing windows).
+        """
+
+    @abstractmethod
+    def get_rect(self, hwnd) -> Optional[WindowRect]:
+        """
+        :return: The window's position and size, or None if the window doesn't exist anymore.
+        """
+
+    def get_client_area(self, hwnd) -> Optional[WindowRect]:
+        """
+        :return: The position and size of the part of the window that the game draws in (without the title bar and
+        borders), or None if the window doesn't exist anymore. Defaults to the whole window.
+        """
+        return self.get_rect(hwnd)
+
+    @abstractmethod
+    def move_window(self, hwnd, x: int, y: int, w: int, h: int) -> None:
+        pass
+
+
+class Win32Backend(WindowBackend):
+    """
+    Finds the League windows by their titles, using the Win32 API.
+    """
+
+    def __init__(self):
+        import win32gui
+        self.win32gui = win32gui
+
+    def find_windows(self) -> Tuple[Any, Any]:
+        found = {"client": None, "game": None}
+
+        def callback(hwnd, extra):
+            name = self.win32gui.GetWindowText(hwnd)
+            if name == "League of Legends" and self.win32gui.GetWindowRect(hwnd)[3] > 200:
+                found["client"] = hwnd
+            elif name == "League of Legends (TM) Client":
+                found["game"] = hwnd
+        self.win32gui.EnumWindows(callback, None)
+        return found["client"], found["game"]
+
+    def get_rect(self, hwnd) -> Optional[WindowRect]:
+        if not self.win32gui.IsWindow(hwnd):
+            return None
+        x1, y1, x2, y2 = self.win32gui.GetWindowRect(hwnd)
+        return WindowRect(x1, y1, x2 - x1, y2 - y1)
+
+    def get_client_area(self, hwnd) -> Optional[WindowRect]:
+        if not self.win32gui.IsWindow(hwnd):
+            return None
+        x1, y1, x2, y2 = self.win32gui.GetClientRect(hwnd)
+        x, y = self.win32gui.ClientToScreen(hwnd, (x1, y1))
+        return WindowRect(x, y, x2 - x1, y2 - y1)
+
+    def move_window(self, hwnd, x: int, y: int, w: int, h: int) -> None:
+        self.win32gui.MoveWindow(hwnd, x - 7, y, w, h, True)
+
+
+class HeadlessBackend(WindowBackend):
+    """
+    Pretends that the windows are at fixed positions (ex: a fullscreen game), for platforms without the Win32 API,
+    or for running on recorded frames.
+    """
+
+    def __init__(self, game_rect: Optional[WindowRect] = None, client_rect: Optional[WindowRect] = None):
+        """
+        :param game_rect: Where the game window is. Defaults to DEFAULT_GAME_RES at the top-left of the screen (there
+        might not be a screen to measure).
+        :param client_rect: Where the client window is. Defaults to no client.
+        """
+        self.rects = {"client": client_rect, "game": game_rect or WindowRect(0, 0, *DEFAULT_GAME_RES)}
+
+    def get_rect(self, hwnd) -> Optional[WindowRect]:
+        return self.rects.get(hwnd)
+
+    def find_windows(self) -> Tuple[Any, Any]:
+        return ("client" if self.rects["client"] else None), "game"
+
+    def move_window(self, hwnd, x: int, y: int, w: int, h: int) -> None:
+        self.rects[hwnd] = WindowRect(x, y, w, h)
+
+
+def create_backend() -> WindowBackend:
+    try:
+        return Win32Backend()
+    except ImportError:
+        logger.warning(f"win32gui isn't available, assuming that the game is at "
+                       f"{DEFAULT_GAME_RES[0]}x{DEFAULT_GAME_RES[1]}")
+        return HeadlessBackend()
+
+
+backend: WindowBackend = create_backend()
+# Cached positions of each window (None if it wasn't found), and when they were last read
+rects: Dict[str, Optional[WindowRect]] = {"client": None, "game": None}
+# Cached client areas of each window (see WindowBackend.get_client_area)
+areas: Dict[str, Optional[WindowRect]] = {"client": None, "game": None}
+last_refresh = float('-inf')
+last_search = float('-inf')
+refresh_lock = threading.Lock()
+# Called with (window name, old rect, new rect) whenever a window moves, resizes, appears, or disappears
+listeners: List[Callable[[str, Optional[WindowRect], Optional[WindowRect]], None]] = []
+
+
+def set_backend(new_backend: WindowBackend) -> None:
+    """
+    Switches to a different way of finding windows (ex: HeadlessBackend).
+    """
+    global backend
+    backend = new_backend
+    update_handles()
+
+
+def add_listener(callback: Callable[[str, Optional[WindowRect], Optional[WindowRect]], None]) -> None:
+    """
+    Adds a function to call with (window name, old rect, new rect) whenever the client or game window moves,
+    resizes, appears, or disappears.
+    """
+    listeners.append(callback)
+
+
+def get_rect(name: str) -> Optional[WindowRect]:
+    """
+    :param name: The window ("client" or "game").
+    :return: The window's (cached) position and size, or None if the window isn't open.
+    """
+    if time.time() - last_refresh >= REFRESH_INTERVAL:
+        refresh()
+    return rects[name]
+
+
+def get_client_area(name: str) -> Optional[WindowRect]:
+    """
+    :param name: The window ("client" or "game").
+    :return: The (cached) position and size of the part of the window that the game draws in, or None if the window
+    isn't open.
+    """
+    if time.time() - last_refresh >= REFRESH_INTERVAL:
+        refresh()
+    return areas[name]
+
+
+def refresh(search=False) -> None:
+    """
+    Reads the windows' positions again, and searches for the windows if the game is missing (or if it's been a while).
+    :param search: Whether to always search for the windows.
+    """
+    global client, game, last_refresh, last_search
+    with refresh_lock:
+        now = time.time()
+        if search or game is None or now - last_search >= SEARCH_INTERVAL:
+            client, game = backend.find_windows()
+            last_search = now
+        new_rects = {"client": backend.get_rect(client) if client is not None else None,
+                     "game": backend.get_rect(game) if game is not None else None}
+        changes = [(name, rects[name], rect) for name, rect in new_rects.items() if rect != rects[name]]
+        rects.update(new_rects)
+        areas.update({"client": backend.get_client_area(client) if client is not None else None,
+                      "game": backend.get_client_area(game) if game is not None else None})
+        if rects["game"] is not None and areas["game"] is not None:
+            # Game captures include the title bar and borders, but the HUD is scaled to the client area
+            geometry.set_client_height(rects["game"].h, areas["game"].h)
+        last_refresh = now
+    for name, old, new in changes:
+        logger.debug(f"The {name} window changed from {old} to {new}")
+        for callback in listeners:
+            callback(name, old, new)
+
+
+def on_game_resized(name: str, old: Optional[WindowRect], new: Optional[WindowRect]) -> None:
+    # Templates are locked onto the game resolution, which might be different now
+    if name == "game" and new is not None and (old is None or (old.w, old.h) != (new.w, new.h)):
+        image_handler.unlock_template_pyramids()
+
+
+add_listener(on_game_resized)
 
 
 def get_window_res(hwnd) -> Tuple[int, int]:
@@ -20,8 +230,8 @@ def get_window_res(hwnd) -> Tuple[int, int]:
     :param hwnd: The window handle.
     :return: A tuple (w, h).
     """
-    rect = win32gui.GetWindowRect(hwnd)
-    return rect[2] - rect[0], rect[3] - rect[1]
+    rect = backend.get_rect(hwnd)
+    return rect.w, rect.h
 
 
 def get_window_pos(hwnd) -> Tuple[int, int]:
@@ -30,8 +240,8 @@ def get_window_pos(hwnd) -> Tuple[int, int]:
     :param hwnd: The window handle.
     :return: A tuple for the top-left position (x, y).
     """
-    rect = win32gui.GetWindowRect(hwnd)
-    return rect[0], rect[1]
+    rect = backend.get_rect(hwnd)
+    return rect.x, rect.y
 
 
 def set_window_props(hwnd, x, y, w, h) -> None:
@@ -43,7 +253,7 @@ def set_window_props(hwnd, x, y, w, h) -> None:
     :param w: The window width.
     :param h: The window height.
     """
-    win32gui.MoveWindow(hwnd, x-7, y, w, h, True)
+    backend.move_window(hwnd, x, y, w, h)
 
 
 def get_client_res() -> Tuple[Optional[float], Optional[float]]:
@@ -51,8 +261,8 @@ def get_client_res() -> Tuple[Optional[float], Optional[float]]:
     Returns the resolution of the League of Legends client window.
     :return: A tuple (w, h), or None if the client window is not found.
     """
-    update_handles()
-    return get_window_res(client) if client else (None, None)
+    rect = get_rect("client")
+    return (rect.w, rect.h) if rect else (None, None)
 
 
 def get_game_res() -> Tuple[Optional[float], Optional[float]]:
@@ -60,8 +270,8 @@ def get_game_res() -> Tuple[Optional[float], Optional[float]]:
     Returns the resolution of the League of Legends game window.
     :return: A tuple (w, h), or None if the game window is not found.
     """
-    update_handles()
-    return get_window_res(game) if game else (None, None)
+    rect = get_rect("game")
+    return (rect.w, rect.h) if rect else (None, None)
 
 
 def get_client_pos() -> Tuple[Optional[float], Optional[float]]:
@@ -69,8 +279,8 @@ def get_client_pos() -> Tuple[Optional[float], Optional[float]]:
     Returns the position of the League of Legends client window.
     :return: A tuple for the top-left position (x, y), or None if the client window is not found.
     """
-    update_handles()
-    return get_window_pos(client) if client else (None, None)
+    rect = get_rect("client")
+    return (rect.x, rect.y) if rect else (None, None)
 
 
 def get_game_pos() -> Tuple[Optional[float], Optional[float]]:
@@ -78,8 +288,8 @@ def get_game_pos() -> Tuple[Optional[float], Optional[float]]:
     Returns the position of the League of Legends game window.
     :return: A tuple for the top-left position (x, y), or None if the game window is not found.
     """
-    update_handles()
-    return get_window_pos(game) if game else (None, None)
+    rect = get_rect("game")
+    return (rect.x, rect.y) if rect else (None, None)
 
 
 def offset_client_pos(x: float, y: float) -> Tuple[Optional[float], Optional[float]]:
@@ -89,12 +299,8 @@ def offset_client_pos(x: float, y: float) -> Tuple[Optional[float], Optional[flo
     :param y: The relative y-coordinate.
     :return: A tuple for the absolute position (x, y), or None if the client window is not found.
     """
-    update_handles()
-    if client:
-        pos = get_window_pos(client)
-        return pos[0] + x, pos[1] + y
-    else:
-        return None, None
+    rect = get_rect("client")
+    return (rect.x + x, rect.y + y) if rect else (None, None)
 
 
 def offset_game_pos(x: float, y: float) -> Tuple[Optional[float], Optional[float]]:
@@ -104,12 +310,8 @@ def offset_game_pos(x: float, y: float) -> Tuple[Optional[float], Optional[float
     :param y: The relative y-coordinate.
     :return: A tuple for the absolute position (x, y), or None if the game window is not found.
     """
-    update_handles()
-    if game:
-        pos = get_window_pos(game)
-        return pos[0] + x, pos[1] + y
-    else:
-        return None, None
+    rect = get_rect("game")
+    return (rect.x + x, rect.y + y) if rect else (None, None)
 
 
 def set_client_props(x, y, w, h) -> None:
@@ -120,9 +322,10 @@ def set_client_props(x, y, w, h) -> None:
     :param w: The window width.
     :param h: The window height.
     """
-    update_handles()
+    refresh()
     if client:
         set_window_props(client, x, y, w, h)
+        refresh()
 
 
 def set_game_props(x, y, w, h) -> None:
@@ -133,28 +336,17 @@ def set_game_props(x, y, w, h) -> None:
     :param w: The window width.
     :param h: The window height.
     """
-    update_handles()
+    refresh()
     if game:
         set_window_props(game, x, y, w, h)
+        refresh()
 
 
 def update_handles() -> None:
     """
-    Updates handles for the League of Legends client and game windows.
+    Updates handles for the League of Legends client and game windows (and their cached positions).
     """
-    global client, game
-    client = None
-    game = None
-
-    def callback(hwnd, extra):
-        name = win32gui.GetWindowText(hwnd)
-        if name == "League of Legends" and win32gui.GetWindowRect(hwnd)[3] > 200:
-            global client
-            client = hwnd
-        elif name == "League of Legends (TM) Client":
-            global game
-            game = hwnd
-    win32gui.EnumWindows(callback, None)
+    refresh(search=True)
 
 
 def take_client_screenshot() -> np.ndarray:
@@ -169,13 +361,42 @@ def take_client_screenshot() -> np.ndarray:
     return screenshot.take_screenshot(x, y, x + w, y + h)
 
 
-def take_game_screenshot() -> np.ndarray:
+def take_game_screenshot(frame_buffer: Optional[FrameBuffer] = None,
+                         regions: Optional[Iterable[Tuple[int, int, int, int]]] = None) -> np.ndarray:
     """
     Takes a screenshot of the League of Legends game window.
-    :return: An image of the game.
+    :param frame_buffer: If given, the screenshot is written directly into the next slot of this frame buffer.
+    :param regions: If given, only these regions (x1, y1, x2, y2) of the window are captured (see
+    screenshot.CapturePlan). The rest of the image is left as is, so it shouldn't be looked at!
+    :return: An image of the game. Unless it's in the frame buffer, it's one of the reused screenshot buffers, so it's
+    only valid until a few more screenshots have been taken (see screenshot.next_capture_buffer).
     """
-    x, y = get_game_pos()
-    w, h = get_game_res()
-    if x is None:
+    rect = get_rect("game")
+    if rect is None:
         raise RuntimeWarning("Game isn't open")
-    return screenshot.take_screenshot(x, y, x + w, y + h)
+    x, y, w, h = rect.x, rect.y, rect.w, rect.h
+    out = frame_buffer.next_image(h, w) if frame_buffer is not None and frame_buffer.fits(h, w) else None
+    if regions is None:
+        return screenshot.take_screenshot(x, y, x + w, y + h, out=out)
+    out = out if out is not None else screenshot.next_capture_buffer((h, w, 3))
+    boxes = [(max(x1, 0), max(y1, 0), min(x2, w), min(y2, h)) for x1, y1, x2, y2 in regions]
+    screenshot.grab_boxes({i: box for i, box in enumerate(boxes) if box[0] < box[2] and box[1] < box[3]}, x, y, out)
+    return out
+
+
+def take_game_regions(names: Iterable[str]) -> Dict[str, np.ndarray]:
+    """
+    Takes screenshots of parts of the League of Legends game window, all at once (much faster than a whole screenshot).
+    :param names: The parts to capture (see geometry.get_capture_regions for the HUD regions, ex: "minimap").
+    :return: Each part's image, by name. These are only valid until the next call (see screenshot.grab_regions).
+    """
+    global regions_res
+    rect = get_rect("game")
+    if rect is None:
+        raise RuntimeWarning("Game isn't open")
+    x, y, w, h = rect.x, rect.y, rect.w, rect.h
+    if regions_res != (w, h):
+        for name, region in geometry.get_capture_regions(w, h).items():
+            screenshot.register_region(name, *region)
+        regions_res = (w, h)
+    return screenshot.grab_regions(names, x, y)
@@ -10,29 +10,123 @@ import torch.jit
 torch.jit.script_method = script_method
 torch.jit.script = script
 
+import argparse
 import time
 import traceback
 
 from queue import Queue
+from typing import List, Optional, Tuple
+
+import numpy as np
 
 from ai import manual_ai
-from controllers import game_controller
-from listeners.vision import game_vision, window_tracker
+from controllers import action_script, game_controller
+from listeners.vision import game_vision, screenshot, window_tracker
+from listeners.vision.frame_source import FRAME_SOURCES, FrameSource, LiveSource, SourceExhausted, create_source
 from listeners.keyboard import key_listener
 from misc import color_logging
+from listeners.vision.screenshot import CapturePlan
+from misc.pipeline import Pipeline
 
 logger = color_logging.getLogger('main', level=color_logging.DEBUG)
 q = Queue()
+# Where frames come from (the game window, or recorded footage)
+frame_source: FrameSource = LiveSource()
+
+
+def capture_frame() -> Tuple[np.ndarray, CapturePlan]:
+    """
+    Captures the parts of the game that the AI needs in its current state.
+    """
+    w, h = frame_source.get_res()
+    if w is None:
+        raise RuntimeWarning("Game isn't open")
+    plan = manual_ai.get_capture_plan(w, h)
+    return frame_source.get_frame(game_vision.frame_buffer, plan.regions), plan
+
+
+def analyze_frame(captured: Tuple[np.ndarray, CapturePlan]) -> Tuple[np.ndarray, Tuple[List, List, List], CapturePlan]:
+    img, plan = captured
+    detections = game_vision.find_all(img, scale=manual_ai.VISION_SCALE) if plan.entities else ([], [], [])
+    # Screenshots in the frame buffer (or the reused screenshot buffers) get overwritten by later frames, while the AI
+    # could still be using this one
+    if (game_vision.frame_buffer is not None and game_vision.frame_buffer.find_slot(img) is not None) \
+            or screenshot.is_capture_buffer(img):
+        img = plan.copy_frame(img)
+    return img, detections, plan
+
+
+def make_decision(analyzed: Tuple[np.ndarray, Tuple[List, List, List], CapturePlan]) -> None:
+    img, detections, plan = analyzed
+    manual_ai.process(img, detections, plan)
+
+
+def on_stage_error(stage: str, e: Exception) -> float:
+    """
+    :return: How long the stage should wait before trying again, in seconds.
+    """
+    if isinstance(e, RuntimeWarning):
+        logger.info(f"Waiting for the game to load...")
+        return 10
+    if isinstance(e, SourceExhausted):
+        logger.info(f"Out of frames ({e}), quitting...")
+        q.put("quit")
+        # Wait until the pipeline stops
+        return 60
+    logger.error(f"Unknown error in {stage} stage: {''.join(traceback.format_exception(e))}")
+    return 0.5
+
+
+def start_pipeline() -> Pipeline:
+    """
+    Starts capturing, analyzing, and acting on frames at the same time (see misc.pipeline).
+    """
+    pipeline = Pipeline([("capture", capture_frame), ("vision", analyze_frame), ("decision", make_decision)],
+                        on_error=on_stage_error)
+    pipeline.start()
+    return pipeline
+
+
+def log_throughput(start_time: float, start_count: int) -> None:
+    elapsed = time.time() - start_time
+    frames = frame_source.count - start_count
+    logger.info(f"Processed {frames} frames in {elapsed:.1f}s ({frames / elapsed if elapsed > 0 else 0:.1f} frames/s)")
 
 
-def main():
+def main(pipelined=True, source: Optional[FrameSource] = None, headless=False, engine="process"):
+    """
+    :param pipelined: Whether to capture, analyze, and act on frames at the same time (in separate threads). If False,
+    each frame is fully processed before the next one is captured.
+    :param source: Where to get frames from. Defaults to the game window.
+    :param headless: Whether to run without keyboard controls, debug windows, or controlling the mouse and keyboard.
+    The bot starts right away, and quits once it's turned off (ex: when the game ends) or the frames run out. Useful
+    for measuring how fast the bot runs on recorded footage.
+    :param engine: The vision engine to use (see game_vision.init_vision).
+    """
+    global frame_source
     logger.info("Starting up!")
-    manual_ai.is_debug = True
-    game_vision.init_vision()
-    key_listener.init_listener(q)
-    logger.info("Ready to go! Press Shift-T to toggle the bot.")
+    frame_source = source if source is not None else LiveSource()
+    max_res = None
+    if not isinstance(frame_source, LiveSource):
+        # Recorded footage fills the whole "screen"
+        w, h = frame_source.get_res()
+        window_tracker.set_backend(window_tracker.HeadlessBackend(window_tracker.WindowRect(0, 0, w, h)))
+        max_res = (w, h)
+    manual_ai.is_debug = not headless
+    game_vision.init_vision(track_regions=True, engine=engine, max_res=max_res)
+    if headless:
+        game_controller.dry_run = True
+        # The AI can still toggle and reset the bot through the listener's queue
+        key_listener.queue = q
+        q.put("toggle_bot")
+    else:
+        key_listener.init_listener(q)
+        logger.info("Ready to go! Press Shift-T to toggle the bot.")
     loop_active = True
     bot_active = False
+    pipeline: Optional[Pipeline] = None
+    start_time = time.time()
+    start_count = 0
     while loop_active:
         # Process any events from the queue
         while not q.empty():
@@ -44,8 +138,21 @@ def main():
                 bot_active = not bot_active
                 if bot_active:
                     logger.info("The bot is now enabled.")
+                    start_time = time.time()
+                    start_count = frame_source.count
+                    if pipelined:
+                        pipeline = start_pipeline()
                 else:
                     logger.info("The bot is now disabled.")
+                    if pipeline is not None:
+                        pipeline.stop()
+                        pipeline = None
+                    # Don't keep sending inputs
+                    action_script.cancel()
+                    game_controller.log_stats()
+                    log_throughput(start_time, start_count)
+                    if headless:
+                        loop_active = False
             elif e == "choose_lane":
                 if bot_active:
                     logger.warning("The bot must be disabled to choose a lane!")
@@ -93,27 +200,54 @@ def main():
                     logger.info("Mouse and keyboard control is now enabled.")
             elif e == "reset":
                 logger.info("Resetting the bot...")
+                # The AI can't be running while it's reset
+                if pipeline is not None:
+                    pipeline.stop()
                 manual_ai.reset()
+                if pipeline is not None:
+                    pipeline = start_pipeline()
                 logger.info("Bot reset complete!")
             else:
                 logger.warning(f"Unknown event found in keyboard listener queue: {e}")
-        if bot_active:
+        if bot_active and not pipelined:
             try:
-                manual_ai.process(window_tracker.take_game_screenshot())
+                img, plan = capture_frame()
+                manual_ai.process(img, plan=plan)
             except RuntimeWarning:
                 logger.info(f"Waiting for the game to load...")
                 time.sleep(10)
+            except SourceExhausted as e:
+                logger.info(f"Out of frames ({e}), quitting...")
+                q.put("quit")
             except Exception:
                 logger.error(f"Unknown error: {traceback.format_exc()}")
                 time.sleep(0.5)
         else:
             time.sleep(0.1)
     logger.info("Shutting down...")
+    if pipeline is not None:
+        pipeline.stop()
+    if bot_active:
+        log_throughput(start_time, start_count)
+    frame_source.close()
     game_vision.close()
 
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description="Plays League of Legends.")
+    parser.add_argument("--source", choices=FRAME_SOURCES, default="live",
+                        help="Where to get frames from: the game window, a folder of screenshots, or a video file")
+    parser.add_argument("--path", help="The folder of screenshots or the video file to read frames from")
+    parser.add_argument("--loop", action="store_true", help="Start over when recorded footage runs out")
+    parser.add_argument("--headless", action="store_true",
+                        help="Run without keyboard controls, debug windows, or controlling the mouse and keyboard")
+    parser.add_argument("--engine", choices=game_vision.VISION_ENGINES, default="process",
+                        help="Run the vision detectors in worker processes or threads")
+    parser.add_argument("--sequential", action="store_true",
+                        help="Fully process each frame before capturing the next one")
+    args = parser.parse_args()
+    main(pipelined=not args.sequential, source=create_source(args.source, args.path, args.loop),
+         headless=args.headless, engine=args.engine)
     # import cProfile
     # cProfile.run('main()', sort='time')
     # game_vision.init_vision()
@@ -0,0 +1,74 @@
+"""
+The clock that the AI tells time with. By default, it's the real clock, but it can be replaced with a simulated one
+(see SimulatedClock), so that recorded games can be replayed as fast as possible, with the same timings every time.
+"""
+
+import time
+
+
+class Clock:
+    """
+    Real time.
+    """
+
+    def now(self) -> float:
+        """
+        :return: The current time, in seconds.
+        """
+        return time.time()
+
+    def sleep(self, seconds: float) -> None:
+        time.sleep(max(seconds, 0))
+
+
+class SimulatedClock(Clock):
+    """
+    Time that only passes when something sleeps (or when it's advanced), without actually waiting.
+    """
+
+    def __init__(self, start=0.0):
+        """
+        :param start: The time to start at, in seconds.
+        """
+        self.time = start
+
+    def now(self) -> float:
+        return self.time
+
+    def sleep(self, seconds: float) -> None:
+        self.time += max(seconds, 0)
+
+    def advance(self, seconds: float) -> None:
+        """
+        Lets some time pass (ex: the time between two frames).
+        """
+        self.sleep(seconds)
+
+
+clock: Clock = Clock()
+
+
+def set_clock(new_clock: Clock) -> None:
+    """
+    Replaces the clock that now() and sleep() use.
+    """
+    global clock
+    clock = new_clock
+
+
+def get_clock() -> Clock:
+    return clock
+
+
+def now() -> float:
+    """
+    :return: The current time (on the current clock), in seconds.
+    """
+    return clock.now()
+
+
+def sleep(seconds: float) -> None:
+    """
+    Sleeps for the given number of seconds (on the current clock).
+    """
+    clock.sleep(seconds)
@@ -0,0 +1,212 @@
+"""
+Runs a chain of stages (ex: capture -> vision -> decision) at the same time, each in its own thread.
+Stages are connected by queues that only hold the newest item, so a slow stage never works on a stale frame; items
+that weren't picked up in time are dropped. Throughput is limited by the slowest stage, instead of the sum of all of
+them.
+"""
+
+import threading
+import time
+import traceback
+from dataclasses import dataclass
+from typing import Any, Callable, List, Optional, Tuple
+
+from misc import color_logging
+
+logger = color_logging.getLogger('pipeline', level=color_logging.DEBUG)
+
+
+class QueueClosed(Exception):
+    """
+    Raised when waiting on a queue that was closed (the pipeline is stopping).
+    """
+    pass
+
+
+class LatestQueue:
+    """
+    A queue with a single slot. Putting an item replaces the one that's waiting (if any), so getters always receive
+    the newest item.
+    """
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.item = None
+        self.has_item = False
+        self.closed = False
+        # Number of items that were replaced before anyone got them
+        self.dropped = 0
+
+    def put(self, item: Any) -> None:
+        with self.cond:
+            if self.has_item:
+                self.dropped += 1
+            self.item = item
+            self.has_item = True
+            self.cond.notify_all()
+
+    def get(self) -> Any:
+        """
+        Waits for an item and takes it out of the queue.
+        :raises QueueClosed: If the queue was closed while waiting.
+        """
+        with self.cond:
+            while not self.has_item and not self.closed:
+                self.cond.wait()
+            if self.closed:
+                raise QueueClosed()
+            item = self.item
+            self.item = None
+            self.has_item = False
+            self.cond.notify_all()
+            return item
+
+    def wait_empty(self) -> None:
+        """
+        Waits until the waiting item (if any) has been taken.
+        :raises QueueClosed: If the queue was closed while waiting.
+        """
+        with self.cond:
+            while self.has_item and not self.closed:
+                self.cond.wait()
+            if self.closed:
+                raise QueueClosed()
+
+    def close(self) -> None:
+        """
+        Wakes up everything waiting on the queue. The queue can't be used after this.
+        """
+        with self.cond:
+            self.closed = True
+            self.item = None
+            self.has_item = False
+            self.cond.notify_all()
+
+
+@dataclass
+class StageStats:
+    name: str
+    # Number of items produced, and the time spent producing them (in seconds)
+    count: int
+    busy_time: float
+    # Number of this stage's items that the next stage never got
+    dropped: int
+
+    @property
+    def avg_time(self) -> float:
+        return self.busy_time / self.count if self.count else 0
+
+
+class Stage:
+    """
+    One step of a pipeline, running in its own thread.
+    """
+
+    def __init__(self, name: str, func: Callable, inbox: Optional[LatestQueue], outbox: Optional[LatestQueue],
+                 on_error: Callable[[str, Exception], float], stopping: threading.Event):
+        """
+        :param name: The stage's name (for logging).
+        :param func: Called with the newest item from the inbox (or without arguments, if this is the first stage).
+        Its result is put in the outbox. If it returns None, nothing is passed on.
+        :param inbox: The queue to take items from, or None if this stage produces items itself (ex: capture).
+        :param outbox: The queue to put results into, or None if this is the last stage.
+        :param on_error: Called with the stage name and the exception when func raises one. The item is skipped, and the
+        stage waits for the returned number of seconds before continuing.
+        :param stopping: Set when the pipeline is stopping.
+        """
+        self.name = name
+        self.func = func
+        self.inbox = inbox
+        self.outbox = outbox
+        self.on_error = on_error
+        self.stopping = stopping
+        self.count = 0
+        self.busy_time = 0.0
+        self.thread = threading.Thread(target=self.run, name=f"pipeline-{name}", daemon=True)
+
+    def run(self) -> None:
+        try:
+            while not self.stopping.is_set():
+                if self.inbox is not None:
+                    item = self.inbox.get()
+                elif self.outbox is not None:
+                    # A source doesn't get ahead of the next stage, so its items are as fresh as possible when taken
+                    self.outbox.wait_empty()
+                start_time = time.time()
+                try:
+                    result = self.func(item) if self.inbox is not None else self.func()
+                except Exception as e:
+                    # Waiting is cut short if the pipeline stops
+                    if self.stopping.wait(self.on_error(self.name, e)):
+                        break
+                    continue
+                self.busy_time += time.time() - start_time
+                self.count += 1
+                if self.outbox is not None and result is not None:
+                    self.outbox.put(result)
+        except QueueClosed:
+            pass
+
+    def get_stats(self) -> StageStats:
+        return StageStats(self.name, self.count, self.busy_time, self.outbox.dropped if self.outbox else 0)
+
+
+def log_error(stage: str, e: Exception) -> float:
+    """
+    Default error handler: logs the error, and waits a bit before the stage tries again.
+    :return: How long to wait before trying again, in seconds.
+    """
+    logger.error(f"Error in {stage} stage: {''.join(traceback.format_exception(e))}")
+    return 0.5
+
+
+class Pipeline:
+    """
+    A chain of stages, where each stage gets the newest result of the stage before it.
+    """
+
+    def __init__(self, stages: List[Tuple[str, Callable]], on_error: Callable[[str, Exception], float] = log_error):
+        """
+        :param stages: Pairs of (name, func) for each stage, in order. The first func is called without arguments,
+        and the others are called with the newest result of the stage before them.
+        :param on_error: Called with the stage name and the exception when a stage raises one. Returns how long the
+        stage should wait before trying again, in seconds.
+        """
+        self.stopping = threading.Event()
+        self.queues = [LatestQueue() for _ in range(len(stages) - 1)]
+        self.stages = []
+        for i, (name, func) in enumerate(stages):
+            inbox = self.queues[i - 1] if i > 0 else None
+            outbox = self.queues[i] if i < len(self.queues) else None
+            self.stages.append(Stage(name, func, inbox, outbox, on_error, self.stopping))
+        self.start_time = None
+
+    def start(self) -> None:
+        logger.debug(f"Starting pipeline {' -> '.join(s.name for s in self.stages)}")
+        self.start_time = time.time()
+        for stage in self.stages:
+            stage.thread.start()
+
+    def stop(self, timeout=5) -> None:
+        """
+        Stops every stage once it finishes its current item.
+        :param timeout: How long to wait for each stage to finish, in seconds.
+        """
+        self.stopping.set()
+        for queue in self.queues:
+            queue.close()
+        for stage in self.stages:
+            stage.thread.join(timeout)
+            if stage.thread.is_alive():
+                logger.warning(f"Stage {stage.name} didn't stop within {timeout} seconds")
+        self.log_stats()
+
+    def get_stats(self) -> List[StageStats]:
+        return [stage.get_stats() for stage in self.stages]
+
+    def log_stats(self) -> None:
+        elapsed = time.time() - self.start_time if self.start_time is not None else 0
+        for s in self.get_stats():
+            fps = s.count / elapsed if elapsed > 0 else 0
+            logger.debug(f"Stage {s.name}: {s.count} items ({fps:.1f}/s), {s.avg_time * 1000:.1f}ms each, "
+                         f"{s.dropped} dropped")
@@ -2,10 +2,12 @@
 Utility tool that generates / modifies numbers randomly.
 """
 
-import time
+import random
 
 import numpy as np
 
+from misc import clock
+
 
 def rnum(n: float, s=0.047, a=False) -> float:
     """
@@ -27,5 +29,13 @@ def rsleep(n: float, s=0.047, a=False) -> None:
     :param s: The spread around the duration.
     :param a: Whether the spread should be absolute or relative (default = relative).
     """
-    time.sleep(max(rnum(n, s, a), 0))
-    pass
+    clock.sleep(max(rnum(n, s, a), 0))
+
+
+def seed(n: int) -> None:
+    """
+    Seeds every random number generator that the AI uses, so that its choices can be repeated.
+    :param n: The seed.
+    """
+    random.seed(n)
+    np.random.seed(n)
@@ -0,0 +1,97 @@
+import os
+import subprocess
+import sys
+import tempfile
+
+import cv2 as cv
+import numpy as np
+
+from ai import replay
+from listeners.vision import game_vision, image_handler
+from listeners.vision.frame_source import ImageFolderSource
+from misc import color_logging
+from misc.definitions import ROOT_DIR
+
+logger = color_logging.getLogger('test', level=color_logging.DEBUG)
+
+
+# Modules that need pynput and Windows
+INPUT_CONTROLLERS = ("controllers.mouse.mouse", "controllers.keyboard.keyboard")
+
+
+def test_deterministic(testpath: str, runs=3) -> None:
+    """
+    Replays the same screenshots several times, and checks that the AI does exactly the same thing every time.
+    """
+    results = [replay.replay(ImageFolderSource(testpath)) for _ in range(runs)]
+    digests = [replay.actions_digest(actions) for actions in results]
+    assert len(set(digests)) == 1, f"Replays differ: {digests}"
+    logger.info(f"{runs} replays made the same {len(results[0])} actions (digest {digests[0]})")
+    for action in results[0][:10]:
+        logger.debug(action)
+
+
+def test_no_input_controllers() -> None:
+    """
+    Replays only record inputs, so importing them (and the AI) shouldn't load the input controllers, which need
+    pynput and Windows. Checked in a new interpreter, since other tests may have loaded them already.
+    """
+    check = (f"import sys; from ai import replay; loaded = [m for m in {INPUT_CONTROLLERS} if m in sys.modules]; "
+             f"assert not loaded, f'Loaded {{loaded}}'")
+    result = subprocess.run([sys.executable, "-c", check], cwd=os.path.join(ROOT_DIR, "src"), capture_output=True,
+                            text=True)
+    assert result.returncode == 0, result.stderr
+
+
+def test_deterministic_synthetic(vision, n=10, runs=2) -> None:
+    """
+    Replays plain frames of the player walking past minions, starting in lane, and checks that the AI does something,
+    and does exactly the same thing every time (without touching the input controllers).
+    :param vision: The initialized vision module.
+    """
+    player = image_handler.load_image(os.path.join(ROOT_DIR, "img", "player.png"))
+    minion = image_handler.load_image(os.path.join(ROOT_DIR, "img", "minion.png"))
+    with tempfile.TemporaryDirectory() as folder:
+        for i in range(n):
+            img = np.full((1080, 1920, 3), 40, np.uint8)
+            img[500:500 + player.shape[0], 900 + 5 * i:900 + 5 * i + player.shape[1]] = player
+            for x in (1100 - 10 * i, 1200 - 10 * i):
+                img[450:450 + minion.shape[0], x:x + minion.shape[1]] = minion
+            cv.imwrite(os.path.join(folder, f"{i:03d}.png"), img)
+        loaded = [m for m in INPUT_CONTROLLERS if m in sys.modules]
+        results = [replay.replay(ImageFolderSource(folder), status=("laning", "passive")) for _ in range(runs)]
+        # Replays only record inputs, so running them shouldn't load the input controllers either
+        assert [m for m in INPUT_CONTROLLERS if m in sys.modules] == loaded
+    digests = [replay.actions_digest(actions) for actions in results]
+    assert results[0], "The AI didn't do anything"
+    assert len(set(digests)) == 1, f"Replays differ: {digests}"
+
+
+def test_recall_synthetic(vision, frame_time=0.25) -> None:
+    """
+    Replays the player standing alone in lane while backing, and checks that the AI recalls, and only heads to base
+    (and opens the shop) once the recall has had time to finish, counting from when 'b' was pressed.
+    :param vision: The initialized vision module.
+    """
+    player = image_handler.load_image(os.path.join(ROOT_DIR, "img", "player.png"))
+    img = np.full((1080, 1920, 3), 40, np.uint8)
+    img[500:500 + player.shape[0], 900:900 + player.shape[1]] = player
+    with tempfile.TemporaryDirectory() as folder:
+        cv.imwrite(os.path.join(folder, "000.png"), img)
+        actions = replay.replay(ImageFolderSource(folder, loop=True), frame_time=frame_time, max_frames=80,
+                                status=("laning", "backing"))
+    recalls = [i for i, action in enumerate(actions) if action.name == "press_key" and action.args == ("b",)]
+    assert recalls, f"The AI didn't recall: {actions}"
+    recall = actions[recalls[0]]
+    assert recalls[0] + 1 < len(actions), "The AI never headed to base"
+    # The AI waits 9s after recalling, then 4s more for the base to load, before opening the shop
+    assert actions[recalls[0] + 1].time >= recall.time + 13, f"Headed to base too early: {actions}"
+
+
+if __name__ == '__main__':
+    test_no_input_controllers()
+    game_vision.init_vision()
+    test_deterministic_synthetic(game_vision)
+    test_recall_synthetic(game_vision)
+    test_deterministic(os.path.join(ROOT_DIR, "screenshots"))
+    game_vision.close()
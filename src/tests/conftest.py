@@ -0,0 +1,48 @@
+"""
+Lets pytest run the tests in this folder (from the src folder: python -m pytest tests).
+The tests are also scripts that can be run on their own (see their __main__ blocks), so they take their inputs as
+arguments, and these fixtures provide them under pytest:
+- vision: the vision module, initialized once and shared by every test that needs it.
+- testpath: the folder of recorded game screenshots, which isn't part of the repo. Tests that need it are skipped when
+it's missing, so a plain checkout only runs the tests on synthetic frames.
+- samplepath: the folder of labelled number crops, skipped the same way.
+"""
+import os
+
+import pytest
+
+from misc.definitions import ROOT_DIR
+
+
+@pytest.fixture(scope="session")
+def vision():
+    """
+    Initializes the vision module once, for every test that needs it.
+    """
+    from listeners.vision import game_vision
+    game_vision.init_vision()
+    yield game_vision
+    game_vision.close()
+
+
+@pytest.fixture
+def testpath(request) -> str:
+    """
+    The folder of recorded game screenshots.
+    """
+    path = os.path.join(ROOT_DIR, "screenshots")
+    if not os.path.isdir(path):
+        pytest.skip(f"No screenshots in {path}")
+    request.getfixturevalue("vision")
+    return path
+
+
+@pytest.fixture
+def samplepath() -> str:
+    """
+    The folder of labelled number crops (see save_number_crops in listeners/vision/test_game_ocr.py).
+    """
+    path = os.path.join(ROOT_DIR, "img", "digits")
+    if not os.path.isdir(path):
+        pytest.skip(f"No labelled number crops in {path}")
+    return path
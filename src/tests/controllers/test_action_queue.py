@@ -0,0 +1,75 @@
+import threading
+import time
+
+from controllers.action_queue import ActionQueue, LOW, NORMAL, URGENT
+from misc import color_logging
+
+logger = color_logging.getLogger('test', level=color_logging.DEBUG)
+
+
+def test_ordering() -> None:
+    """
+    Urgent actions should go first, consecutive movements should be merged, and old actions should expire (unless they
+    never do, like opening the shop).
+    """
+    queue = ActionQueue("test")
+    done = []
+    queue.put(done.append, "walk 1", priority=LOW, key="move")
+    queue.put(done.append, "walk 2", priority=LOW, key="move")
+    queue.put(done.append, "q", priority=NORMAL)
+    queue.put(done.append, "walk 3", priority=LOW, key="move")
+    queue.put(done.append, "flash", priority=URGENT)
+    queue.put(done.append, "stale", priority=NORMAL, ttl=0)
+    queue.put(done.append, "shop", priority=NORMAL, ttl=float('inf'))
+    time.sleep(0.01)
+    while queue.qsize():
+        action = queue.get()
+        action.func(*action.args)
+    assert done == ["flash", "q", "shop", "walk 2", "walk 3"], f"Actions ran as {done}"
+    stats = queue.get_stats()
+    assert stats.coalesced == 1 and stats.expired == 1, f"Got stats {stats}"
+    logger.info(f"Actions ran as {done}")
+
+
+def test_latency(action_time=0.05, put_interval=0.01, duration=3, ttl=0.3) -> None:
+    """
+    Queues movements 5x faster than they can be performed, with a flash every so often. Urgent actions should still
+    start quickly, and nothing should start later than its deadline.
+    """
+    queue = ActionQueue("test", ttl=ttl)
+    urgent_latencies = []
+    stopping = threading.Event()
+
+    def perform(name: str, put_time: float) -> None:
+        if name == "flash":
+            urgent_latencies.append(time.time() - put_time)
+        time.sleep(action_time)
+
+    def consume():
+        while not stopping.is_set():
+            action = queue.get()
+            action.func(*action.args)
+
+    threading.Thread(target=consume, daemon=True).start()
+    start_time = time.time()
+    i = 0
+    while time.time() - start_time < duration:
+        i += 1
+        if i % 20 == 0:
+            queue.put(perform, "flash", time.time(), priority=URGENT)
+        else:
+            # Not merged, to fill the queue up
+            queue.put(perform, "walk", time.time(), priority=LOW)
+        time.sleep(put_interval)
+    stopping.set()
+    queue.put(lambda: None, priority=URGENT)
+    stats = queue.get_stats()
+    assert stats.max_latency <= ttl + 0.01, f"An action started {stats.max_latency * 1000:.0f}ms late"
+    queue.log_stats()
+    logger.info(f"Flash latency: {max(urgent_latencies) * 1000:.0f}ms max, "
+                f"{sum(urgent_latencies) / len(urgent_latencies) * 1000:.0f}ms avg")
+
+
+if __name__ == '__main__':
+    test_ordering()
+    test_latency()
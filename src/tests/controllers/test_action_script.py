@@ -0,0 +1,63 @@
+import time
+
+from controllers.action_script import ScriptRunner
+from misc import color_logging
+
+logger = color_logging.getLogger('test', level=color_logging.DEBUG)
+
+
+def test_non_blocking(frame_time=0.03, duration=2) -> None:
+    """
+    Runs a script that takes about a second, while "frames" keep being processed. Frames shouldn't be held up by the
+    script, and the script's steps should run in order, roughly on time.
+    """
+    runner = ScriptRunner()
+    steps = []
+
+    def script():
+        steps.append(("start", time.time()))
+        yield 0.35
+        steps.append(("middle", time.time()))
+        yield 0.5
+        steps.append(("end", time.time()))
+
+    frames = 0
+    busy_frames = 0
+    start_time = time.time()
+    runner.run("test", script())
+    while time.time() - start_time < duration:
+        frame_start = time.time()
+        frames += 1
+        busy_frames += runner.is_busy()
+        time.sleep(max(frame_time - (time.time() - frame_start), 0))
+    assert [name for name, _ in steps] == ["start", "middle", "end"], f"Steps ran as {steps}"
+    assert not runner.is_busy()
+    gaps = [b - a for (_, a), (_, b) in zip(steps, steps[1:])]
+    logger.info(f"{frames} frames processed ({busy_frames} while the script ran), "
+                f"gaps between steps: {', '.join(f'{gap * 1000:.0f}ms' for gap in gaps)}")
+
+
+def test_cancel() -> None:
+    """
+    Cancelled scripts shouldn't run any more steps.
+    """
+    runner = ScriptRunner()
+    steps = []
+
+    def script():
+        for i in range(10):
+            steps.append(i)
+            yield 0.1
+
+    runner.run("test", script())
+    time.sleep(0.25)
+    runner.cancel()
+    count = len(steps)
+    time.sleep(0.3)
+    assert len(steps) == count and 0 < count < 10, f"Steps ran after cancelling: {steps}"
+    logger.info(f"Cancelled after {count} steps")
+
+
+if __name__ == '__main__':
+    test_non_blocking()
+    test_cancel()
@@ -0,0 +1,122 @@
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import cv2 as cv
+import numpy as np
+
+from listeners.vision import game_vision
+from listeners.vision.frame_buffer import FrameBuffer
+from listeners.vision.frame_source import FrameSource, ImageFolderSource, SourceExhausted, VideoSource
+from misc import color_logging
+from misc.definitions import ROOT_DIR
+
+logger = color_logging.getLogger('test', level=color_logging.DEBUG)
+
+
+def read_all(source: FrameSource, analyze=False) -> int:
+    """
+    Reads every frame from a source (and optionally finds everything in them), and logs how fast it went.
+    :return: The number of frames read.
+    """
+    start_time = time.time()
+    while True:
+        try:
+            img = source.get_frame(game_vision.frame_buffer)
+        except SourceExhausted:
+            break
+        if analyze:
+            game_vision.find_all(img, scale=0.5)
+    elapsed = time.time() - start_time
+    logger.info(f"{type(source).__name__}: {source.count} frames in {elapsed:.2f}s "
+                f"({source.count / max(elapsed, 1e-9):.1f} frames/s)")
+    return source.count
+
+
+def test_sources(testpath: str, analyze=False) -> None:
+    """
+    Reads screenshots from a folder, and from a video made out of them (checking that the video's frames are right).
+    """
+    images = ImageFolderSource(testpath)
+    w, h = images.get_res()
+    # Videos need an even size
+    w, h = w - w % 2, h - h % 2
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "footage.avi")
+        # Lossless, so the frames can be compared exactly
+        writer = cv.VideoWriter(path, cv.VideoWriter_fourcc(*"FFV1"), 30, (w, h))
+        expected = []
+        for file in images.files:
+            img = cv.resize(cv.imread(file, cv.IMREAD_COLOR), (w, h), interpolation=cv.INTER_AREA)
+            writer.write(img)
+            expected.append(img)
+        writer.release()
+        video = VideoSource(path)
+        for img in expected:
+            assert np.array_equal(video.get_frame(), img), f"Frame {video.count} of the video is different"
+        video.close()
+        assert read_all(images, analyze) == len(images.files)
+        assert read_all(VideoSource(path), analyze) == len(expected)
+
+
+def test_sources_synthetic(n=5) -> None:
+    """
+    Same as test_sources, on a folder of random frames (so the folder and video have to keep every pixel).
+    """
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as folder:
+        for i in range(n):
+            cv.imwrite(os.path.join(folder, f"{i:03d}.png"), rng.integers(0, 256, (90, 160, 3), dtype=np.uint8))
+        test_sources(folder)
+        images = ImageFolderSource(folder)
+        for i in range(n):
+            assert np.array_equal(images.get_frame(), cv.imread(os.path.join(folder, f"{i:03d}.png")))
+
+
+class YieldingFrameBuffer(FrameBuffer):
+    """
+    A frame buffer that lets other threads run in the middle of claiming a slot, so unsynchronized claims collide.
+    """
+
+    @property
+    def next(self) -> int:
+        time.sleep(0)
+        return self._next
+
+    @next.setter
+    def next(self, slot: int) -> None:
+        self._next = slot
+
+
+def test_frame_buffer_slots(n_threads=4, claims=2000) -> None:
+    """
+    Claims frame buffer slots from several threads at once (like the capture thread and analyze_frame do).
+    Every claim should get its own turn in the ring, so each slot is claimed the same number of times.
+    """
+    frame_buffer = YieldingFrameBuffer((8, 8), {"img": 3}, slots=4)
+    counts = [Counter() for _ in range(n_threads)]
+
+    def claim(count: Counter):
+        for _ in range(claims):
+            count[frame_buffer.next_slot()] += 1
+
+    try:
+        threads = [threading.Thread(target=claim, args=(count,)) for count in counts]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        frame_buffer.close()
+    total = sum(counts, Counter())
+    assert total == {slot: n_threads * claims // frame_buffer.slots for slot in range(frame_buffer.slots)}, \
+        f"Slots were claimed unevenly: {total}"
+
+if __name__ == '__main__':
+    test_sources_synthetic()
+    test_frame_buffer_slots()
+    game_vision.init_vision()
+    test_sources(os.path.join(ROOT_DIR, "screenshots"), analyze=True)
+    game_vision.close()
@@ -1,11 +1,15 @@
 import os
 import random
+import tempfile
 import time
 
 import cv2 as cv
+import editdistance
+import numpy as np
 
 import listeners.vision.game_vision as game_vision
-from listeners.vision import image_handler
+from listeners.vision import digit_reader, image_handler
+from listeners.vision.digit_reader import DigitReader
 from misc import color_logging
 from misc.definitions import ROOT_DIR
 
@@ -57,5 +61,234 @@ def test_find_text(testpath: str, scale=1.0, display_scale=1.0) -> None:
                 break
 
 
+def get_number_crops(img) -> list:
+    """
+    Crops out every player level and the gold count from a game screenshot.
+    """
+    crops = []
+    for player in game_vision.find_players(img):
+        x1 = player.x1 + 6 - 20
+        y1 = player.y1 + 8 - 75
+        crops.append(img[max(y1, 0):y1 + 12, max(x1, 0):x1 + 16])
+    h, w = img.shape[:2]
+    crops.append(img[h - 35:h - 8, w // 2 + 165:w // 2 + 220])
+    return crops
+
+
+def load_ingame_screenshots(testpath: str, n: int) -> list:
+    """
+    Loads up to n random game screenshots from the test folder.
+    """
+    filepaths = []
+    for subdir, dirs, files in os.walk(testpath):
+        for file in files:
+            if file.endswith('.png') and 'ingame' in subdir:
+                filepaths.append(os.path.join(subdir, file))
+    random.seed(0)
+    random.shuffle(filepaths)
+    return [image_handler.load_image(file) for file in filepaths[:n]]
+
+
+def test_find_numbers(testpath: str, n=30) -> None:
+    """
+    Compares reading every player level and the gold count one at a time vs in one batch.
+    """
+    single_time = 0
+    batch_time = 0
+    num_crops = 0
+    for img in load_ingame_screenshots(testpath, n):
+        crops = get_number_crops(img)
+        num_crops += len(crops)
+        # Without cached results, so both actually read the numbers
+        game_vision.ocr_cache.clear()
+        start_time = time.time()
+        expected = [game_vision.find_number(crop) for crop in crops]
+        single_time += time.time() - start_time
+        game_vision.ocr_cache.clear()
+        start_time = time.time()
+        result = game_vision.find_numbers(crops)
+        batch_time += time.time() - start_time
+        if result != expected:
+            logger.warning(f"One at a time read {expected}, batch read {result}")
+    logger.info(f"{num_crops} numbers in {n} screenshots: one at a time {single_time / n * 1000:.1f}ms per frame, "
+                f"batched {batch_time / n * 1000:.1f}ms per frame")
+
+
+def test_find_numbers_synthetic(vision) -> None:
+    """
+    Reading rendered numbers in one OCR batch should give the same results as reading them one at a time.
+    :param vision: The initialized vision module.
+    """
+    crops = [render_number(text, scale=0.8) for text in ["12", "7", "1350", "18"]]
+    expected = [vision.pool_find_text.apply(vision._find_numbers, ([crop],))[0] for crop in crops]
+    assert vision.pool_find_text.apply(vision._find_numbers, (crops,)) == expected
+
+
+def test_ocr_cache(testpath: str, n=10, repeats=5) -> None:
+    """
+    Reads the same regions of a few screenshots several times, like do_base and the chat recorder do.
+    Only the first read of each region should run OCR.
+    """
+    game_vision.ocr_cache.clear()
+    first_time = 0
+    cached_time = 0
+    for img in load_ingame_screenshots(testpath, n):
+        h, w = img.shape[:2]
+        for i in range(repeats):
+            start_time = time.time()
+            text = game_vision.find_text(img, w // 4, h // 2, w * 3 // 4, h)
+            if i == 0:
+                first_time += time.time() - start_time
+                expected = text
+            else:
+                cached_time += time.time() - start_time
+                assert text == expected, "Cached OCR result doesn't match"
+    cache = game_vision.ocr_cache
+    logger.info(f"First read: {first_time / n * 1000:.1f}ms, cached: {cached_time / (n * (repeats - 1)) * 1000:.2f}ms, "
+                f"{cache.hits} hits, {cache.misses} misses")
+
+
+def test_ocr_cache_synthetic(vision) -> None:
+    """
+    Reading the same region again should come from the cache, unless the pixels in that region changed (changes
+    elsewhere in the screenshot don't matter).
+    :param vision: The initialized vision module.
+    """
+    img = np.full((200, 400, 3), 30, np.uint8)
+    cv.putText(img, "Buy items", (20, 60), cv.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2, cv.LINE_AA)
+    vision.ocr_cache.clear()
+    expected = vision.find_text(img, 0, 0, 300, 100)
+    assert vision.ocr_cache.misses == 1 and vision.ocr_cache.hits == 0
+    img[150:, :] = 90
+    assert vision.find_text(img, 0, 0, 300, 100) == expected
+    assert vision.ocr_cache.hits == 1, "Changes outside the region should still hit the cache"
+    img[80:90, 250:260] = 255
+    vision.find_text(img, 0, 0, 300, 100)
+    assert vision.ocr_cache.misses == 2, "Changes inside the region should read it again"
+
+
+def test_ocr_backends(testpath: str, n=10, reference="cpu_float32", backends=("cpu",)) -> None:
+    """
+    Compares the latency and accuracy of OCR backends against a reference backend, on the regions that the AI reads.
+    Compare backends that run on the same device (ex: cpu vs cpu_float32, or gpu alone), otherwise the latencies
+    mostly measure the device.
+    """
+    images = load_ingame_screenshots(testpath, n)
+    regions = []
+    for img in images:
+        h, w = img.shape[:2]
+        regions.append(img[h // 2:h, w // 4:w * 3 // 4])
+        regions.append(img[150:h * 3 // 4, 150:w * 2 // 3])
+
+    def read_all(reader):
+        results = []
+        start_time = time.time()
+        for region in regions:
+            results.append(' '.join(r[1] for r in reader.readtext(region, text_threshold=0.5)))
+        return results, (time.time() - start_time) / len(regions)
+
+    expected, reference_time = read_all(game_vision.create_ocr_reader(reference))
+    logger.info(f"{reference}: {reference_time * 1000:.1f}ms per region")
+    for backend in backends:
+        results, backend_time = read_all(game_vision.create_ocr_reader(backend))
+        chars = sum(len(e) for e in expected)
+        errors = sum(editdistance.eval(r, e) for r, e in zip(results, expected))
+        logger.info(f"{backend}: {backend_time * 1000:.1f}ms per region, "
+                    f"{(1 - errors / max(chars, 1)) * 100:.1f}% character accuracy vs {reference}")
+
+
+def test_ocr_backends_synthetic(reference="cpu_float32", backends=("cpu",)) -> None:
+    """
+    Every backend should read clearly rendered text the same way as the reference backend.
+    """
+    img = np.full((80, 480, 3), 30, np.uint8)
+    cv.putText(img, "Doran's Blade 450", (10, 50), cv.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2, cv.LINE_AA)
+    expected = [r[1] for r in game_vision.create_ocr_reader(reference).readtext(img)]
+    for backend in backends:
+        result = [r[1] for r in game_vision.create_ocr_reader(backend).readtext(img)]
+        assert result == expected, f"{backend} read {result}, {reference} read {expected}"
+
+
+def save_number_crops(testpath: str, outpath: str, n=100) -> None:
+    """
+    Saves number crops from game screenshots, labelled by OCR, to build the digit reader from.
+    Check the labels by hand before using them!
+    """
+    os.makedirs(outpath, exist_ok=True)
+    count = 0
+    for img in load_ingame_screenshots(testpath, n):
+        crops = get_number_crops(img)
+        for crop, number in zip(crops, game_vision.pool_find_text.apply(game_vision._find_numbers, (crops,))):
+            if number != -1:
+                cv.imwrite(os.path.join(outpath, f"{number}_{count}.png"), crop)
+                count += 1
+    logger.info(f"Saved {count} labelled crops to {outpath}")
+
+
+def render_number(text: str, scale=0.6) -> np.ndarray:
+    """
+    Draws a number in white on a dark background, like the HUD's numbers.
+    """
+    img = np.full((24, 14 * len(text) + 8, 3), 30, np.uint8)
+    cv.putText(img, text, (4, 19), cv.FONT_HERSHEY_SIMPLEX, scale, (255, 255, 255), 1, cv.LINE_AA)
+    return img
+
+
+def test_digit_reader_synthetic() -> None:
+    """
+    Builds the digit reader from rendered digits, and reads numbers it hasn't seen, without any screenshots.
+    """
+    reader = DigitReader.build([(render_number(text), text) for text in ["0123", "4567", "89"]])
+    assert sorted(set(reader.labels.tolist())) == list("0123456789")
+    for number in [1250, 907, 18, 3, 46]:
+        assert reader.read(render_number(str(number))) == number, f"Misread {number}"
+    # Nothing to read
+    assert reader.read(np.full((24, 40, 3), 30, np.uint8)) is None
+
+
+def test_digit_reader(testpath: str, samplepath: str, n=100) -> None:
+    """
+    Builds the digit reader from labelled crops, and compares it to OCR on game screenshots.
+    The templates are saved to a temporary folder; use python -m listeners.vision.digit_reader to install them.
+    """
+    reader = DigitReader.build(digit_reader.load_samples(samplepath))
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "digits.npz")
+        reader.save(path)
+        reader = DigitReader.load(path)
+    same = unsure = different = 0
+    reader_time = 0
+    ocr_time = 0
+    crops = [crop for img in load_ingame_screenshots(testpath, n) for crop in get_number_crops(img)]
+    for crop in crops:
+        start_time = time.time()
+        number = reader.read(crop)
+        reader_time += time.time() - start_time
+        start_time = time.time()
+        expected = game_vision.pool_find_text.apply(game_vision._find_numbers, ([crop],))[0]
+        ocr_time += time.time() - start_time
+        if number is None:
+            unsure += 1
+        elif number == expected:
+            same += 1
+        else:
+            different += 1
+            logger.warning(f"Digit reader read {number}, OCR read {expected}")
+    logger.info(f"{len(crops)} numbers: {same} same as OCR, {different} different, {unsure} left to OCR")
+    logger.info(f"Digit reader: {reader_time / len(crops) * 1000:.3f}ms per number, "
+                f"OCR: {ocr_time / len(crops) * 1000:.3f}ms per number")
+
+
 if __name__ == '__main__':
+    test_digit_reader_synthetic()
+    test_ocr_backends_synthetic()
+    game_vision.init_vision()
+    test_find_numbers_synthetic(game_vision)
+    test_ocr_cache_synthetic(game_vision)
+    test_find_numbers(os.path.join(ROOT_DIR, "screenshots"))
+    test_ocr_cache(os.path.join(ROOT_DIR, "screenshots"))
+    test_ocr_backends(os.path.join(ROOT_DIR, "screenshots"))
+    # save_number_crops(os.path.join(ROOT_DIR, "screenshots"), os.path.join(ROOT_DIR, "img", "digits"))
+    if os.path.isdir(os.path.join(ROOT_DIR, "img", "digits")):
+        test_digit_reader(os.path.join(ROOT_DIR, "screenshots"), os.path.join(ROOT_DIR, "img", "digits"))
     test_find_text(os.path.join(ROOT_DIR, "screenshots"), display_scale=0.7)
@@ -1,24 +1,132 @@
+import time
+
 import cv2 as cv
+import numpy as np
 import listeners.vision.screenshot as screenshot
 from matplotlib import pyplot as plt
 
+from listeners.vision import geometry
+
 from misc import color_logging
 
 logger = color_logging.getLogger('test', level=color_logging.DEBUG)
 
 
-def test_screenshot(x1: float, y1: float, x2: float, y2: float, scale: float) -> None:
+def show_screenshot(x1: float, y1: float, x2: float, y2: float, scale: float) -> None:
     scr = screenshot.take_screenshot(x1, y1, x2, y2, scale)
     scr = cv.cvtColor(scr, cv.COLOR_BGR2RGB)
     plt.imshow(scr)
     plt.show()
 
 
+def test_capture_speed(n=50) -> None:
+    """
+    Compares capturing the whole screen the old way (copying mss's data, then converting), vs converting straight into
+    a preallocated array, vs only grabbing the HUD regions.
+    """
+    w, h = screenshot.get_screen_res()
+    for name, region in geometry.get_capture_regions(w, h).items():
+        screenshot.register_region(name, *region)
+    out = np.empty((h, w, 3), dtype=np.uint8)
+
+    def old_capture():
+        scr = np.array(screenshot.get_sct().grab({'top': 0, 'left': 0, 'width': w, 'height': h}))[:, :, :3]
+        return cv.resize(scr, (w, h), interpolation=cv.INTER_AREA)
+
+    methods = {
+        "copy + resize": old_capture,
+        "into buffer": lambda: screenshot.take_screenshot(out=out),
+        "HUD regions": lambda: screenshot.grab_regions(screenshot.regions),
+    }
+    for name, method in methods.items():
+        method()
+        start_time = time.time()
+        for _ in range(n):
+            method()
+        logger.info(f"{name}: {(time.time() - start_time) / n * 1000:.2f}ms per capture")
+
+
+def test_capture_plan(n=50) -> None:
+    """
+    Captures only the parts of the screen that are needed while shopping (the shop text and gold count), and checks
+    that they're the same as in a full screenshot.
+    """
+    w, h = screenshot.get_screen_res()
+    gold = geometry.get_capture_regions(w, h)["gold"]
+    plan = screenshot.CapturePlan(((150, 150, w * 2 // 3, h * 3 // 4), gold), entities=False)
+    assert screenshot.FULL_CAPTURE.covers(plan) and not plan.covers(screenshot.FULL_CAPTURE)
+    assert plan.covers(screenshot.CapturePlan((gold,), entities=False))
+    out = np.empty((h, w, 3), dtype=np.uint8)
+    full = screenshot.take_screenshot()
+    partial = screenshot.grab_boxes(dict(enumerate(plan.regions)), out=out)
+    for (x1, y1, x2, y2), crop in zip(plan.regions, partial.values()):
+        assert np.array_equal(crop, full[y1:y2, x1:x2]), f"Region {(x1, y1, x2, y2)} is different"
+    start_time = time.time()
+    for _ in range(n):
+        screenshot.grab_boxes(dict(enumerate(plan.regions)), out=out)
+    logger.info(f"Shopping regions: {(time.time() - start_time) / n * 1000:.2f}ms per capture")
+
+
+def test_capture_buffers() -> None:
+    """
+    Checks that screenshots taken without an output array are right, and are written into the reused screenshot
+    buffers in turn (with a fake screen, so it runs anywhere).
+    """
+    bgra = np.random.default_rng(0).integers(0, 256, (120, 160, 4), dtype=np.uint8)
+    grab_bgra = screenshot.grab_bgra
+    screenshot.grab_bgra = lambda x1, y1, x2, y2: bgra[y1:y2, x1:x2]
+    try:
+        shots = [screenshot.take_screenshot(0, 0, 160, 120) for _ in range(screenshot.CAPTURE_SLOTS + 1)]
+        assert np.array_equal(shots[0], bgra[:, :, :3])
+        assert all(screenshot.is_capture_buffer(shot) for shot in shots)
+        assert len({shot.__array_interface__["data"][0] for shot in shots}) == screenshot.CAPTURE_SLOTS
+        assert np.shares_memory(shots[0], shots[-1]), "The oldest buffer should be reused"
+        scaled = screenshot.take_screenshot(20, 10, 100, 70, scale=0.5)
+        assert np.array_equal(scaled, cv.resize(bgra[10:70, 20:100, :3], (40, 30), interpolation=cv.INTER_AREA))
+        assert screenshot.is_capture_buffer(scaled)
+        out = np.empty((120, 160, 3), dtype=np.uint8)
+        screenshot.take_screenshot(0, 0, 160, 120, out=out)
+        assert np.array_equal(out, bgra[:, :, :3]) and not screenshot.is_capture_buffer(out)
+    finally:
+        screenshot.grab_bgra = grab_bgra
+
+
+def test_capture_plan_synthetic() -> None:
+    """
+    Same as test_capture_plan, on a fake screen: capturing the shopping regions into a frame should give the same
+    pixels as a full screenshot there, and copying the frame should only keep those regions.
+    """
+    w, h = 1280, 720
+    bgra = np.random.default_rng(0).integers(0, 256, (h, w, 4), dtype=np.uint8)
+    gold = geometry.get_capture_regions(w, h)["gold"]
+    plan = screenshot.CapturePlan(((150, 150, w * 2 // 3, h * 3 // 4), gold), entities=False)
+    assert screenshot.FULL_CAPTURE.covers(plan) and not plan.covers(screenshot.FULL_CAPTURE)
+    assert plan.covers(screenshot.CapturePlan((gold,), entities=False))
+    assert not plan.covers(screenshot.CapturePlan((gold,)))
+    grab_bgra = screenshot.grab_bgra
+    screenshot.grab_bgra = lambda x1, y1, x2, y2: bgra[y1:y2, x1:x2]
+    try:
+        full = screenshot.take_screenshot(0, 0, w, h).copy()
+        out = np.zeros((h, w, 3), dtype=np.uint8)
+        screenshot.grab_boxes(dict(enumerate(plan.regions)), out=out)
+    finally:
+        screenshot.grab_bgra = grab_bgra
+    copy = plan.copy_frame(out)
+    for x1, y1, x2, y2 in plan.regions:
+        assert np.array_equal(out[y1:y2, x1:x2], full[y1:y2, x1:x2]), f"Region {(x1, y1, x2, y2)} is different"
+        assert np.array_equal(copy[y1:y2, x1:x2], full[y1:y2, x1:x2])
+    assert not out[:150].any(), "Pixels outside the regions were captured"
+
+
 if __name__ == '__main__':
+    test_capture_buffers()
+    test_capture_plan_synthetic()
+    test_capture_speed()
+    test_capture_plan()
     x1 = int(input("Top left x coordinate: "))
     y1 = int(input("Top left y coordinate: "))
     x2 = int(input("Bottom right x coordinate: "))
     y2 = int(input("Bottom right y coordinate: "))
     scale = float(input("Scale: "))
     logger.info("Displaying screenshot...")
-    test_screenshot(x1, y1, x2, y2, scale)
+    show_screenshot(x1, y1, x2, y2, scale)
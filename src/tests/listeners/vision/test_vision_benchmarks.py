@@ -0,0 +1,671 @@
+import dataclasses
+import os
+import random
+import time
+from multiprocessing.pool import ThreadPool
+from typing import Callable, List, Optional, Tuple
+
+import cv2 as cv
+import numpy as np
+
+import listeners.vision.game_vision as game_vision
+from listeners.vision import geometry, image_handler
+from misc import color_logging
+from misc.definitions import ROOT_DIR, MAX_MATCHES
+
+logger = color_logging.getLogger('test', level=color_logging.DEBUG)
+
+
+def load_screenshots(testpath: str, n: int) -> List[np.ndarray]:
+    """
+    Loads up to n random game screenshots from the test folder.
+    """
+    filepaths = []
+    for subdir, dirs, files in os.walk(testpath):
+        for file in files:
+            if file.endswith('.png') and 'ingame' in subdir:
+                filepaths.append(os.path.join(subdir, file))
+    random.seed(0)
+    random.shuffle(filepaths)
+    return [image_handler.load_image(file) for file in filepaths[:n]]
+
+
+def make_synthetic_frame(bars: List[Tuple[str, int, int]], shape=(1080, 1920), ui_scale=1.0) -> np.ndarray:
+    """
+    Makes a plain frame with health bar templates pasted onto it, so detectors can be checked without screenshots.
+    :param bars: The template (ex: "minion.png") and top left corner (x, y) of each bar.
+    :param shape: The frame's height and width.
+    :param ui_scale: The frame's UI scale. The shape, positions and templates are scaled by it.
+    """
+    img = np.full((round(shape[0] * ui_scale), round(shape[1] * ui_scale), 3), 40, np.uint8)
+    for name, x, y in bars:
+        template = image_handler.load_image(os.path.join(ROOT_DIR, "img", name), ui_scale)
+        x, y = round(x * ui_scale), round(y * ui_scale)
+        img[y:y + template.shape[0], x:x + template.shape[1]] = template
+    return img
+
+
+# Bars that don't overlap, including two minions close enough for their hits to be deduplicated against each other
+SYNTHETIC_BARS = [("minion.png", 300, 400), ("minion.png", 370, 402), ("minion.png", 1200, 300),
+                  ("player.png", 900, 450), ("player.png", 400, 700), ("small_objective.png", 1500, 200)]
+
+
+def is_same_detection(d1, d2, tolerance=2, fill_tolerance=0.05) -> bool:
+    """
+    :return: Whether two detections (ex: two Minions) are the same entity: positions within the tolerance (in pixels),
+    health and mana within the fill tolerance, and everything else equal.
+    """
+    if type(d1) is not type(d2):
+        return False
+    for field in dataclasses.fields(d1):
+        v1, v2 = getattr(d1, field.name), getattr(d2, field.name)
+        if field.name in ('x1', 'y1', 'x2', 'y2'):
+            if abs(v1 - v2) > tolerance:
+                return False
+        elif isinstance(v1, float):
+            if abs(v1 - v2) > fill_tolerance:
+                return False
+        elif v1 != v2:
+            return False
+    return True
+
+
+def assert_same_detections(expected: tuple, result: tuple, name: str, tolerance=2) -> None:
+    """
+    Checks that two find_all results found the same entities (in any order), at positions within the tolerance.
+    :param name: What the result is from, for the error message.
+    """
+    for found_expected, found in zip(expected, result):
+        assert len(found) == len(found_expected), f"{name} found {found} instead of {found_expected}"
+        for d in found_expected:
+            assert any(is_same_detection(d, r, tolerance) for r in found), f"{name} missed {d}, found {found}"
+
+
+def time_function(func: Callable, images: List[np.ndarray], repeats=3) -> float:
+    """
+    Runs the function on every image (a few times each), and returns the median time per call in seconds.
+    """
+    times = []
+    for img in images:
+        for _ in range(repeats):
+            start_time = time.time()
+            func(img)
+            times.append(time.time() - start_time)
+    return float(np.median(times))
+
+
+def get_memory_usage() -> Optional[float]:
+    """
+    :return: The memory used by this process and its children (ex: vision workers) in MB, or None if psutil isn't
+    installed. Shared memory is counted once per process that maps it.
+    """
+    try:
+        import psutil
+    except ImportError:
+        return None
+    process = psutil.Process()
+    return sum(p.memory_info().rss for p in [process] + process.children(recursive=True)) / 2 ** 20
+
+
+# Everything that init_vision and close replace in the vision module
+VISION_STATE = ["pool_find_text", "pool_find_minions", "pool_find_players", "pool_find_small_objectives",
+                "pool_find_big_objectives", "pool_find_tiles", "tile_count", "frame_buffer", "region_tracker",
+                "digit_reader", "ocr_reader"]
+
+
+def save_vision_state() -> dict:
+    """
+    Saves the vision module's workers and settings, so that a test can initialize it differently and restore it.
+    """
+    state = {name: getattr(game_vision, name) for name in VISION_STATE if hasattr(game_vision, name)}
+    state["torch_threads"] = game_vision.torch.get_num_threads()
+    return state
+
+
+def restore_vision_state(state: dict) -> None:
+    """
+    Restores the vision module's workers and settings saved by save_vision_state.
+    :param state: The saved state.
+    """
+    game_vision.torch.set_num_threads(state["torch_threads"])
+    for name in VISION_STATE:
+        if name in state:
+            setattr(game_vision, name, state[name])
+        elif hasattr(game_vision, name):
+            delattr(game_vision, name)
+
+
+def test_vision_engines(testpath: str, n=20) -> None:
+    """
+    Compares memory usage and find_all latency of the multiprocess engine (one worker per detector) vs the thread
+    engine (everything in this process).
+    """
+    images = load_screenshots(testpath, n)
+    # The vision module may already be initialized for the other tests, so put it back as it was afterwards
+    state = save_vision_state()
+    try:
+        for engine in game_vision.VISION_ENGINES:
+            memory_before = get_memory_usage()
+            start_time = time.time()
+            game_vision.init_vision(engine=engine)
+            init_time = time.time() - start_time
+            try:
+                memory_after = get_memory_usage()
+                find_all_time = time_function(game_vision.find_all, images)
+            finally:
+                game_vision.close()
+            memory = f"{memory_after - memory_before:.0f}MB" if memory_before is not None else "unknown (needs psutil)"
+            logger.info(f"{engine} engine: init {init_time:.1f}s, memory {memory}, "
+                        f"find_all {find_all_time * 1000:.1f}ms")
+    finally:
+        restore_vision_state(state)
+    # The workers that were running before should still be usable
+    if "pool_find_minions" in state:
+        tracker = game_vision.region_tracker
+        try:
+            game_vision.region_tracker = None
+            frame = make_synthetic_frame(SYNTHETIC_BARS)
+            assert sum(len(found) for found in game_vision.find_all(frame)) == len(SYNTHETIC_BARS)
+        finally:
+            game_vision.region_tracker = tracker
+
+
+def test_vision_engines_synthetic(vision) -> None:
+    """
+    The thread engine should find the same things as the vision module that's already running (with any engine).
+    :param vision: The initialized vision module.
+    """
+    img = make_synthetic_frame(SYNTHETIC_BARS)
+    tracker = vision.region_tracker
+    try:
+        vision.region_tracker = None
+        expected = vision.find_all(img)
+    finally:
+        vision.region_tracker = tracker
+    state = save_vision_state()
+    try:
+        vision.init_vision(engine="thread")
+        try:
+            assert_same_detections(expected, vision.find_all(img), "Thread engine", tolerance=0)
+        finally:
+            vision.close()
+    finally:
+        restore_vision_state(state)
+
+
+def test_frame_transport(testpath: str, n=20) -> None:
+    """
+    Compares find_all latency when frames are sent to the workers through shared memory vs by pickling.
+    """
+    images = load_screenshots(testpath, n)
+    frame_buffer = game_vision.frame_buffer
+
+    def captured(img: np.ndarray):
+        # Simulates take_game_screenshot writing directly into the frame buffer
+        slot_img = frame_buffer.next_image(img.shape[0], img.shape[1])
+        np.copyto(slot_img, img)
+        return game_vision.find_all(slot_img)
+
+    shared_time = time_function(captured, images)
+    copied_time = time_function(game_vision.find_all, images)
+    game_vision.frame_buffer = None
+    try:
+        pickled_time = time_function(game_vision.find_all, images)
+    finally:
+        game_vision.frame_buffer = frame_buffer
+    logger.info(f"find_all, captured into shared memory: {shared_time * 1000:.1f}ms")
+    logger.info(f"find_all, copied into shared memory: {copied_time * 1000:.1f}ms")
+    logger.info(f"find_all, pickled to each worker: {pickled_time * 1000:.1f}ms")
+
+
+def test_frame_transport_synthetic(vision) -> None:
+    """
+    Finding everything in a frame captured into the frame buffer, copied into it, or pickled to each worker should
+    give the same results, and the shared masks should be the same as masking the frame for each detector.
+    :param vision: The initialized vision module.
+    """
+    img = make_synthetic_frame(SYNTHETIC_BARS)
+    frame = vision.analyze_frame(img)
+    for mask, (lower, upper) in [(frame.minion_mask, (vision.lower_minion_edge, vision.upper_minion_edge)),
+                                 (frame.player_mask, (vision.lower_player_edge, vision.upper_player_edge)),
+                                 (frame.objective_mask, (vision.lower_objective_edge, vision.upper_objective_edge))]:
+        assert np.array_equal(mask, image_handler.get_outline_mask(img, lower, upper))
+    frame_buffer = vision.frame_buffer
+    tracker = vision.region_tracker
+    try:
+        vision.region_tracker = None
+        expected = vision.find_all(img)
+        assert sum(len(found) for found in expected) == len(SYNTHETIC_BARS), f"Found {expected}"
+        if frame_buffer is not None:
+            slot_img = frame_buffer.next_image(*img.shape[:2])
+            np.copyto(slot_img, img)
+            assert_same_detections(expected, vision.find_all(slot_img), "Captured into shared memory", tolerance=0)
+        vision.frame_buffer = None
+        assert_same_detections(expected, vision.find_all(img), "Pickled to each worker", tolerance=0)
+    finally:
+        vision.frame_buffer = frame_buffer
+        vision.region_tracker = tracker
+
+
+def test_region_tracking(testpath: str, n=50) -> None:
+    """
+    Compares find_all with and without region tracking on consecutive screenshots (in filename order).
+    Region tracking should find the same things, since everything that moved or was found before is searched again.
+    """
+    filepaths = sorted(os.path.join(subdir, file) for subdir, dirs, files in os.walk(testpath) for file in files
+                       if file.endswith('.png') and 'ingame' in subdir)[:n]
+    images = [image_handler.load_image(file) for file in filepaths]
+    tracker = game_vision.region_tracker
+    try:
+        game_vision.region_tracker = None
+        full_results = []
+        start_time = time.time()
+        for img in images:
+            full_results.append(game_vision.find_all(img))
+        full_time = (time.time() - start_time) / len(images)
+        game_vision.region_tracker = game_vision.RegionTracker()
+        tracked_results = []
+        start_time = time.time()
+        for img in images:
+            tracked_results.append(game_vision.find_all(img))
+        tracked_time = (time.time() - start_time) / len(images)
+    finally:
+        game_vision.region_tracker = tracker
+    differences = sum(1 for r1, r2 in zip(full_results, tracked_results) if r1 != r2)
+    logger.info(f"find_all, full search: {full_time * 1000:.1f}ms, region tracking: {tracked_time * 1000:.1f}ms, "
+                f"{differences} / {len(images)} frames with different results")
+    for i, (expected, result) in enumerate(zip(full_results, tracked_results)):
+        assert_same_detections(expected, result, f"Region tracking on {filepaths[i]}")
+
+
+def test_region_tracking_synthetic(vision) -> None:
+    """
+    Region tracking should find the same things as a full search while health bars move, appear and disappear.
+    :param vision: The initialized vision module.
+    """
+    frames = [SYNTHETIC_BARS,
+              # A minion walks, and a player appears
+              [("minion.png", 330, 410)] + SYNTHETIC_BARS[1:] + [("player.png", 1300, 800)],
+              # The objective disappears
+              [("minion.png", 360, 420)] + SYNTHETIC_BARS[1:-1] + [("player.png", 1300, 800)],
+              # Nothing changes
+              [("minion.png", 360, 420)] + SYNTHETIC_BARS[1:-1] + [("player.png", 1300, 800)]]
+    images = [make_synthetic_frame(bars) for bars in frames]
+    tracker = vision.region_tracker
+    try:
+        vision.region_tracker = None
+        full_results = [vision.find_all(img) for img in images]
+        vision.region_tracker = vision.RegionTracker()
+        for i, (img, expected) in enumerate(zip(images, full_results)):
+            assert_same_detections(expected, vision.find_all(img), f"Region tracking on frame {i}", tolerance=0)
+    finally:
+        vision.region_tracker = tracker
+
+
+def remove_duplicates_naive(matches: List[image_handler.Match], margin: float,
+                            max_dy: float) -> List[image_handler.Match]:
+    """
+    The original O(n^2) duplicate removal, used as a reference.
+    """
+    unique = []
+    for m1 in matches:
+        for m2 in unique:
+            if m1.x1 + margin < m2.x2 - margin and m1.x2 - margin > m2.x1 + margin and abs(m1.y1 - m2.y1) <= max_dy \
+                    and abs(m1.y2 - m2.y2) <= max_dy:
+                break
+        else:
+            unique.append(m1)
+    return unique
+
+
+def test_remove_duplicates(n_bars=60, hits_per_bar=35, w=62, h=6) -> None:
+    """
+    Compares the grid based duplicate removal against the original nested loop on a crowded (team fight) frame.
+    Each health bar produces a cluster of overlapping hits, like find_exact_matches does.
+    """
+    rng = np.random.default_rng(0)
+    matches = []
+    for _ in range(n_bars):
+        x, y = rng.integers(0, 1920 - w), rng.integers(0, 1080 - h)
+        for _ in range(hits_per_bar):
+            dx, dy = rng.integers(-4, 5), rng.integers(-3, 4)
+            matches.append(image_handler.Match(x + dx, y + dy, x + dx + w - 1, y + dy + h - 1, rng.random()))
+    matches.sort(key=lambda m: m.score, reverse=True)
+    logger.info(f"{len(matches)} matches from {n_bars} health bars")
+
+    for margin, max_dy in [(10, 2), (30, 3)]:
+        start_time = time.time()
+        expected = remove_duplicates_naive(matches, margin, max_dy)
+        naive_time = time.time() - start_time
+        start_time = time.time()
+        result = image_handler.remove_duplicate_matches(matches, margin, max_dy)
+        grid_time = time.time() - start_time
+        assert result == expected, "Grid duplicate removal doesn't match the original"
+        logger.info(f"margin={margin}, max_dy={max_dy}: {len(result)} unique, "
+                    f"nested loop {naive_time * 1000:.1f}ms, grid {grid_time * 1000:.1f}ms")
+
+
+def find_exact_matches_naive(img: np.ndarray, template: np.ndarray, threshold=0.75) -> List[image_handler.Match]:
+    """
+    The original point list based find_exact_matches (without scaling), used as a reference.
+    """
+    res = cv.matchTemplate(img, template, cv.TM_CCORR_NORMED)
+    points = list(zip(*np.where(res >= threshold)[::-1]))
+    matches = []
+    for pt in points:
+        matches.append(image_handler.Match(pt[0], pt[1], pt[0] + template.shape[1] - 1, pt[1] + template.shape[0] - 1,
+                                           res[pt[1]][pt[0]]))
+        if len(matches) >= MAX_MATCHES:
+            break
+    return sorted(matches, key=lambda m: m.score, reverse=True)
+
+
+def test_peak_extraction(testpath: str, n=20) -> None:
+    """
+    Compares the original point list matching against peak extraction, on the minion masks of game screenshots.
+    Only the time spent after matchTemplate differs, so the whole call is timed to show the overall change.
+    """
+    images = load_screenshots(testpath, n)
+    template = image_handler.load_image(os.path.join(ROOT_DIR, "img", "minion.png"))
+    template_mask = image_handler.get_outline_mask(template, game_vision.lower_minion_edge,
+                                                   game_vision.upper_minion_edge)
+    masks = [image_handler.get_outline_mask(img, game_vision.lower_minion_edge, game_vision.upper_minion_edge)
+             for img in images]
+    for name, func in [("point list", lambda m: find_exact_matches_naive(m, template_mask)),
+                       ("all points", lambda m: image_handler.find_exact_matches(m, template_mask)),
+                       ("local max", lambda m: image_handler.find_exact_matches(m, template_mask, local_max=True)),
+                       ("local max array", lambda m: image_handler.find_exact_peaks(m, template_mask, local_max=True))]:
+        counts = [len(func(m)) for m in masks]
+        logger.info(f"{name}: {time_function(func, masks) * 1000:.2f}ms, {np.mean(counts):.1f} matches on average")
+    # Without truncation, both should find the same points
+    for m in masks:
+        expected = find_exact_matches_naive(m, template_mask)
+        if len(expected) < MAX_MATCHES:
+            assert [(e.x1, e.y1) for e in expected] == [(r.x1, r.y1) for r in
+                                                        image_handler.find_exact_matches(m, template_mask)]
+
+
+def test_peak_extraction_synthetic(vision) -> None:
+    """
+    Peak extraction and the detectors should find every pasted health bar once, at the same points as the original
+    point list matching.
+    :param vision: The initialized vision module.
+    """
+    img = make_synthetic_frame(SYNTHETIC_BARS)
+    template = image_handler.load_image(os.path.join(ROOT_DIR, "img", "minion.png"))
+    template_mask = image_handler.get_outline_mask(template, game_vision.lower_minion_edge,
+                                                   game_vision.upper_minion_edge)
+    mask = image_handler.get_outline_mask(img, game_vision.lower_minion_edge, game_vision.upper_minion_edge)
+    expected = find_exact_matches_naive(mask, template_mask)
+    result = image_handler.find_exact_matches(mask, template_mask)
+    assert sorted((e.x1, e.y1) for e in expected) == sorted((r.x1, r.y1) for r in result)
+    assert [(e.x1, e.y1) for e in image_handler.remove_duplicate_matches(expected, 10, 2)] == \
+           [(r.x1, r.y1) for r in image_handler.remove_duplicate_matches(result, 10, 2)]
+    minions = vision.find_minions(img)
+    assert sorted(m.x1 for m in minions) == [x for name, x, y in sorted(SYNTHETIC_BARS) if name == "minion.png"], \
+        f"Found {minions}"
+
+
+# Each health bar template, and the HSV bounds of its edges
+BAR_EDGES = [("minion.png", game_vision.lower_minion_edge, game_vision.upper_minion_edge),
+             ("player.png", game_vision.lower_player_edge, game_vision.upper_player_edge),
+             ("small_objective.png", game_vision.lower_objective_edge, game_vision.upper_objective_edge),
+             ("big_objective.png", game_vision.lower_objective_edge, game_vision.upper_objective_edge)]
+
+
+def assert_same_binary_scores(mask: np.ndarray, template_mask: np.ndarray,
+                              binary_template: image_handler.BinaryTemplate, threshold: float) -> None:
+    """
+    Checks that the binary matcher scores the mask like cv.matchTemplate, wherever either score is above the threshold.
+    """
+    expected = cv.matchTemplate(mask, template_mask, cv.TM_CCORR_NORMED)
+    result = image_handler.binary_match_scores(mask, binary_template, threshold)
+    # Only scores within rounding distance of the threshold can be on different sides of it
+    different = (expected >= threshold) != (result >= threshold)
+    assert np.all(np.abs(expected[different] - threshold) < 1e-4), "Binary matcher found different points"
+    both = (expected >= threshold) & (result >= threshold)
+    assert np.allclose(expected[both], result[both], atol=1e-4), "Binary matcher scores are different"
+
+
+def test_binary_matching(testpath: str, n=20, threshold=0.75) -> None:
+    """
+    Compares cv.matchTemplate against the binary matcher, on the health bar masks of game screenshots.
+    Scores above the threshold should be the same (up to float rounding), and so should the peaks.
+    """
+    images = load_screenshots(testpath, n)
+    for name, lower, upper in BAR_EDGES:
+        template = image_handler.load_image(os.path.join(ROOT_DIR, "img", name))
+        template_mask = image_handler.get_outline_mask(template, lower, upper)
+        binary_template = image_handler.get_binary_template(template_mask)
+        masks = [image_handler.get_outline_mask(img, lower, upper) for img in images]
+        for m in masks:
+            assert_same_binary_scores(m, template_mask, binary_template, threshold)
+        exact_time = time_function(lambda m: image_handler.find_exact_peaks(m, template_mask, threshold=threshold),
+                                   masks)
+        binary_time = time_function(lambda m: image_handler.find_binary_peaks(m, binary_template, threshold), masks)
+        logger.info(f"{name} ({len(binary_template.rects)} rectangles): matchTemplate {exact_time * 1000:.1f}ms, "
+                    f"binary {binary_time * 1000:.1f}ms")
+
+
+def test_binary_matching_synthetic(threshold=0.75) -> None:
+    """
+    The binary matcher should score every type of health bar like cv.matchTemplate, on a synthetic frame.
+    """
+    img = make_synthetic_frame(SYNTHETIC_BARS + [("big_objective.png", 700, 100)])
+    for name, lower, upper in BAR_EDGES:
+        template = image_handler.load_image(os.path.join(ROOT_DIR, "img", name))
+        template_mask = image_handler.get_outline_mask(template, lower, upper)
+        binary_template = image_handler.get_binary_template(template_mask)
+        mask = image_handler.get_outline_mask(img, lower, upper)
+        assert_same_binary_scores(mask, template_mask, binary_template, threshold)
+        assert len(image_handler.find_binary_peaks(mask, binary_template, threshold)) > 0, f"{name} wasn't found"
+
+
+def test_refined_matching(testpath: str, n=20, scales=(0.5, 0.33, 0.25), checked_scales=(0.5,)) -> None:
+    """
+    Compares find_all at full resolution vs finding health bars at a lower scale and confirming them at full resolution.
+    Both should find the same things (maybe in a different order, since scores can differ by float rounding).
+    :param checked_scales: The scales that must find the same things (the one the AI uses, manual_ai.VISION_SCALE).
+    The other scales are only compared.
+    """
+    images = load_screenshots(testpath, n)
+
+    def find_sorted(img: np.ndarray, scale: float):
+        return [sorted(map(dataclasses.astuple, found)) for found in game_vision.find_all(img, scale)]
+
+    tracker = game_vision.region_tracker
+    try:
+        game_vision.region_tracker = None
+        expected = [find_sorted(img, 1) for img in images]
+        logger.info(f"find_all, full resolution: {time_function(game_vision.find_all, images) * 1000:.1f}ms")
+        for scale in scales:
+            differences = sum(1 for img, e in zip(images, expected) if find_sorted(img, scale) != e)
+            scaled_time = time_function(lambda img: game_vision.find_all(img, scale), images)
+            logger.info(f"find_all, refined from scale {scale}: {scaled_time * 1000:.1f}ms, "
+                        f"{differences} / {len(images)} frames with different results")
+        for scale in checked_scales:
+            for i, img in enumerate(images):
+                assert_same_detections(game_vision.find_all(img), game_vision.find_all(img, scale),
+                                       f"find_all refined from scale {scale} on screenshot {i}")
+    finally:
+        game_vision.region_tracker = tracker
+
+
+def test_refined_matching_synthetic(vision, scale=0.5) -> None:
+    """
+    Finding health bars at the AI's scale (manual_ai.VISION_SCALE) and confirming them at full resolution should find
+    exactly what a full resolution search does, including bars that are close together or partly drained.
+    :param vision: The initialized vision module.
+    """
+    img = make_synthetic_frame(SYNTHETIC_BARS)
+    # Drain half of a minion's health, so the fill is read from the refined position
+    img[401:405, 330:362] = 40
+    tracker = vision.region_tracker
+    try:
+        vision.region_tracker = None
+        expected = vision.find_all(img)
+        assert sum(len(found) for found in expected) == len(SYNTHETIC_BARS), f"Found {expected}"
+        assert any(m.health < 0.6 for m in expected[0]), f"Drained minion not found in {expected[0]}"
+        assert_same_detections(expected, vision.find_all(img, scale), f"find_all refined from scale {scale}",
+                               tolerance=0)
+    finally:
+        vision.region_tracker = tracker
+
+
+def test_tiled_search(testpath: str, n=20) -> None:
+    """
+    Compares find_all with each detector searching the whole frame in its own worker vs every tile worker searching
+    a strip of the frame for all detectors. Both should find the same things.
+    """
+    if game_vision.pool_find_tiles is None:
+        logger.info(f"Tiled search is disabled (tile_count={game_vision.tile_count}), skipping")
+        return
+    images = load_screenshots(testpath, n)
+
+    def find_sorted(img: np.ndarray):
+        return [sorted(map(dataclasses.astuple, found)) for found in game_vision.find_all(img)]
+
+    tracker = game_vision.region_tracker
+    tile_pool = game_vision.pool_find_tiles
+    try:
+        game_vision.region_tracker = None
+        game_vision.pool_find_tiles = None
+        expected = [find_sorted(img) for img in images]
+        untiled_time = time_function(game_vision.find_all, images)
+        game_vision.pool_find_tiles = tile_pool
+        differences = sum(1 for img, e in zip(images, expected) if find_sorted(img) != e)
+        tiled_time = time_function(game_vision.find_all, images)
+        logger.info(f"find_all, 1 worker per detector: {untiled_time * 1000:.1f}ms, "
+                    f"{game_vision.tile_count} tiles: {tiled_time * 1000:.1f}ms, "
+                    f"{differences} / {len(images)} frames with different results")
+    finally:
+        game_vision.region_tracker = tracker
+        game_vision.pool_find_tiles = tile_pool
+
+
+def test_ui_scale_synthetic(vision, heights=(900, 1440)) -> None:
+    """
+    Health bars drawn at another resolution should be found at the same places (scaled), with the same boxes.
+    At 720p, the minion bar template is too small to keep its edges, so minions aren't found there.
+    :param vision: The initialized vision module.
+    :param heights: The frame heights to check.
+    """
+    tracker = vision.region_tracker
+    try:
+        vision.region_tracker = None
+        expected = vision.find_all(make_synthetic_frame(SYNTHETIC_BARS))
+        for h in heights:
+            ui_scale = h / geometry.REFERENCE_HEIGHT
+            corners = ('x1', 'y1', 'x2', 'y2')
+            scaled = tuple([dataclasses.replace(d, **{k: round(getattr(d, k) * ui_scale) for k in corners})
+                            for d in found] for found in expected)
+            assert_same_detections(scaled, vision.find_all(make_synthetic_frame(SYNTHETIC_BARS, ui_scale=ui_scale)),
+                                   f"find_all at {h}p")
+    finally:
+        vision.region_tracker = tracker
+
+
+def test_tiled_search_synthetic(vision, tiles=3) -> None:
+    """
+    Splitting the search into tiles should find exactly the same things as searching the whole frame, including bars
+    cut by a tile boundary (with 3 tiles, the player bar at y=700 crosses y=720).
+    :param vision: The initialized vision module.
+    """
+    img = make_synthetic_frame(SYNTHETIC_BARS)
+    tracker = vision.region_tracker
+    tile_pool, tile_count = vision.pool_find_tiles, vision.tile_count
+    pool = ThreadPool(processes=tiles)
+    try:
+        vision.region_tracker = None
+        vision.pool_find_tiles = None
+        expected = vision.find_all(img)
+        vision.pool_find_tiles, vision.tile_count = pool, tiles
+        assert_same_detections(expected, vision.find_all(img), f"find_all in {tiles} tiles", tolerance=0)
+    finally:
+        vision.region_tracker = tracker
+        vision.pool_find_tiles, vision.tile_count = tile_pool, tile_count
+        pool.close()
+        pool.join()
+
+
+def find_exact_scaled_matches_naive(img: np.ndarray, template: np.ndarray, scale=1,
+                                    threshold=0.75) -> List[image_handler.Match]:
+    """
+    The original find_exact_scaled_matches, which rescales the template for every resolution on every call, used as
+    a reference.
+    """
+    if scale != 1:
+        img = image_handler.scale_image(img, scale)
+        template = image_handler.scale_image(template, scale)
+    all_matches = []
+    scores = []
+    for s in image_handler.LEAGUE_SCALES:
+        if s <= 1:
+            matches = image_handler.find_exact_matches(img, image_handler.scale_image(template, s), threshold=threshold)
+        else:
+            matches = image_handler.find_exact_matches(image_handler.scale_image(img, 1 / s), template,
+                                                       threshold=threshold)
+            for m in matches:
+                m.x1, m.x2, m.y1, m.y2 = m.x1 * s, m.x2 * s, m.y1 * s, m.y2 * s
+        if matches:
+            all_matches.append(matches)
+            scores.append(max(m.score for m in matches))
+    matches = all_matches[np.argmax(scores)] if all_matches else []
+    if scale != 1:
+        for m in matches:
+            m.x1, m.x2, m.y1, m.y2 = round(m.x1 / scale), round(m.x2 / scale), round(m.y1 / scale), round(m.y2 / scale)
+    return matches
+
+
+def test_template_pyramid(resolutions=(1920 / 1920, 1280 / 1920, 2560 / 1920), downscales=(1, 0.5)) -> None:
+    """
+    Compares find_exact_scaled_matches with a template pyramid on the first call (searching every resolution) and on
+    later calls (locked onto the game resolution) against the original uncached search, on the shop rendered at
+    different resolutions. All of them should find the same matches.
+    """
+    shop = image_handler.load_image(os.path.join(ROOT_DIR, "img", "shop.png"))
+    template = shop[500:560, 800:960].copy()
+    for res in resolutions:
+        img = image_handler.scale_image(shop, res)
+        for downscale in downscales:
+            start_time = time.time()
+            expected = find_exact_scaled_matches_naive(img, template, downscale, threshold=0.95)
+            naive_time = time.time() - start_time
+            pyramid = image_handler.TemplatePyramid(template)
+            first = image_handler.find_exact_scaled_matches(img, pyramid, downscale, threshold=0.95)
+            start_time = time.time()
+            locked = image_handler.find_exact_scaled_matches(img, pyramid, downscale, threshold=0.95)
+            locked_time = time.time() - start_time
+            assert expected, f"Template not found at resolution scale {res:.2f}"
+            assert first == expected, f"Pyramid found {first} instead of {expected}"
+            assert locked == expected, f"Locked scale found {locked} instead of {expected}"
+            logger.info(f"Resolution scale {res:.2f}, downscale {downscale}: locked onto {pyramid.locked_scale:.2f}, "
+                        f"uncached {naive_time * 1000:.0f}ms, locked {locked_time * 1000:.0f}ms")
+    # Plain templates get a cached pyramid, which has to be unlocked when the resolution changes
+    image_handler.find_exact_scaled_matches(shop, template, threshold=0.95)
+    assert image_handler.get_template_pyramid(template).locked_scale == 1
+    image_handler.unlock_template_pyramids()
+    assert image_handler.get_template_pyramid(template).locked_scale is None
+
+
+if __name__ == '__main__':
+    test_remove_duplicates()
+    test_remove_duplicates(n_bars=200, hits_per_bar=10)
+    test_template_pyramid()
+    test_vision_engines(os.path.join(ROOT_DIR, "screenshots"))
+    game_vision.init_vision()
+    test_peak_extraction_synthetic(game_vision)
+    test_region_tracking_synthetic(game_vision)
+    test_refined_matching_synthetic(game_vision)
+    test_frame_transport_synthetic(game_vision)
+    test_tiled_search_synthetic(game_vision)
+    test_ui_scale_synthetic(game_vision)
+    test_vision_engines_synthetic(game_vision)
+    test_binary_matching_synthetic()
+    test_frame_transport(os.path.join(ROOT_DIR, "screenshots"))
+    test_region_tracking(os.path.join(ROOT_DIR, "screenshots"))
+    test_refined_matching(os.path.join(ROOT_DIR, "screenshots"))
+    test_tiled_search(os.path.join(ROOT_DIR, "screenshots"))
+    test_binary_matching(os.path.join(ROOT_DIR, "screenshots"))
+    test_peak_extraction(os.path.join(ROOT_DIR, "screenshots"))
+    game_vision.close()
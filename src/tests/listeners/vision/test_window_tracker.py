@@ -0,0 +1,47 @@
+import time
+
+from listeners.vision import window_tracker
+from misc import color_logging
+
+logger = color_logging.getLogger('test', level=color_logging.DEBUG)
+
+
+def test_cached_geometry(n=1000) -> None:
+    """
+    Compares converting coordinates with a full window search every time (the old behavior) vs with cached positions.
+    """
+    start_time = time.time()
+    for _ in range(n):
+        window_tracker.update_handles()
+        window_tracker.offset_game_pos(100, 100)
+    search_time = (time.time() - start_time) / n
+    start_time = time.time()
+    for _ in range(n):
+        window_tracker.offset_game_pos(100, 100)
+    cached_time = (time.time() - start_time) / n
+    logger.info(f"Game window: {window_tracker.get_rect('game')}")
+    logger.info(f"offset_game_pos: {search_time * 1e6:.1f}us searching, {cached_time * 1e6:.2f}us cached")
+
+
+def test_listeners() -> None:
+    """
+    Moves a fake game window around, and checks that listeners are told about it.
+    """
+    old_backend = window_tracker.backend
+    changes = []
+    window_tracker.add_listener(lambda name, old, new: changes.append((name, new)))
+    try:
+        window_tracker.set_backend(window_tracker.HeadlessBackend(window_tracker.WindowRect(0, 0, 1920, 1080)))
+        changes.clear()
+        window_tracker.set_game_props(100, 50, 1280, 720)
+        assert changes == [("game", window_tracker.WindowRect(100, 50, 1280, 720))], f"Got changes {changes}"
+        assert window_tracker.offset_game_pos(10, 10) == (110, 60)
+        logger.info("Listeners were notified of the move")
+    finally:
+        window_tracker.listeners.pop()
+        window_tracker.set_backend(old_backend)
+
+
+if __name__ == '__main__':
+    test_cached_geometry()
+    test_listeners()
@@ -0,0 +1,70 @@
+import time
+
+from misc import color_logging
+from misc.pipeline import Pipeline
+
+logger = color_logging.getLogger('test', level=color_logging.DEBUG)
+
+
+def test_throughput(capture_time=0.01, vision_time=0.05, decision_time=0.03, duration=3) -> None:
+    """
+    Runs fake stages that sleep for a fixed time. Sequentially, a frame takes the sum of all stages; in the pipeline,
+    it should only take about as long as the slowest stage.
+    """
+    frame_id = 0
+    decisions = []
+
+    def capture():
+        nonlocal frame_id
+        time.sleep(capture_time)
+        frame_id += 1
+        return frame_id, time.time()
+
+    def vision(frame):
+        time.sleep(vision_time)
+        return frame
+
+    def decision(frame):
+        decisions.append((frame, time.time()))
+        time.sleep(decision_time)
+
+    pipeline = Pipeline([("capture", capture), ("vision", vision), ("decision", decision)])
+    pipeline.start()
+    time.sleep(duration)
+    pipeline.stop()
+    frame_ids = [frame[0] for frame, _ in decisions]
+    assert frame_ids == sorted(set(frame_ids)), "Decisions were made on an older frame"
+    frame_time = duration / len(decisions)
+    slowest = max(capture_time, vision_time, decision_time)
+    age = sum(decided - captured for (_, captured), decided in decisions) / len(decisions)
+    logger.info(f"Sequential: {(capture_time + vision_time + decision_time) * 1000:.1f}ms per frame, "
+                f"pipelined: {frame_time * 1000:.1f}ms per frame (slowest stage {slowest * 1000:.1f}ms)")
+    logger.info(f"{frame_id} frames captured, {len(decisions)} decisions made, "
+                f"{age * 1000:.1f}ms from capture to decision")
+
+
+def test_errors(duration=1) -> None:
+    """
+    A stage that fails every other frame shouldn't stop the pipeline.
+    """
+    decisions = []
+
+    def vision(frame):
+        if frame % 2:
+            raise ValueError(f"Can't analyze frame {frame}")
+        return frame
+
+    frames = iter(range(1000000))
+    pipeline = Pipeline([("capture", lambda: next(frames)), ("vision", vision), ("decision", decisions.append)],
+                        on_error=lambda stage, e: 0.01)
+    pipeline.start()
+    time.sleep(duration)
+    pipeline.stop()
+    assert decisions and all(frame % 2 == 0 for frame in decisions), "Failed frames were passed on"
+    logger.info(f"{len(decisions)} decisions made, while half of the frames failed")
+
+
+if __name__ == '__main__':
+    test_throughput()
+    test_throughput(vision_time=0.02, decision_time=0.1)
+    test_errors()